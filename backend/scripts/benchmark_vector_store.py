@@ -0,0 +1,113 @@
+"""
+Benchmark latency + recall@k của các vector store backend
+
+    python scripts/benchmark_vector_store.py --n 20000 --queries 200
+    python scripts/benchmark_vector_store.py --from-db   # dùng embeddings thật trong data/real_chroma_db
+
+Ground truth là exact cosine top-k tính bằng numpy float64.
+Các backend numpy-int8/pca/binary đo thêm RAM của index stage 1 và recall
+sau khi chấm lại top_k * rerank_factor ứng viên bằng full vectors.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from serperior.api.vector_store import ChromaVectorStore, NumpyVectorStore, hnswlib
+
+
+def load_vectors(args):
+    if args.from_db:
+        from serperior.api.vector_db import ArticleVectorDB
+        db = ArticleVectorDB(backend="chroma")
+        results = db.collection.get(include=['embeddings'])
+        vectors = np.asarray(results['embeddings'], dtype=np.float32)
+        print(f"Loaded {len(vectors)} embeddings from DB")
+    else:
+        # dữ liệu giả có cấu trúc cụm, gần với embeddings tin tức hơn là nhiễu đều
+        rng = np.random.default_rng(args.seed)
+        centers = rng.normal(size=(max(args.n // 50, 1), args.dim)).astype(np.float32)
+        vectors = centers[rng.integers(0, len(centers), args.n)]
+        vectors += 0.5 * rng.normal(size=vectors.shape).astype(np.float32)
+
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def make_queries(vectors, n_queries, seed):
+    rng = np.random.default_rng(seed + 1)
+    queries = vectors[rng.integers(0, len(vectors), n_queries)].copy()
+    queries += 0.3 * rng.normal(size=queries.shape).astype(np.float32) / np.sqrt(vectors.shape[1])
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def fill(store, vectors, batch_size=5000):
+    start = time.perf_counter()
+    for i in range(0, len(vectors), batch_size):
+        chunk = vectors[i:i + batch_size]
+        ids = [str(j) for j in range(i, i + len(chunk))]
+        store.add(ids, chunk, [""] * len(chunk), [{'date': 0} for _ in range(len(chunk))])
+    return time.perf_counter() - start
+
+
+def index_mb(store):
+    nbytes = getattr(store, 'index_nbytes', None)
+    return f"{nbytes / 2**20:.1f}" if nbytes is not None else "-"
+
+
+def run(store, queries, truth, k):
+    latencies, hits = [], 0
+    for q, expected in zip(queries, truth):
+        start = time.perf_counter()
+        results = store.query(q, top_k=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len({int(r['id']) for r in results} & set(expected.tolist()))
+    latencies = np.array(latencies)
+    return np.percentile(latencies, 50), np.percentile(latencies, 95), hits / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=10000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rerank-factor", type=int, default=10)
+    parser.add_argument("--from-db", action="store_true")
+    args = parser.parse_args()
+
+    vectors = load_vectors(args)
+    queries = make_queries(vectors, args.queries, args.seed)
+    scores = queries.astype(np.float64) @ vectors.astype(np.float64).T
+    truth = np.argsort(-scores, axis=1)[:, :args.k]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {
+            "chroma": lambda: ChromaVectorStore(os.path.join(tmp, "chroma"), collection_name="bench"),
+            "numpy-f32": lambda: NumpyVectorStore(os.path.join(tmp, "np32"), hnsw_threshold=None),
+            "numpy-f16": lambda: NumpyVectorStore(os.path.join(tmp, "np16"), dtype="float16", hnsw_threshold=None),
+        }
+        if hnswlib is not None:
+            backends["numpy-hnsw"] = lambda: NumpyVectorStore(os.path.join(tmp, "hnsw"), hnsw_threshold=0)
+        for compression in ("int8", "pca", "binary"):
+            backends[f"numpy-{compression}"] = (
+                lambda c=compression: NumpyVectorStore(os.path.join(tmp, c), compression=c,
+                                                       rerank_factor=args.rerank_factor)
+            )
+
+        print(f"\n{len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, k={args.k}")
+        print(f"{'backend':<14} {'build (s)':>10} {'index (MB)':>11} {'p50 (ms)':>10} {'p95 (ms)':>10} {'recall@k':>10}")
+        for name, factory in backends.items():
+            store = factory()
+            build = fill(store, vectors)
+            p50, p95, recall = run(store, queries, truth, args.k)
+            print(f"{name:<14} {build:>10.2f} {index_mb(store):>11} {p50:>10.3f} {p95:>10.3f} {recall:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Kiểm tra retrieval parity của encoder backend so với PyTorch (fp32)
+
+    python scripts/check_encoder_parity.py --backend onnx-int8
+    python scripts/check_encoder_parity.py --backend onnx --from-db
+
+Chạy một bộ query cố định trên cùng corpus với hai encoder, so sánh
+cosine giữa embeddings và độ trùng top-k. Exit code 1 nếu overlap < --min-overlap.
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from serperior.api.encoder import TextEncoder
+from serperior.api.vector_db import DEFAULT_EMBEDDING_MODEL
+
+QUERIES = [
+    "giá vàng hôm nay",
+    "lãi suất ngân hàng tăng",
+    "thị trường chứng khoán VN-Index",
+    "giá xăng dầu điều chỉnh",
+    "xuất khẩu gạo năm nay",
+    "bất động sản phân khúc căn hộ",
+    "tỷ giá USD",
+    "doanh nghiệp báo lỗ quý 3",
+    "Vingroup",
+    "lạm phát và CPI",
+]
+
+SAMPLE_CORPUS = [
+    "Giá vàng SJC hôm nay tăng mạnh, vượt mốc 90 triệu đồng mỗi lượng.",
+    "Ngân hàng Nhà nước giữ nguyên lãi suất điều hành trong tháng này.",
+    "VN-Index giảm hơn 10 điểm do áp lực bán ròng của khối ngoại.",
+    "Liên bộ Công Thương - Tài chính điều chỉnh giá xăng dầu từ 15h chiều nay.",
+    "Xuất khẩu gạo 11 tháng đạt kỷ lục hơn 8 triệu tấn.",
+    "Thị trường căn hộ Hà Nội tiếp tục tăng giá, nguồn cung khan hiếm.",
+    "Tỷ giá USD tại các ngân hàng thương mại đi ngang.",
+    "Nhiều doanh nghiệp thép báo lỗ trong quý 3 do giá nguyên liệu tăng.",
+    "Vingroup công bố kết quả kinh doanh với doanh thu tăng trưởng hai chữ số.",
+    "CPI tháng 11 tăng 0,13% so với tháng trước, lạm phát được kiểm soát.",
+    "Giá cà phê xuất khẩu lập đỉnh mới trong lịch sử.",
+    "Hàng không giá rẻ mở thêm đường bay quốc tế dịp cuối năm.",
+]
+
+
+def load_corpus(from_db: bool):
+    if not from_db:
+        return SAMPLE_CORPUS
+    from serperior.api.vector_db import ArticleVectorDB
+    db = ArticleVectorDB()
+    corpus = []
+    for _, documents in db.store.iter_documents():
+        corpus.extend(documents)
+    print(f"Loaded {len(corpus)} documents from DB")
+    return corpus
+
+
+def normalize(x):
+    return x / np.linalg.norm(x, axis=-1, keepdims=True)
+
+
+def run(encoder, corpus):
+    start = time.perf_counter()
+    docs = encoder.encode_documents(corpus)
+    ingest = time.perf_counter() - start
+
+    latencies, queries = [], []
+    for q in QUERIES:
+        start = time.perf_counter()
+        queries.append(encoder.encode_query(q))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return normalize(docs), normalize(np.stack(queries)), ingest, float(np.median(latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="onnx-int8", choices=["onnx", "onnx-int8"])
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--min-overlap", type=float, default=0.9)
+    parser.add_argument("--from-db", action="store_true")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.from_db)
+    k = min(args.k, len(corpus))
+
+    reference = TextEncoder(args.model, backend="torch")
+    candidate = TextEncoder(args.model, backend=args.backend)
+
+    ref_docs, ref_queries, ref_ingest, ref_query_ms = run(reference, corpus)
+    cand_docs, cand_queries, cand_ingest, cand_query_ms = run(candidate, corpus)
+
+    doc_cos = np.sum(ref_docs * cand_docs, axis=1)
+    ref_top = np.argsort(-(ref_queries @ ref_docs.T), axis=1)[:, :k]
+    cand_top = np.argsort(-(cand_queries @ cand_docs.T), axis=1)[:, :k]
+    overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_top, cand_top)])
+    top1 = np.mean(ref_top[:, 0] == cand_top[:, 0])
+
+    print(f"\n{len(corpus)} documents, {len(QUERIES)} queries, k={k}")
+    print(f"{'backend':<10} {'ingest (s)':>12} {'query p50 (ms)':>16}")
+    print(f"{'torch':<10} {ref_ingest:>12.2f} {ref_query_ms:>16.2f}")
+    print(f"{args.backend:<10} {cand_ingest:>12.2f} {cand_query_ms:>16.2f}")
+    print(f"\nembedding cosine vs torch: mean={doc_cos.mean():.4f} min={doc_cos.min():.4f}")
+    print(f"top-{k} overlap: {overlap:.3f}   top-1 agreement: {top1:.3f}")
+
+    if overlap < args.min_overlap:
+        print(f"FAIL: overlap {overlap:.3f} < {args.min_overlap}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
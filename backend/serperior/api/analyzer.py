@@ -10,18 +10,28 @@ import torch
 from transformers import AutoTokenizer, AutoModelForTokenClassification
 from transformers import pipeline
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from .extractor import PhoBERTEntityExtractor
+from .token_cache import TokenCache
+from .term_matrix import TermMatrix
+from .entity_aggregate import EntityAggregate
+from .sentiment import LexiconSentimentScorer, TransformerSentimentScorer, aggregate_sentiment
 
 class NewsAnalyzer:
     """trích xuất thực thể"""
     
-    def __init__(self, use_phobert: bool = True):
+    def __init__(self, use_phobert: bool = True, token_cache: Optional[TokenCache] = None,
+                 sentiment_model: Optional[str] = None):
         """
         Initialize analyzer
         
         Args:
             use_phobert: dùng phobert
+            token_cache: cache tách từ theo bài (VD: ArticleVectorDB.token_cache, đã tách sẵn lúc ingest);
+                None -> cache trong RAM
+            sentiment_model: model phân loại sắc thái (HuggingFace); None -> chỉ dùng từ điển
         """
+        self.token_cache = token_cache or TokenCache()
         # Vietnamese stopwords
         self.stopwords = set([
             'của', 'và', 'các', 'có', 'được', 'theo', 'trong', 
@@ -46,6 +56,16 @@ class NewsAnalyzer:
             'suy thoái', 'đình đốn', 'sa thải', 'phá sản', 'âm'
         ])
         
+        self.lexicon_scorer = LexiconSentimentScorer(self.positive_words, self.negative_words)
+        self.sentiment_scorer = self.lexicon_scorer
+        if sentiment_model:
+            try:
+                self.sentiment_scorer = TransformerSentimentScorer(sentiment_model)
+                print(f"Sentiment model {sentiment_model} initialized")
+            except Exception as e:
+                print(f"Could not initialize sentiment model: {e}")
+                print("Falling back to lexicon sentiment")
+
         # Init PhoBERT NER
         self.use_phobert = use_phobert
         self.entity_extractor = None
@@ -59,6 +79,32 @@ class NewsAnalyzer:
                 print("Entity extraction will be disabled")
                 self.use_phobert = False
     
+    def _filter_words(self, words: List[str]) -> List[str]:
+        """Bỏ stopword, số, từ ngắn và từ ghép (có khoảng trắng)"""
+        return [
+            word for word in words
+            if (len(word) > 2 and 
+                word not in self.stopwords and
+                not word.isdigit() and
+                word.isalpha())
+        ]
+
+    def article_tokens(self, articles: List[Dict]) -> List[List[str]]:
+        """
+        Tokens của từng bài, qua token cache: mỗi bài chỉ tách từ một lần
+
+        Text giống hệt lúc ingest (ArticleVectorDB.add_articles) nên bài vừa crawl dùng lại được
+        tokens đã tách; bài đọc từ DB (body rút gọn) được tra theo id.
+        """
+        return self.token_cache.tokenize_many(
+            ((article.get('id'), f"{article.get('title', '')}. {article.get('body', '')}") for article in articles),
+            ingest=False
+        )
+
+    def article_word_counts(self, articles: List[Dict]) -> List[Counter]:
+        """Tần suất từ khóa (đã lọc) của từng bài"""
+        return [Counter(self._filter_words(tokens)) for tokens in self.article_tokens(articles)]
+
     def extract_keywords(self, text: str, top_n: int = 10) -> List[Tuple[str, int]]:
         """
         Trích xuất từ khóa quan trọng từ text
@@ -73,19 +119,18 @@ class NewsAnalyzer:
         # Tokenize
         words = word_tokenize(text.lower())
         
-        # Filter loại stopword
-        filtered_words = [
-            word for word in words
-            if (len(word) > 2 and 
-                word not in self.stopwords and
-                not word.isdigit() and
-                word.isalpha())
-        ]
-        
         # Count frequency
-        word_freq = Counter(filtered_words)
+        word_freq = Counter(self._filter_words(words))
         
         return word_freq.most_common(top_n)
+
+    def term_matrix(self, articles: List[Dict]) -> TermMatrix:
+        """Ma trận thưa bài × từ khóa (đã lọc), dùng cho từ khóa và timeline"""
+        return TermMatrix(self.article_word_counts(articles), [article.get('date') for article in articles])
+
+    def extract_keywords_from_articles(self, articles: List[Dict], top_n: int = 10) -> List[Tuple[str, int]]:
+        """Như extract_keywords trên toàn bộ các bài, nhưng dùng tokens đã cache của từng bài"""
+        return self.term_matrix(articles).top_terms(top_n)
     
     def extract_entities_from_text(self, text: str) -> List[Dict]:
         """
@@ -101,13 +146,59 @@ class NewsAnalyzer:
             return []
         
         return self.entity_extractor.extract_entities(text)
+
+    def extract_entities_batch(self, texts: List[str], batch_size: int = 16) -> List[List[Dict]]:
+        """Như extract_entities_from_text cho nhiều text, NER theo batch"""
+        if not self.use_phobert or not self.entity_extractor:
+            return [[] for _ in texts]
+        return self.entity_extractor.extract_entities_batch(texts, batch_size)
     
-    def extract_entities_from_articles(self, articles: List[Dict]) -> Dict:
+    def aggregate_entities(self, articles: List[Dict], workers: int = 1,
+                           sample_size: int = 10) -> Tuple[EntityAggregate, List[Dict]]:
+        """
+        Trích xuất thực thể từng bài và tổng hợp
+
+        Args:
+            workers: > 1 -> chia bài thành các phần, mỗi thread tổng hợp một phần rồi merge
+            sample_size: số bài có thực thể giữ lại làm ví dụ
+        Returns:
+            (EntityAggregate, các bài đầu tiên có thực thể kèm danh sách thực thể)
+        """
+        def run(chunk: List[Dict]) -> Tuple[EntityAggregate, List[Dict]]:
+            aggregate = EntityAggregate()
+            samples = []
+            texts = [f"{article.get('title', '')} {article.get('body', '')}" for article in chunk]
+            for article, entities in zip(chunk, self.extract_entities_batch(texts)):
+                aggregate.add_article(entities, article.get('date'))
+                if entities and len(samples) < sample_size:
+                    samples.append({
+                        "title": article.get('title'),
+                        "date": article.get('date'),
+                        "url": article.get('url'),
+                        "entities": entities
+                    })
+            return aggregate, samples
+
+        if workers <= 1 or len(articles) < 2 * workers:
+            return run(articles)
+
+        size = -(-len(articles) // workers)
+        chunks = [articles[i:i + size] for i in range(0, len(articles), size)]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(run, chunks))
+        aggregate, samples = parts[0]
+        for part, part_samples in parts[1:]:
+            aggregate.merge(part)
+            samples.extend(part_samples)
+        return aggregate, samples[:sample_size]
+
+    def extract_entities_from_articles(self, articles: List[Dict], workers: int = 1) -> Dict:
         """
         Extract and aggregate entities from multiple articles
         
         Args:
             articles: List of article dicts
+            workers: số thread trích xuất song song (xem aggregate_entities)
             
         Returns:
             Dict with entity analysis
@@ -120,70 +211,58 @@ class NewsAnalyzer:
                 "articles_with_entities": []
             }
         
-        all_entities = []
-        articles_with_entities = []
-        entity_counter = Counter()
-        by_type = {"PER": [], "ORG": [], "LOC": [], "MISC": [], "PERSON": [], "ORGANIZATION":[],"LOCATION":[]}
-        
-        for article in articles:
-            text = f"{article.get('title', '')} {article.get('body', '')}"
-            
-            # Extract entities
-            entities = self.extract_entities_from_text(text)
-            
-            if entities:
-                # Add to article-level results
-                articles_with_entities.append({
-                    "title": article.get('title'),
-                    "date": article.get('date'),
-                    "url": article.get('url'),
-                    "entities": entities
-                })
-                
-                for entity in entities:
-                    entity_key = f"{entity['text']}|{entity['type']}"
-                    entity_counter[entity_key] += 1
-            
-                    entity_type = entity['type']
-                    if entity_type in by_type:
-                        by_type[entity_type].append(entity['text'])
+        aggregate, articles_with_entities = self.aggregate_entities(articles, workers)
+        labels = self.entity_extractor.entity_labels
         
-        # Process aggregated entities
-        top_entities = []
-        for entity_key, count in entity_counter.most_common(50):
-            text, entity_type = entity_key.split('|')
-            top_entities.append({
-                "text": text,
-                "type": entity_type,
-                "type_vi": self.entity_extractor.entity_labels.get(entity_type, entity_type),
+        top_entities = [
+            {
+                "text": aggregate.text(entity_id),
+                "type": aggregate.entity_type(entity_id),
+                "type_vi": labels.get(aggregate.entity_type(entity_id), aggregate.entity_type(entity_id)),
                 "count": count
-            })
+            }
+            for entity_id, count in aggregate.most_common(50)
+        ]
         
         # Count unique entities by type
+        unique_by_type = aggregate.types()
         by_type_summary = {}
-        for etype, entities in by_type.items():
-            unique_entities = list(set(entities))
+        for etype in dict.fromkeys(["PER", "ORG", "LOC", "MISC", "PERSON", "ORGANIZATION", "LOCATION", *unique_by_type]):
             by_type_summary[etype] = {
-                "count": len(unique_entities),
-                "type_vi": self.entity_extractor.entity_labels.get(etype, etype),
-                "top_entities": Counter(entities).most_common(10)
+                "count": unique_by_type.get(etype, 0),
+                "type_vi": labels.get(etype, etype),
+                "top_entities": [(aggregate.text(i), count) for i, count in aggregate.most_common(10, etype)]
             }
         
         return {
             "entities": top_entities,
             "by_type": by_type_summary,
-            "total_count": len(all_entities),
-            "unique_count": len(entity_counter),
-            "articles_with_entities": articles_with_entities[:10]  # Top 10 articles
+            "total_count": aggregate.mentions,
+            "unique_count": len(aggregate),
+            "articles_with_entities": articles_with_entities
         }
     
-    def analyze_trend(self, articles: List[Dict], top_n: int = 20) -> Dict:
+    @property
+    def sentiment_method(self) -> str:
+        """'transformer' nếu có model, ngược lại 'lexicon'"""
+        return self.sentiment_scorer.method
+
+    def score_sentiment(self, articles: List[Dict]) -> List[Dict]:
+        """Điểm sắc thái từng bài ({'score', 'label', ...}), trên tokens đã cache, chấm theo batch"""
+        return self.sentiment_scorer.score_many(self.article_tokens(articles))
+
+    def analyze_sentiment(self, articles: List[Dict], freq: str = 'day') -> Dict:
+        """Phân bố sắc thái + timeline theo ngày/tuần/tháng (xem aggregate_sentiment)"""
+        return aggregate_sentiment(articles, self.score_sentiment(articles), self.sentiment_method, freq)
+
+    def analyze_trend(self, articles: List[Dict], top_n: int = 20, freq: str = 'day') -> Dict:
         """
         Phân tích xu hướng từ danh sách bài báo
         
         Args:
             articles: List of article dicts
             top_n: Top N keywords
+            freq: gom timeline theo 'day' | 'week' | 'month'
             
         Returns:
             Dict with trend analysis results
@@ -196,14 +275,9 @@ class NewsAnalyzer:
                 "timeline": {}
             }
         
-        # Combine all text
-        all_text = " ".join([
-            f"{article.get('title', '')} {article.get('body', '')}"
-            for article in articles
-        ])
-        
-        # Extract keywords
-        keywords = self.extract_keywords(all_text, top_n)
+        # Tách từ từng bài (qua cache), dựng ma trận bài × từ một lần, dùng chung cho keywords và timeline
+        matrix = self.term_matrix(articles)
+        keywords = matrix.top_terms(top_n)
         
         # Date range
         dates = [article.get('date') for article in articles if article.get('date')]
@@ -213,7 +287,7 @@ class NewsAnalyzer:
         }
         
         # Timeline analysis
-        keyword_timeline = self._analyze_keyword_timeline(articles, keywords)
+        keyword_timeline = self._analyze_keyword_timeline(articles, keywords, matrix, freq)
         
         return {
             "keywords": [
@@ -226,35 +300,13 @@ class NewsAnalyzer:
         }
     
     def _analyze_keyword_timeline(self, articles: List[Dict], 
-                                   top_keywords: List[Tuple[str, int]]) -> Dict:
-        """Phân tích keywords theo timeline"""
+                                   top_keywords: List[Tuple[str, int]],
+                                   matrix: Optional[TermMatrix] = None, freq: str = 'day') -> Dict:
+        """Phân tích keywords theo timeline: đếm theo token trên ma trận bài × từ, gom theo ngày/tuần/tháng"""
         top_5_words = [word for word, _ in top_keywords[:5]]
-        
-        # Group by date
-        by_date = {}
-        for article in articles:
-            date = article.get('date')
-            if not date:
-                continue
-            
-            if date not in by_date:
-                by_date[date] = []
-            by_date[date].append(article)
-        
-        # Count keywords per date
-        timeline = {}
-        for date, day_articles in sorted(by_date.items()):
-            day_text = " ".join([
-                f"{a.get('title', '')} {a.get('body', '')}"
-                for a in day_articles
-            ]).lower()
-            
-            timeline[date] = {
-                word: day_text.count(word)
-                for word in top_5_words
-            }
-        
-        return timeline
+        if matrix is None:
+            matrix = self.term_matrix(articles)
+        return matrix.timeline(top_5_words, freq)
     
     def full_analysis(self, articles: List[Dict], top_n: int = 20) -> Dict:
         print(f"Analyzing {len(articles)} articles...")
@@ -1,14 +1,23 @@
-from fastapi import FastAPI, Query, HTTPException, Body
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Query, HTTPException, Body, BackgroundTasks
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import List, Dict
 from fastapi.middleware.cors import CORSMiddleware # cors để dashboard call được
+from starlette.concurrency import run_in_threadpool
 
 from typing import List, Dict, Optional
 from datetime import datetime
 from pydantic import BaseModel, Field, validator
+import asyncio
 import logging
+import json
 from .dantri_crawler import DantriCrawler
 from .analyzer import NewsAnalyzer
+from .term_matrix import TIME_BUCKETS
+from .trend_store import TrendStore
+from .burst import BurstDetector
+from .topic_clusters import TopicClusterer
+from .sentiment_store import SentimentStore
+from .tokenizer import shutdown_pool
 
 # Cấu hình logging
 logging.basicConfig(
@@ -48,22 +57,18 @@ class CrawlResponse(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     history: Optional[List[Dict[str, str]]] = []
+    # time budget của request, không vượt quá SERPERIOR_CHAT_DEADLINE_MS
+    deadline_ms: Optional[int] = Field(None, gt=0)
 
 class ChatResponse(BaseModel):
     response: str
-    sources: List[str] = []
-    success: bool
-    error: Optional[str] = None
-
-class ChatRequest(BaseModel):
-    message: str
-    history: Optional[List[Dict[str, str]]] = []
-
-class ChatResponse(BaseModel):
-    response: str
-    sources: List[str] = []
+    sources: List[Dict] = []
     success: bool
     error: Optional[str] = None
+    cached: bool = False
+    # degraded: đã bỏ qua / rút gọn stage vì deadline; timings: thời gian từng stage (Deadline.report)
+    degraded: bool = False
+    timings: Optional[Dict] = None
 
 # Danh sách các field hợp lệ
 VALID_FIELDS = ['kinh-doanh', 'thoi-su', 'phap-luat', 'du-lich', 'bat-dong-san']
@@ -156,26 +161,76 @@ except Exception as e:
 
 # Initialize RAG and LLM
 from ..rag.rag_service import RAGService
-from ..rag.llm_client import LLMClient
+from ..rag.llm_client import LLMError, is_error_answer
+from ..rag.llm_router import LLMRouter, create_llm_client
+from ..rag.answer_cache import SemanticAnswerCache
+from ..rag.context_builder import ContextBuilder
+from ..rag.reranker import CrossEncoderReranker, DEFAULT_RERANK_MODEL
+from ..rag.conversation import ConversationMemory
+from ..rag.digest import DigestBuilder, DigestStore, digest_sources, format_digest, parse_date_scope
+from ..rag.deadline import Deadline
 import os
 
 rag_service = None
 llm_client = None
+conversation = None
+# câu hỏi gần giống nhau trên cùng tập bài -> trả lời lại không cần gọi LLM
+answer_cache = SemanticAnswerCache(
+    threshold=float(os.getenv("SERPERIOR_ANSWER_CACHE_THRESHOLD", 0.92)),
+    ttl_seconds=float(os.getenv("SERPERIOR_ANSWER_CACHE_TTL", 3600))
+)
+
+# time budget mặc định của một lượt chat; hết budget thì bỏ dần các stage tùy chọn
+# (tóm tắt / viết lại câu hỏi -> rerank -> bớt top_k -> trả lời chỉ gồm danh sách nguồn)
+CHAT_DEADLINE_SECONDS = float(os.getenv("SERPERIOR_CHAT_DEADLINE_MS", 15000)) / 1000
+# thời gian tối thiểu để còn gọi LLM sinh câu trả lời / gọi LLM phụ (tóm tắt, viết lại câu hỏi)
+MIN_GENERATION_SECONDS = 1.0
+MIN_AUX_LLM_SECONDS = 0.5
+# phần budget để dành cho retrieval khi tính timeout của các lần gọi LLM phụ
+RETRIEVAL_RESERVE_SECONDS = 1.0
 
 try:
     if vector_db:
-        rag_service = RAGService(vector_db)
+        reranker = None
+        # SERPERIOR_RERANK_MODEL=none để tắt rerank
+        rerank_model = os.getenv("SERPERIOR_RERANK_MODEL", DEFAULT_RERANK_MODEL)
+        if rerank_model.lower() != "none":
+            try:
+                reranker = CrossEncoderReranker(
+                    rerank_model,
+                    time_budget_ms=float(os.getenv("SERPERIOR_RERANK_BUDGET_MS", 300))
+                )
+            except Exception as e:
+                logger.error(f"Failed to load reranker, falling back to hybrid search order: {e}")
+
+        rag_service = RAGService(vector_db, ContextBuilder(
+            max_tokens=int(os.getenv("SERPERIOR_CONTEXT_TOKENS", 2000))
+        ), reranker=reranker, entity_index=vector_db.entities,
+            entity_boost=float(os.getenv("SERPERIOR_ENTITY_BOOST", 0.3)))
+        # SERPERIOR_LLM_PROVIDER: gemini (mặc định) | local | mock | auto (route theo độ phức tạp câu hỏi)
+        llm_provider = os.getenv("SERPERIOR_LLM_PROVIDER", "gemini").lower()
         # Use env var if available, else rely on manual set or error later
         gemini_key = os.getenv("GEMINI_API_KEY") 
-        if not gemini_key:
+        if llm_provider in ("gemini", "auto") and not gemini_key:
              raise ValueError("GEMINI_API_KEY not found in environment variables")
              
-        llm_client = LLMClient(provider="gemini", api_key=gemini_key)
+        llm_client = create_llm_client(llm_provider)
+        conversation = ConversationMemory(
+            llm_client,
+            max_history_tokens=int(os.getenv("SERPERIOR_HISTORY_TOKENS", 1500))
+        )
 except Exception as e:
     logger.error(f"Failed to initialize RAG/LLM: {e}")
 
+@app.on_event("shutdown")
+async def shutdown():
+    if llm_client:
+        await llm_client.aclose()
+    shutdown_pool()
+
 @app.get("/api/v1/crawl", response_model=CrawlResponse)
 async def crawl_news(
+    background_tasks: BackgroundTasks,
     start_date: str = Query(..., description="Ngày bắt đầu (định dạng YYYY-MM-DD)", example="2024-12-16"),
     end_date: str = Query(..., description="Ngày kết thúc (định dạng YYYY-MM-DD)", example="2024-12-15"),
     field: str = Query("kinh-doanh", description=f"Lĩnh vực tin tức. Các giá trị hợp lệ: {', '.join(VALID_FIELDS)}", example="kinh-doanh"),
@@ -204,18 +259,25 @@ async def crawl_news(
             start_date=start_date,
             end_date=end_date,
             num_articles=num_articles,
-            save=False
+            save=False,
+            duplicate_checker=vector_db.duplicate_checker() if save_to_db and vector_db else None
         )
         
         if results is None:
             results = []
         
-        logger.info(f"Crawl thành công: {len(results)} bài báo")
+        logger.info(f"Crawl thành công: {len(results)} bài báo ({len(crawler.duplicates)} bài gần trùng bị bỏ qua)")
 
         if save_to_db and vector_db and results:
             try:
                 count = vector_db.add_articles(results)
+                vector_db.link_duplicates(crawler.duplicates)
                 logger.info(f"Saved {count} articles to database")
+                background_tasks.add_task(_update_entities, results)
+                background_tasks.add_task(_update_trends, results)
+                background_tasks.add_task(_update_topics, results)
+                background_tasks.add_task(_update_sentiment, results)
+                background_tasks.add_task(_build_digests, results)
             except Exception as e:
                 logger.error(f"Error saving to database: {e}")
         
@@ -305,7 +367,121 @@ async def export_to_csv(
         raise HTTPException(status_code=500, detail=str(e))
 
 # http://localhost:8000/api/v1/crawl?start_date=2024-12-20&end_date=2024-12-18&field=thoi-su&num_articles=3
-analyzer = NewsAnalyzer()
+# dùng chung token cache với vector db: bài đã tách từ lúc ingest không phải tách lại khi phân tích
+# SERPERIOR_SENTIMENT_MODEL (VD: wonrax/phobert-base-vietnamese-sentiment) bật chấm sắc thái bằng model
+analyzer = NewsAnalyzer(
+    token_cache=vector_db.token_cache if vector_db else None,
+    sentiment_model=os.getenv("SERPERIOR_SENTIMENT_MODEL") or None
+)
+
+# Digest theo ngày / lĩnh vực, tạo ở background sau mỗi lần crawl
+digest_store = None
+digest_builder = None
+try:
+    if vector_db:
+        digest_store = DigestStore(os.path.join(os.path.dirname(vector_db.persist_directory), "digests.db"))
+        digest_builder = DigestBuilder(vector_db, analyzer, llm_client, digest_store)
+except Exception as e:
+    logger.error(f"Failed to initialize digests: {e}")
+
+# Thống kê xu hướng theo ngày / lĩnh vực, cộng dồn mỗi lần ingest
+trend_store = None
+burst_detector = None
+try:
+    if vector_db:
+        trend_store = TrendStore(os.path.join(os.path.dirname(vector_db.persist_directory), "trends.db"))
+        burst_detector = BurstDetector(trend_store)
+except Exception as e:
+    logger.error(f"Failed to initialize trend store: {e}")
+
+def _article_entities(articles: List[Dict]) -> Optional[List[List[Dict]]]:
+    """
+    Thực thể của từng bài: đọc từ entity index, bài chưa có thì chạy NER theo batch rồi đưa vào index
+
+    None nếu không có NER
+    """
+    if not analyzer.use_phobert:
+        return None
+    texts = [f"{a.get('title', '')} {a.get('body', '')}" for a in articles]
+    if not vector_db:
+        return analyzer.extract_entities_batch(texts)
+    ids = [vector_db.article_id(a) for a in articles]
+    known = vector_db.entities.article_entities(ids)
+    todo = [i for i, doc_id in enumerate(ids) if doc_id not in known]
+    if todo:
+        extracted = analyzer.extract_entities_batch([texts[i] for i in todo])
+        added = vector_db.entities.add_articles([dict(articles[i], id=ids[i]) for i in todo], extracted)
+        logger.info(f"Indexed entities of {added} articles")
+        known.update({ids[i]: entities for i, entities in zip(todo, extracted)})
+    return [known[doc_id] for doc_id in ids]
+
+def _update_entities(articles: List[Dict]):
+    """Background task: đưa thực thể của các bài mới vào entity index"""
+    if vector_db and articles:
+        _article_entities(articles)
+
+def _update_trends(articles: List[Dict]):
+    """Background task: cộng các bài mới vào trend store (bài đã có thì bỏ qua)"""
+    if not trend_store or not articles:
+        return
+    articles = trend_store.missing(articles)
+    if not articles:
+        return
+    word_counts = analyzer.article_word_counts(articles)
+    added = trend_store.add_articles(articles, word_counts, _article_entities(articles))
+    logger.info(f"Added {added} articles to trend store")
+    # đưa các ngày vừa đóng vào trạng thái burst (mỗi lĩnh vực + gộp tất cả)
+    if burst_detector and added:
+        for field in sorted({a.get('field') for a in articles if a.get('field')}) + [None]:
+            burst_detector.advance(field)
+
+# Gom bài thành câu chuyện từ embeddings đã lưu, gán tăng dần mỗi lần ingest
+topic_clusterer = None
+try:
+    if vector_db:
+        topic_clusterer = TopicClusterer(os.path.join(os.path.dirname(vector_db.persist_directory), "topics.db"))
+except Exception as e:
+    logger.error(f"Failed to initialize topic clusterer: {e}")
+
+def _update_topics(articles: List[Dict]):
+    """Background task: gán các bài mới (đã có trong vector DB) vào cluster chủ đề"""
+    if not topic_clusterer or not articles:
+        return
+    by_id = {vector_db.article_id(a): a for a in articles}
+    new_ids = topic_clusterer.missing(list(by_id))
+    if not new_ids:
+        return
+    model, ids, vectors = vector_db.get_embeddings(new_ids)
+    if not ids:
+        return
+    articles = [dict(by_id[doc_id], id=doc_id) for doc_id in ids]
+    added = topic_clusterer.add_articles(articles, vectors, analyzer.article_word_counts(articles), model)
+    logger.info(f"Assigned {added} articles to topic clusters")
+
+# Điểm sắc thái từng bài, chấm một lần lúc ingest, tổng hợp sẵn theo ngày / lĩnh vực
+sentiment_store = None
+try:
+    if vector_db:
+        sentiment_store = SentimentStore(os.path.join(os.path.dirname(vector_db.persist_directory), "sentiment.db"))
+except Exception as e:
+    logger.error(f"Failed to initialize sentiment store: {e}")
+
+def _update_sentiment(articles: List[Dict]):
+    """Background task: chấm sắc thái các bài chưa có trong sentiment store"""
+    if not sentiment_store or not articles:
+        return
+    method = analyzer.sentiment_method
+    articles = sentiment_store.missing(articles, method)
+    if not articles:
+        return
+    added = sentiment_store.add_scores(articles, analyzer.score_sentiment(articles), method)
+    logger.info(f"Scored sentiment of {added} articles ({method})")
+
+def _build_digests(articles: List[Dict]):
+    """Background task: cập nhật digest cho các (ngày, lĩnh vực) vừa crawl"""
+    if digest_builder and articles:
+        built = digest_builder.build_for_articles(articles)
+        logger.info(f"Updated {built} digests")
 
 @app.post("/api/v1/analyze/entity")
 async def analyze_entity(
@@ -326,25 +502,32 @@ async def analyze_entity(
     
 @app.get("/api/v1/analyze/full")
 async def full_analysis(
+    background_tasks: BackgroundTasks,
     start_date: str = Query(...),
     end_date: str = Query(...),
     field: str = Query("kinh-doanh"),
     num_articles: int = Query(5, ge=1, le=20),
-    reset_db: bool = Query(False, description="Clear database before crawling")
+    reset_db: bool = Query(False, description="Clear database before crawling"),
+    timeline_freq: str = Query("day", description="Gom timeline từ khóa theo day | week | month")
 ):
     """
     Crawl + Phân tích đầy đủ.
     If reset_db=True, clears DB first.
     Optimization: Checks DB first. If articles exist for range, use them. Else crawl and save.
     """
+    if timeline_freq not in TIME_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"timeline_freq phải là một trong {', '.join(TIME_BUCKETS)}")
     try:
         articles = []
         is_cached = False
+        staging = None
         
-        # Step 0: Clear DB if requested
+        # Step 0: Reset DB if requested.
+        # Không clear tại chỗ: crawl vào một generation mới, chat vẫn đọc generation cũ
+        # cho tới khi generation mới có dữ liệu và được promote.
         if reset_db and vector_db:
-            logger.info("Resetting database as requested.")
-            vector_db.clear()
+            logger.info("Resetting database as requested (staging new generation).")
+            staging = vector_db.create_generation()
 
         # Step 1: Check DB (only if not reset)
         if vector_db and not reset_db:
@@ -360,14 +543,37 @@ async def full_analysis(
                 logger.error(f"DB check failed: {e}")
 
         # Step 2: Crawl if not cached
-        if not articles:
-            logger.info(f"Full analysis: Data not in DB. Crawling...")
-            crawler = DantriCrawler(field=field)
-            articles = crawler.crawl_by_date_range(start_date, end_date, num_articles, save=False)
-            
-            # Save to DB for future use
-            if vector_db and articles:
-                vector_db.add_articles(articles)
+        try:
+            if not articles:
+                logger.info(f"Full analysis: Data not in DB. Crawling...")
+                crawler = DantriCrawler(field=field)
+                checker = vector_db.duplicate_checker(staging) if vector_db else None
+                articles = crawler.crawl_by_date_range(start_date, end_date, num_articles, save=False,
+                                                       duplicate_checker=checker)
+
+                # Save to DB for future use
+                if vector_db and articles:
+                    vector_db.add_articles(articles, generation=staging)
+                    vector_db.link_duplicates(crawler.duplicates)
+        except Exception:
+            # staging chưa promote thì không bao giờ bị GC -> phải bỏ ngay, giống replace_articles
+            if staging is not None:
+                vector_db.discard_generation(staging)
+            raise
+
+        if staging is not None:
+            if staging.store.count():
+                vector_db.promote(staging)
+            else:
+                # crawl không được gì (hoặc toàn bài trùng) thì giữ nguyên dữ liệu cũ
+                vector_db.discard_generation(staging)
+
+        if not is_cached and articles:
+            background_tasks.add_task(_update_entities, articles)
+            background_tasks.add_task(_update_trends, articles)
+            background_tasks.add_task(_update_topics, articles)
+            background_tasks.add_task(_update_sentiment, articles)
+            background_tasks.add_task(_build_digests, articles)
         
         if not articles:
             return {
@@ -380,9 +586,22 @@ async def full_analysis(
         entity_result = analyzer.extract_entities_from_articles(articles)
 
         logger.info(f"Full analysis: Analyzing sentiment...")
-        sentiment_result = None
+        # bài từ DB đã được chấm lúc ingest -> đọc tổng hợp tính sẵn, không chạy lại model
+        method = analyzer.sentiment_method
+        if is_cached and sentiment_store and not sentiment_store.missing(articles, method):
+            sentiment_result = sentiment_store.sentiment(start_date, end_date, method=method, freq=timeline_freq)
+        else:
+            sentiment_result = analyzer.analyze_sentiment(articles, freq=timeline_freq)
+            if is_cached:
+                background_tasks.add_task(_update_sentiment, articles)
         
-        trend_result = analyzer.analyze_trend(articles)
+        # bài từ DB đã có đủ trong trend store -> đọc thống kê tính sẵn, không tách từ / đếm lại
+        if is_cached and trend_store and not trend_store.missing(articles):
+            trend_result = trend_store.trend(start_date, end_date, freq=timeline_freq)
+        else:
+            trend_result = analyzer.analyze_trend(articles, freq=timeline_freq)
+            if is_cached:
+                background_tasks.add_task(_update_trends, articles)
 
         return {
             "success": True,
@@ -398,37 +617,406 @@ async def full_analysis(
         logger.error(f"Error in full analysis: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/v1/db/stats")
+async def db_stats():
+    """Thống kê database (số bài, backend, generation đang active)"""
+    if not vector_db:
+        raise HTTPException(status_code=503, detail="Vector DB not initialized")
+    return {"success": True, "data": vector_db.get_stats()}
+
+@app.post("/api/v1/db/rebuild")
+async def rebuild_db(
+    model_name: Optional[str] = Query(None, description="Embedding model mới (để trống = giữ model hiện tại)")
+):
+    """
+    Re-index database sang generation mới ở background rồi swap alias.
+    Chat vẫn chạy bình thường trên generation cũ trong lúc rebuild.
+    """
+    if not vector_db:
+        raise HTTPException(status_code=503, detail="Vector DB not initialized")
+    try:
+        vector_db.rebuild(model_name=model_name, background=True)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"success": True, "message": "Rebuild started", "data": vector_db.get_stats()}
+
+@app.get("/api/v1/digests")
+async def get_digests(
+    date: str = Query(..., description="Ngày (YYYY-MM-DD)", example="2024-12-16"),
+    field: Optional[str] = Query(None, description="Lĩnh vực (để trống = tất cả)")
+):
+    """Digest đã tính sẵn của một ngày: top stories, thực thể, từ khóa, tóm tắt"""
+    if not digest_store:
+        raise HTTPException(status_code=503, detail="Digest store not initialized")
+    if not validate_date_format(date):
+        raise HTTPException(status_code=400, detail=f"Định dạng date không hợp lệ. Vui lòng dùng 'YYYY-MM-DD'. Nhận được: {date}")
+    if field and field not in VALID_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Field không hợp lệ. Các giá trị cho phép: {', '.join(VALID_FIELDS)}")
+
+    digests = digest_store.list(date, field)
+    if not digests:
+        raise HTTPException(status_code=404, detail=f"Chưa có digest cho ngày {date}")
+    return {"success": True, "data": digests}
+
+@app.post("/api/v1/digests/build")
+async def build_digest(
+    date: str = Query(..., description="Ngày (YYYY-MM-DD)"),
+    field: str = Query("kinh-doanh"),
+    force: bool = Query(False, description="Tạo lại kể cả khi dữ liệu không đổi")
+):
+    """Tạo (lại) digest cho một ngày / lĩnh vực từ dữ liệu trong DB"""
+    if not digest_builder:
+        raise HTTPException(status_code=503, detail="Digest store not initialized")
+    if not validate_date_format(date):
+        raise HTTPException(status_code=400, detail=f"Định dạng date không hợp lệ. Vui lòng dùng 'YYYY-MM-DD'. Nhận được: {date}")
+    if field not in VALID_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Field không hợp lệ. Các giá trị cho phép: {', '.join(VALID_FIELDS)}")
+
+    digest = await run_in_threadpool(digest_builder.build, date, field, force)
+    if digest is None:
+        raise HTTPException(status_code=404, detail=f"Không có bài {field} ngày {date} trong DB")
+    return {"success": True, "data": digest}
+
+@app.get("/api/v1/trends")
+async def get_trends(
+    start_date: str = Query(..., description="YYYY-MM-DD"),
+    end_date: str = Query(..., description="YYYY-MM-DD"),
+    field: Optional[str] = Query(None, description="Lĩnh vực, bỏ trống = tất cả"),
+    top_n: int = Query(20, ge=1, le=100),
+    freq: str = Query("day", description="Gom timeline theo day | week | month"),
+    baseline_days: int = Query(28, ge=1, le=365, description="Số ngày liền trước dùng làm baseline")
+):
+    """Từ khóa, timeline, từ khóa nổi bật (so với baseline) và thực thể của một khoảng ngày, từ trend store"""
+    if not trend_store:
+        raise HTTPException(status_code=503, detail="Trend store not initialized")
+    if not validate_date_format(start_date) or not validate_date_format(end_date):
+        raise HTTPException(status_code=400, detail="Ngày phải có định dạng YYYY-MM-DD")
+    if freq not in TIME_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"freq phải là một trong {', '.join(TIME_BUCKETS)}")
+    if field and field not in VALID_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Field không hợp lệ. Các giá trị cho phép: {', '.join(VALID_FIELDS)}")
+    data = await run_in_threadpool(trend_store.trend, start_date, end_date, field, top_n, freq, baseline_days)
+    return {"success": True, "data": data}
+
+@app.get("/api/v1/trends/now")
+async def get_trending_now(
+    field: Optional[str] = Query(None, description="Lĩnh vực, bỏ trống = tất cả"),
+    kind: Optional[str] = Query(None, description="term | entity, bỏ trống = cả hai"),
+    top_n: int = Query(20, ge=1, le=100)
+):
+    """Từ khóa / thực thể đang nổi lên trong ngày mới nhất (z-score so với EWMA các ngày trước)"""
+    if not burst_detector:
+        raise HTTPException(status_code=503, detail="Trend store not initialized")
+    if field and field not in VALID_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Field không hợp lệ. Các giá trị cho phép: {', '.join(VALID_FIELDS)}")
+    if kind not in (None, "term", "entity"):
+        raise HTTPException(status_code=400, detail="kind phải là term hoặc entity")
+    data = await run_in_threadpool(burst_detector.trending, field, top_n, kind)
+    return {"success": True, "data": data}
+
+@app.get("/api/v1/sentiment")
+async def get_sentiment(
+    start_date: str = Query(..., description="YYYY-MM-DD"),
+    end_date: str = Query(..., description="YYYY-MM-DD"),
+    field: Optional[str] = Query(None, description="Lĩnh vực, bỏ trống = tất cả"),
+    freq: str = Query("day", description="Gom timeline theo day | week | month")
+):
+    """Phân bố sắc thái và timeline điểm trung bình của một khoảng ngày, từ điểm đã chấm lúc ingest"""
+    if not sentiment_store:
+        raise HTTPException(status_code=503, detail="Sentiment store not initialized")
+    if not validate_date_format(start_date) or not validate_date_format(end_date):
+        raise HTTPException(status_code=400, detail="Ngày phải có định dạng YYYY-MM-DD")
+    if freq not in TIME_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"freq phải là một trong {', '.join(TIME_BUCKETS)}")
+    if field and field not in VALID_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Field không hợp lệ. Các giá trị cho phép: {', '.join(VALID_FIELDS)}")
+    data = await run_in_threadpool(
+        sentiment_store.sentiment, start_date, end_date, field, analyzer.sentiment_method, freq
+    )
+    return {"success": True, "data": data}
+
+def _check_entity_query(start_date: Optional[str], end_date: Optional[str], field: Optional[str]):
+    """Validate chung cho các endpoint thực thể (khoảng ngày tùy chọn nhưng phải đủ cả hai đầu)"""
+    if not vector_db:
+        raise HTTPException(status_code=503, detail="Vector DB not initialized")
+    if bool(start_date) != bool(end_date):
+        raise HTTPException(status_code=400, detail="Cần cả start_date và end_date (hoặc bỏ trống cả hai)")
+    if start_date and (not validate_date_format(start_date) or not validate_date_format(end_date)):
+        raise HTTPException(status_code=400, detail="Ngày phải có định dạng YYYY-MM-DD")
+    if field and field not in VALID_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Field không hợp lệ. Các giá trị cho phép: {', '.join(VALID_FIELDS)}")
+
+@app.get("/api/v1/entities")
+async def find_entities(
+    q: str = Query(..., min_length=1, description="Tên thực thể (không phân biệt hoa thường)"),
+    entity_type: Optional[str] = Query(None, alias="type", description="PER | ORG | LOC | MISC ..."),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Các thực thể đã index khớp tên (khớp chính xác trước, sau đó các tên chứa q)"""
+    _check_entity_query(None, None, None)
+    data = await run_in_threadpool(vector_db.entities.find, q, entity_type, limit)
+    return {"success": True, "data": data}
+
+@app.get("/api/v1/entities/articles")
+async def get_entity_articles(
+    name: str = Query(..., min_length=1, description="Tên thực thể, VD: Vingroup"),
+    entity_type: Optional[str] = Query(None, alias="type", description="PER | ORG | LOC | MISC ..."),
+    start_date: Optional[str] = Query(None, description="YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="YYYY-MM-DD"),
+    field: Optional[str] = Query(None, description="Lĩnh vực, bỏ trống = tất cả"),
+    limit: int = Query(50, ge=1, le=200)
+):
+    """Các bài nhắc tới một thực thể (mới nhất trước), tra từ entity index, không chạy lại NER"""
+    _check_entity_query(start_date, end_date, field)
+
+    def lookup():
+        postings = vector_db.entities.articles(name, entity_type, start_date, end_date, field, limit)
+        mentions = {posting['id']: posting['mentions'] for posting in postings}
+        articles = vector_db.get_articles_by_ids(list(mentions))
+        return [dict(article, mentions=mentions[article['id']]) for article in articles]
+
+    articles = await run_in_threadpool(lookup)
+    return {"success": True, "data": {"entity": name, "total": len(articles), "articles": articles}}
+
+@app.get("/api/v1/entities/cooccurrence")
+async def get_entity_cooccurrence(
+    name: str = Query(..., min_length=1),
+    entity_type: Optional[str] = Query(None, alias="type"),
+    start_date: Optional[str] = Query(None, description="YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="YYYY-MM-DD"),
+    field: Optional[str] = Query(None),
+    top_n: int = Query(20, ge=1, le=100)
+):
+    """Các thực thể hay xuất hiện cùng bài với thực thể này (số bài có cả hai)"""
+    _check_entity_query(start_date, end_date, field)
+    data = await run_in_threadpool(vector_db.entities.cooccurrence, name, entity_type, start_date, end_date, field, top_n)
+    return {"success": True, "data": data}
+
+@app.get("/api/v1/entities/timeline")
+async def get_entity_timeline(
+    name: str = Query(..., min_length=1),
+    entity_type: Optional[str] = Query(None, alias="type"),
+    start_date: Optional[str] = Query(None, description="YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="YYYY-MM-DD"),
+    field: Optional[str] = Query(None),
+    freq: str = Query("day", description="Gom theo day | week | month")
+):
+    """Số bài / số lần nhắc tới thực thể theo ngày, tuần hoặc tháng"""
+    _check_entity_query(start_date, end_date, field)
+    if freq not in TIME_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"freq phải là một trong {', '.join(TIME_BUCKETS)}")
+    data = await run_in_threadpool(vector_db.entities.timeline, name, entity_type, start_date, end_date, field, freq)
+    return {"success": True, "data": data}
+
+@app.get("/api/v1/topics")
+async def get_topics(
+    start_date: str = Query(..., description="YYYY-MM-DD"),
+    end_date: str = Query(..., description="YYYY-MM-DD"),
+    field: Optional[str] = Query(None, description="Lĩnh vực, bỏ trống = tất cả"),
+    min_size: int = Query(2, ge=1, description="Số bài tối thiểu của một câu chuyện"),
+    top_n: int = Query(20, ge=1, le=100)
+):
+    """Các câu chuyện (cluster bài theo embeddings) trong khoảng ngày, kèm nhãn từ khóa và bài tiêu biểu"""
+    if not topic_clusterer:
+        raise HTTPException(status_code=503, detail="Topic clusterer not initialized")
+    if not validate_date_format(start_date) or not validate_date_format(end_date):
+        raise HTTPException(status_code=400, detail="Ngày phải có định dạng YYYY-MM-DD")
+    if field and field not in VALID_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Field không hợp lệ. Các giá trị cho phép: {', '.join(VALID_FIELDS)}")
+    data = await run_in_threadpool(topic_clusterer.clusters, start_date, end_date, field, min_size, top_n)
+    return {"success": True, "data": data}
+
+@app.post("/api/v1/trends/sync")
+async def sync_trends(
+    background_tasks: BackgroundTasks,
+    start_date: str = Query(..., description="YYYY-MM-DD"),
+    end_date: str = Query(..., description="YYYY-MM-DD")
+):
+    """Nạp vào trend store các bài đã có trong DB nhưng chưa được thống kê (VD: DB có từ trước)"""
+    if not trend_store:
+        raise HTTPException(status_code=503, detail="Trend store not initialized")
+    if not validate_date_format(start_date) or not validate_date_format(end_date):
+        raise HTTPException(status_code=400, detail="Ngày phải có định dạng YYYY-MM-DD")
+    start_date, end_date = sorted((start_date, end_date))
+    articles = vector_db.get_articles_by_date(start_date, end_date)
+    missing = trend_store.missing(articles)
+    background_tasks.add_task(_update_entities, articles)
+    background_tasks.add_task(_update_trends, missing)
+    background_tasks.add_task(_update_topics, articles)
+    background_tasks.add_task(_update_sentiment, articles)
+    return {"success": True, "message": f"Đang thống kê {len(missing)}/{len(articles)} bài"}
+
+@app.get("/api/v1/chat/cache/stats")
+async def get_answer_cache_stats():
+    """Hit/miss của semantic answer cache và context cache phía provider"""
+    clients = [llm_client]
+    if isinstance(llm_client, LLMRouter):
+        clients = [llm_client.remote, llm_client.local]
+    context_cache = {
+        client.provider: client.context_cache_stats()
+        for client in clients if hasattr(client, 'context_cache_stats')
+    }
+    return {"success": True, "data": dict(answer_cache.stats(), context_cache=context_cache)}
+
+@app.get("/api/v1/chat/rerank/stats")
+async def get_rerank_stats():
+    """Latency (p50/p95), số lần vượt budget và cache của cross-encoder reranker"""
+    if not rag_service or rag_service.reranker is None:
+        return {"success": True, "data": None}
+    return {"success": True, "data": rag_service.reranker.stats()}
+
+def _sse(event: str, data) -> str:
+    """Format một event Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _chat_deadline(request: ChatRequest) -> Deadline:
+    budget = CHAT_DEADLINE_SECONDS
+    if request.deadline_ms:
+        budget = min(budget, request.deadline_ms / 1000)
+    return Deadline(budget)
+
+def _retrieval_only_answer(sources: List[Dict]) -> str:
+    """Câu trả lời khi không kịp (hoặc không thể) gọi LLM: liệt kê các bài liên quan"""
+    if not sources:
+        return "Xin lỗi, hệ thống đang quá tải và chưa tìm được bài báo liên quan. Vui lòng thử lại sau."
+    lines = ["Hệ thống đang quá tải nên chưa thể tổng hợp câu trả lời. Các bài báo liên quan:"]
+    lines.extend(f"[{src['index']}] {src.get('date', '')}: {src.get('title', '')} {src.get('url', '')}".rstrip()
+                 for src in sources)
+    return "\n".join(lines)
+
+async def _prepare_chat(request: ChatRequest, deadline: Deadline) -> Dict:
+    """
+    Các bước trước khi gọi LLM, dùng chung cho /chat và /chat/stream
+    1. nén lịch sử (rolling summary) và viết lại câu hỏi follow-up thành câu độc lập
+    2. câu hỏi điểm tin theo ngày -> trả digest luôn; hỏi khác về ngày đó -> digest vào context
+    3. retrieve (+ rerank) bằng câu đã viết lại, đóng gói context
+    4. tra answer cache (chỉ với câu hỏi không phụ thuộc hội thoại)
+
+    Các lần gọi LLM phụ và retrieval đều lấy timeout từ deadline, luôn để dành phần cho bước sinh câu trả lời.
+    """
+    query = request.message
+    summary, recent = None, conversation.normalize(request.history)
+    search_query = query
+    if recent:
+        # LLM phụ chỉ được dùng phần budget còn dư sau retrieval + generation; không đủ thì bỏ qua
+        # (summary đã cache vẫn dùng được, câu hỏi ghép với câu hỏi trước thay vì viết lại)
+        reserve = rag_service.generation_reserve + RETRIEVAL_RESERVE_SECONDS
+        if deadline.allows(reserve + MIN_AUX_LLM_SECONDS):
+            with deadline.stage("history"):
+                summary, recent = await conversation.compress(recent, timeout=deadline.timeout(reserve=reserve))
+        else:
+            deadline.skip("history", "deadline")
+            summary, recent = await conversation.compress(recent, timeout=0)
+        if deadline.allows(reserve + MIN_AUX_LLM_SECONDS):
+            with deadline.stage("rewrite"):
+                search_query = await conversation.rewrite_query(query, recent, summary,
+                                                                timeout=deadline.timeout(reserve=reserve))
+        else:
+            deadline.skip("rewrite", "deadline")
+            search_query = await conversation.rewrite_query(query, recent, summary, timeout=0)
+    llm_kwargs = {'query': search_query} if isinstance(llm_client, LLMRouter) else {}
+    first_turn = summary is None and not any(msg['role'] == 'user' for msg in recent)
+
+    # câu hỏi gắn với một ngày ("hôm qua kinh doanh có gì?") -> dùng digest đã tính sẵn
+    digests = []
+    scope = parse_date_scope(search_query) if digest_store else None
+    if scope:
+        digests = [d for d in digest_store.list(scope['date'], scope['field']) if d['top_stories']]
+    if digests and scope['summary'] and first_turn:
+        sources = [dict(src, index=i + 1) for i, src in
+                   enumerate(src for d in digests for src in digest_sources(d))]
+        return {
+            'cacheable': False,
+            'query_embedding': None,
+            'article_ids': [],
+            'sources': sources,
+            'hit': {'answer': "\n\n".join(format_digest(d) for d in digests), 'sources': sources},
+            'messages': [],
+            'llm_kwargs': llm_kwargs,
+        }
+
+    # encode + search là CPU-bound -> threadpool, không block event loop.
+    # Thread không huỷ được: hết hạn thì thôi chờ, request trả lời với những gì đang có
+    try:
+        with deadline.stage("retrieve"):
+            results, query_embedding = await asyncio.wait_for(
+                run_in_threadpool(rag_service.retrieve, search_query, 5, deadline),
+                timeout=deadline.timeout()
+            )
+    except asyncio.TimeoutError:
+        logger.warning(f"Retrieval exceeded deadline for query: {search_query}")
+        deadline.degraded = True
+        results, query_embedding = [], None
+    context, sources = rag_service.build_context(results)
+    article_ids = [doc['id'] for doc in results]
+    if digests:
+        context = "\n\n".join(format_digest(d) for d in digests) + "\n\n" + context
+
+    # đã có lượt hỏi trước thì câu trả lời phụ thuộc hội thoại -> không dùng answer cache
+    cacheable = query_embedding is not None and first_turn
+    return {
+        'cacheable': cacheable,
+        'query_embedding': query_embedding,
+        'article_ids': article_ids,
+        'sources': sources,
+        'hit': answer_cache.lookup(query_embedding, article_ids) if cacheable else None,
+        'messages': rag_service.format_prompt(query, context, history=recent, summary=summary),
+        # LLMRouter chọn provider theo câu hỏi (đã viết lại)
+        'llm_kwargs': llm_kwargs,
+    }
+
 @app.post("/api/v1/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """
     Chat with the RAG system
+
+    request.history: các lượt trước [{'role': 'user'|'assistant', 'content'}]
+    request.deadline_ms: time budget (mặc định SERPERIOR_CHAT_DEADLINE_MS); không kịp gọi LLM
+        thì trả lời bằng danh sách nguồn, response.timings cho biết stage nào đã chạy / bị bỏ qua
     """
+    deadline = _chat_deadline(request)
     try:
         if not rag_service or not llm_client:
             raise HTTPException(status_code=503, detail="RAG system not initialized")
         
-        query = request.message
+        # 1. Retrieve Context + Format Prompt
+        turn = await _prepare_chat(request, deadline)
+        hit = turn['hit']
+        if hit is not None:
+            return ChatResponse(success=True, response=hit['answer'], sources=hit['sources'], cached=True,
+                                degraded=deadline.degraded, timings=deadline.report())
         
-        # 1. Retrieve Context
-        context = rag_service.retrieve_context(query)
-        sources = []
-        if context:
-            # Quick parse to extract sources for UI (optional, naive parsing)
-            lines = context.split('\n')
-            for line in lines:
-                if line.startswith("Source"):
-                    sources.append(line)
-
-        # 2. Format Prompt
-        messages = rag_service.format_prompt(query, context)
-        
-        # 3. Generate Answer
-        answer = llm_client.generate_answer(messages)
+        # 2. Generate Answer (timeout = phần còn lại của deadline)
+        answer = None
+        if not deadline.allows(MIN_GENERATION_SECONDS):
+            deadline.skip("generate", "deadline")
+        else:
+            try:
+                with deadline.stage("generate") as stage:
+                    answer = await asyncio.wait_for(
+                        llm_client.agenerate_answer(turn['messages'], timeout=deadline.timeout(),
+                                                    **turn['llm_kwargs']),
+                        timeout=deadline.timeout()
+                    )
+                    if is_error_answer(answer):
+                        stage['status'] = 'error'
+            except asyncio.TimeoutError:
+                answer = LLMError("Error: LLM request timed out.")
+
+        if not answer or is_error_answer(answer):
+            if answer is not None:
+                logger.warning(f"Generation failed, answering with sources only: {answer[:200]}")
+            deadline.degraded = True
+            answer = _retrieval_only_answer(turn['sources'])
+        elif turn['cacheable']:
+            answer_cache.put(turn['query_embedding'], turn['article_ids'], answer, turn['sources'])
         
         return ChatResponse(
             success=True,
             response=answer,
-            sources=sources
+            sources=turn['sources'],
+            degraded=deadline.degraded,
+            timings=deadline.report()
         )
         
     except Exception as e:
@@ -436,5 +1024,82 @@ async def chat(request: ChatRequest):
         return ChatResponse(
             success=False,
             response="Xin lỗi, tôi gặp sự cố khi xử lý yêu cầu của bạn.",
-            error=str(e)
-        )
\ No newline at end of file
+            error=str(e),
+            timings=deadline.report()
+        )
+
+@app.post("/api/v1/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Chat with the RAG system, streaming (Server-Sent Events)
+
+    Events theo thứ tự:
+    - sources: danh sách nguồn (gửi ngay sau retrieval, trước khi gọi LLM)
+    - token: {"text": ...} mỗi đoạn câu trả lời (cache hit: cả câu trả lời trong một token)
+    - done {"success", "cached", "degraded", "timings"} / error
+    """
+    if not rag_service or not llm_client:
+        raise HTTPException(status_code=503, detail="RAG system not initialized")
+
+    async def event_stream():
+        deadline = _chat_deadline(request)
+        try:
+            turn = await _prepare_chat(request, deadline)
+            hit = turn['hit']
+            if hit is not None:
+                yield _sse("sources", hit['sources'])
+                yield _sse("token", {"text": hit['answer']})
+                yield _sse("done", {"success": True, "cached": True, "degraded": deadline.degraded,
+                                    "timings": deadline.report()})
+                return
+
+            yield _sse("sources", turn['sources'])
+
+            chunks = []
+            complete = False
+            if not deadline.allows(MIN_GENERATION_SECONDS):
+                deadline.skip("generate", "deadline")
+            else:
+                stream = llm_client.astream_answer(turn['messages'], timeout=deadline.timeout(),
+                                                   **turn['llm_kwargs'])
+                with deadline.stage("generate") as stage:
+                    try:
+                        while True:
+                            # mỗi đoạn chờ tối đa phần còn lại của deadline
+                            text = await asyncio.wait_for(stream.__anext__(), timeout=deadline.timeout())
+                            # lỗi provider là đoạn LLMError cuối (nhận theo kiểu, không theo nội dung)
+                            if is_error_answer(text):
+                                stage['status'] = 'error'
+                                break
+                            chunks.append(text)
+                            yield _sse("token", {"text": text})
+                    except StopAsyncIteration:
+                        complete = True
+                    except asyncio.TimeoutError:
+                        stage['status'] = 'timeout'
+                    finally:
+                        await stream.aclose()
+
+            if not chunks:
+                # chưa kịp có đoạn nào -> trả lời bằng danh sách nguồn
+                deadline.degraded = True
+                yield _sse("token", {"text": _retrieval_only_answer(turn['sources'])})
+            elif not complete:
+                # đã stream một phần thì giữ nguyên, chỉ đánh dấu câu trả lời bị cắt
+                deadline.degraded = True
+            elif turn['cacheable']:
+                # chỉ cache câu trả lời trọn vẹn
+                answer_cache.put(turn['query_embedding'], turn['article_ids'], "".join(chunks), turn['sources'])
+
+            yield _sse("done", {"success": True, "cached": False, "degraded": deadline.degraded,
+                                "timings": deadline.report()})
+        except Exception as e:
+            logger.error(f"Error in chat stream: {e}")
+            yield _sse("error", {"error": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # tắt buffer của proxy (nginx) để token tới client ngay
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,301 @@
+from array import array
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import glob
+import math
+import os
+import re
+import threading
+import numpy as np
+from .tokenizer import tokenize
+
+
+class BM25Index:
+    """
+    Inverted index BM25 trên các documents đã lưu trong vector db
+
+    Dense search (mpnet) hay bỏ sót các truy vấn khớp chính xác: tên riêng,
+    mã chứng khoán, con số. BM25 bù lại phần đó và được trộn với kết quả
+    vector bằng reciprocal-rank fusion trong ArticleVectorDB.hybrid_search.
+
+    Postings được giữ dạng array('i') (doc index, tf) để thêm bài mới
+    tăng dần mà không phải build lại. Trên đĩa: một file gốc (npz nén, save()) cộng các
+    segment nhỏ chỉ chứa bài mới của từng lần ingest (flush()); quá max_segments thì
+    compact lại thành file gốc.
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75,
+                 tokenizer: Callable[[str], List[str]] = tokenize, max_segments: int = 16):
+        """
+        Args:
+            path: file .npz để lưu index (None = chỉ giữ trong RAM)
+            k1, b: tham số BM25
+            tokenizer: hàm tách từ, mặc định underthesea word_tokenize
+            max_segments: số segment tối đa trước khi compact vào file gốc
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.tokenizer = tokenizer
+        self.max_segments = max_segments
+        self._lock = threading.RLock()
+        self._reset()
+
+        if path and os.path.exists(path):
+            try:
+                self.load()
+            except Exception as e:
+                print(f"Could not load BM25 index ({e}), starting empty")
+                self._reset()
+
+    def _reset(self) -> None:
+        self.doc_ids: List[str] = []
+        self._id_to_idx: Dict[str, int] = {}
+        self.doc_len = array('i')
+        self._total_len = 0
+        # term -> (doc indices, term frequencies)
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        # số documents đã nằm trên đĩa; tf của các documents sau đó chờ flush()
+        self._persisted = 0
+        self._pending: List[Dict[str, int]] = []
+        self._segments: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._id_to_idx
+
+    def add_documents(self, ids: Iterable[str], documents: Iterable[str],
+                      tokens: Optional[Iterable[List[str]]] = None) -> int:
+        """
+        Thêm documents vào index (bỏ qua id đã có)
+
+        Args:
+            tokens: tokens đã tách sẵn của từng document (VD: từ TokenCache), None = tự tách
+
+        Returns:
+            số documents thực sự được thêm
+        """
+        added = 0
+        documents = list(documents)
+        token_lists = list(tokens) if tokens is not None else [None] * len(documents)
+        with self._lock:
+            for doc_id, text, doc_tokens in zip(ids, documents, token_lists):
+                if doc_id in self._id_to_idx:
+                    continue
+
+                tokens = doc_tokens if doc_tokens is not None else self.tokenizer(text)
+                idx = len(self.doc_ids)
+                self.doc_ids.append(doc_id)
+                self._id_to_idx[doc_id] = idx
+                self.doc_len.append(len(tokens))
+                self._total_len += len(tokens)
+
+                tf: Dict[str, int] = {}
+                for token in tokens:
+                    tf[token] = tf.get(token, 0) + 1
+                for term, freq in tf.items():
+                    posting = self.postings.get(term)
+                    if posting is None:
+                        posting = (array('i'), array('i'))
+                        self.postings[term] = posting
+                    posting[0].append(idx)
+                    posting[1].append(freq)
+                if self.path:
+                    self._pending.append(tf)
+                added += 1
+        return added
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[str, float]]:
+        """
+        Tìm kiếm BM25
+
+        Returns:
+            List of (doc_id, score), score giảm dần
+        """
+        terms = set(self.tokenizer(query))
+        with self._lock:
+            n_docs = len(self.doc_ids)
+            if not terms or n_docs == 0:
+                return []
+
+            avgdl = self._total_len / n_docs if self._total_len else 1.0
+            doc_len = np.frombuffer(self.doc_len, dtype=np.int32)
+            scores = np.zeros(n_docs, dtype=np.float32)
+
+            for term in terms:
+                posting = self.postings.get(term)
+                if posting is None:
+                    continue
+                docs = np.frombuffer(posting[0], dtype=np.int32)
+                tfs = np.frombuffer(posting[1], dtype=np.int32).astype(np.float32)
+                df = len(docs)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * doc_len[docs] / avgdl)
+                scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+            hits = np.flatnonzero(scores)
+            if len(hits) == 0:
+                return []
+            if len(hits) > top_k:
+                hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+            hits = hits[np.argsort(-scores[hits], kind='stable')]
+
+            return [(self.doc_ids[i], float(scores[i])) for i in hits]
+
+    @staticmethod
+    def _write(path: str, doc_ids: List[str], doc_len: np.ndarray, terms: List[str],
+               postings: List[Tuple[np.ndarray, np.ndarray]], compressed: bool, **extra) -> None:
+        """Ghi dạng mảng phẳng (CSR): term_offsets trỏ vào post_docs/post_tfs"""
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, (docs, _) in enumerate(postings):
+            offsets[i + 1] = offsets[i] + len(docs)
+
+        post_docs = np.empty(offsets[-1], dtype=np.int32)
+        post_tfs = np.empty(offsets[-1], dtype=np.uint16)
+        for i, (docs, tfs) in enumerate(postings):
+            post_docs[offsets[i]:offsets[i + 1]] = docs
+            post_tfs[offsets[i]:offsets[i + 1]] = np.minimum(tfs, np.iinfo(np.uint16).max)
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # ghi file tạm rồi rename để không bao giờ để lại index hỏng
+        tmp_path = f"{path}.tmp.npz"
+        (np.savez_compressed if compressed else np.savez)(
+            tmp_path,
+            doc_ids=np.array(doc_ids, dtype=str),
+            doc_len=doc_len,
+            terms=np.array(terms, dtype=str),
+            term_offsets=offsets,
+            post_docs=post_docs,
+            post_tfs=post_tfs,
+            **extra
+        )
+        os.replace(tmp_path, path)
+
+    def _segment_files(self) -> List[str]:
+        """Các segment của self.path trên đĩa, theo thứ tự ghi"""
+        stem = self.path[:-len(".npz")] if self.path.endswith(".npz") else self.path
+        pattern = re.compile(re.escape(os.path.basename(stem)) + r"\.seg(\d+)\.npz$")
+        found = []
+        for file in glob.glob(f"{glob.escape(stem)}.seg*.npz"):
+            match = pattern.search(file)
+            if match:
+                found.append((int(match.group(1)), file))
+        return [file for _, file in sorted(found)]
+
+    def save(self, path: Optional[str] = None) -> None:
+        """Ghi toàn bộ index vào file gốc (compact), xoá các segment; O(corpus), dùng khi build lại"""
+        path = path or self.path
+        if not path:
+            return
+
+        with self._lock:
+            terms = list(self.postings.keys())
+            self._write(
+                path, self.doc_ids, np.frombuffer(self.doc_len, dtype=np.int32), terms,
+                [(np.frombuffer(self.postings[t][0], dtype=np.int32), np.frombuffer(self.postings[t][1], dtype=np.int32))
+                 for t in terms],
+                compressed=True
+            )
+            if path == self.path:
+                for file in self._segment_files():
+                    os.remove(file)
+                self._segments = []
+                self._persisted = len(self.doc_ids)
+                self._pending = []
+
+    def flush(self) -> None:
+        """
+        Lưu các documents thêm từ lần ghi trước thành một segment (chỉ gồm các bài đó, O(batch))
+
+        Gọi sau mỗi lần ingest. Chưa có file gốc hoặc đã đủ max_segments thì save() (compact).
+        """
+        if not self.path:
+            return
+
+        with self._lock:
+            if not self._pending:
+                return
+            if not os.path.exists(self.path) or len(self._segments) >= self.max_segments:
+                self.save()
+                return
+
+            start = self._persisted
+            by_term: Dict[str, Tuple[List[int], List[int]]] = {}
+            for offset, tf in enumerate(self._pending):
+                for term, freq in tf.items():
+                    docs, tfs = by_term.setdefault(term, ([], []))
+                    docs.append(start + offset)
+                    tfs.append(freq)
+
+            existing = self._segment_files()
+            number = int(re.search(r"\.seg(\d+)\.npz$", existing[-1]).group(1)) + 1 if existing else 1
+            stem = self.path[:-len(".npz")] if self.path.endswith(".npz") else self.path
+            segment = f"{stem}.seg{number:06d}.npz"
+            self._write(
+                segment, self.doc_ids[start:], np.frombuffer(self.doc_len, dtype=np.int32)[start:],
+                list(by_term), [(np.asarray(docs), np.asarray(tfs)) for docs, tfs in by_term.values()],
+                compressed=False, start=np.int64(start)
+            )
+            self._segments.append(segment)
+            self._persisted = len(self.doc_ids)
+            self._pending = []
+
+    def _append_arrays(self, data) -> None:
+        doc_ids = [str(x) for x in data['doc_ids']]
+        start = len(self.doc_ids)
+        self.doc_ids.extend(doc_ids)
+        self._id_to_idx.update((doc_id, start + i) for i, doc_id in enumerate(doc_ids))
+        self.doc_len.frombytes(data['doc_len'].astype(np.int32).tobytes())
+        self._total_len += int(data['doc_len'].sum())
+
+        offsets = data['term_offsets']
+        post_docs = data['post_docs'].astype(np.int32)
+        post_tfs = data['post_tfs'].astype(np.int32)
+        for i, term in enumerate(data['terms']):
+            begin, end = offsets[i], offsets[i + 1]
+            posting = self.postings.get(str(term))
+            if posting is None:
+                posting = (array('i'), array('i'))
+                self.postings[str(term)] = posting
+            posting[0].frombytes(post_docs[begin:end].tobytes())
+            posting[1].frombytes(post_tfs[begin:end].tobytes())
+
+    def load(self, path: Optional[str] = None) -> None:
+        """Đọc file gốc rồi áp các segment (chỉ với self.path)"""
+        path = path or self.path
+        with self._lock:
+            self._reset()
+            with np.load(path, allow_pickle=False) as data:
+                self._append_arrays(data)
+            if path != self.path:
+                return
+
+            segments = self._segment_files()
+            for n, segment in enumerate(segments):
+                with np.load(segment, allow_pickle=False) as data:
+                    start, size = int(data['start']), len(data['doc_ids'])
+                    if start + size <= len(self.doc_ids):
+                        # đã nằm trong file gốc (crash giữa lúc compact)
+                        self._segments.append(segment)
+                        continue
+                    follows = start == len(self.doc_ids)
+                    if follows:
+                        self._append_arrays(data)
+                if not follows:
+                    # segment không nối tiếp được thì các segment sau cũng vô dụng; ArticleVectorDB
+                    # thấy index thiếu bài sẽ build lại từ vector store
+                    print(f"BM25 segment {segment} does not follow the index, dropping {len(segments) - n} segments")
+                    for stale in segments[n:]:
+                        os.remove(stale)
+                    break
+                self._segments.append(segment)
+            self._persisted = len(self.doc_ids)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+            if self.path:
+                for file in [self.path] + self._segment_files():
+                    if os.path.exists(file):
+                        os.remove(file)
@@ -0,0 +1,213 @@
+from typing import Dict, List, Optional, Tuple
+import math
+from .trend_store import TrendStore
+
+ALL_FIELDS = "*"
+
+
+class BurstDetector:
+    """
+    Phát hiện chủ đề mới nổi (burst) trên luồng bài theo ngày
+
+    Với mỗi từ khóa / thực thể và mỗi lĩnh vực giữ trung bình + phương sai EWMA của tần suất
+    (số lần xuất hiện / số bài) theo ngày. Ngày mới nhất đang crawl dở được so với trạng thái đó
+    bằng z-score: z = (tần suất hôm nay - trung bình) / độ lệch chuẩn.
+
+    Trạng thái được cập nhật tăng dần: mỗi ngày đã "đóng" (có ngày mới hơn) chỉ được xử lý một lần,
+    theo thứ tự, nên crawl liên tục không phải quét lại lịch sử. Ngày cũ được backfill sau khi
+    đã qua watermark thì không làm thay đổi trạng thái.
+
+    Decay lười: mỗi dòng nhớ số ngày (day) mà mean/var đang đúng; những ngày từ khóa vắng mặt
+    (x = 0) được cộng dồn bằng công thức đóng khi nó xuất hiện lại / khi đọc, nên mỗi ngày chỉ
+    ghi các từ khóa có mặt trong ngày đó chứ không phải toàn bộ từ vựng.
+    """
+
+    def __init__(self, store: TrendStore, alpha: float = 0.3, min_count: int = 3,
+                 z_threshold: float = 2.0, warmup_days: int = 3, prune_rate: float = 1e-3):
+        """
+        Args:
+            store: TrendStore nguồn thống kê theo ngày; trạng thái lưu chung file SQLite, dùng chung
+                   connection + lock của store (hai connection ghi cùng file từ hai thread -> "database is locked")
+            alpha: hệ số EWMA (lớn -> phản ứng nhanh, quên nhanh)
+            min_count: số lần xuất hiện tối thiểu trong ngày để được xét
+            z_threshold: z-score tối thiểu để coi là burst
+            warmup_days: số ngày đã xử lý tối thiểu trước khi z-score có ý nghĩa
+            prune_rate: trung bình EWMA dưới mức này (và hôm đó không xuất hiện) thì bỏ khỏi trạng thái
+        """
+        self.store = store
+        self.alpha = alpha
+        self.min_count = min_count
+        self.z_threshold = z_threshold
+        self.warmup_days = warmup_days
+        self.prune_rate = prune_rate
+        self._lock = store._lock
+        self._conn = store._conn
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS burst_state (
+                    field TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    mean REAL NOT NULL,
+                    var REAL NOT NULL,
+                    days INTEGER NOT NULL,
+                    PRIMARY KEY (field, kind, key)
+                );
+                CREATE TABLE IF NOT EXISTS burst_watermark (
+                    field TEXT PRIMARY KEY,
+                    last_date TEXT NOT NULL,
+                    days INTEGER NOT NULL
+                );
+            """)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(burst_state)")}
+            if 'day' not in columns:
+                # state cũ được cập nhật mỗi ngày -> day NULL = đúng tại watermark
+                self._conn.execute("ALTER TABLE burst_state ADD COLUMN day INTEGER")
+            self._conn.create_function("burst_decay", 2, self._decayed_mean, deterministic=True)
+
+    def _watermark(self, field_key: str) -> Tuple[Optional[str], int]:
+        row = self._conn.execute(
+            "SELECT last_date, days FROM burst_watermark WHERE field = ?", (field_key,)
+        ).fetchone()
+        return (row[0], row[1]) if row else (None, 0)
+
+    def _decayed_mean(self, mean: float, steps: int) -> float:
+        return mean * (1 - self.alpha) ** max(steps, 0)
+
+    def _decay(self, entry: List, day: int) -> None:
+        """Đưa [mean, var, seen, day] tới ngày day, coi các ngày ở giữa có x = 0"""
+        steps = day - entry[3]
+        if steps <= 0:
+            return
+        keep = (1 - self.alpha) ** steps
+        # lặp k lần: mean <- (1-a) mean, var <- (1-a) (var + a mean^2), dạng đóng:
+        entry[1] = keep * (entry[1] + entry[0] ** 2 * (1 - keep))
+        entry[0] *= keep
+        entry[2] += steps
+        entry[3] = day
+
+    def _load_state(self, field_key: str, items: List[Tuple[str, str]], n_days: int) -> Dict[Tuple[str, str], List]:
+        """[mean, var, seen, day] của các item (item chưa có trạng thái thì không có trong kết quả)"""
+        state = {}
+        for start in range(0, len(items), 400):
+            batch = items[start:start + 400]
+            params: List = [field_key]
+            for item_kind, key in batch:
+                params.extend((item_kind, key))
+            rows = self._conn.execute(
+                "SELECT kind, key, mean, var, days, day FROM burst_state WHERE field = ? AND ("
+                + " OR ".join("(kind = ? AND key = ?)" for _ in batch) + ")",
+                params
+            ).fetchall()
+            for item_kind, key, mean, var, seen, day in rows:
+                state[(item_kind, key)] = [mean, var, seen, n_days if day is None else day]
+        return state
+
+    def advance(self, field: Optional[str] = None) -> int:
+        """
+        Đưa các ngày đã đóng (trước ngày mới nhất) chưa xử lý vào trạng thái EWMA
+
+        Args:
+            field: lĩnh vực, None = gộp tất cả
+        Returns:
+            số ngày được xử lý
+        """
+        field_key = field or ALL_FIELDS
+        days = self.store.dates(field)
+        with self._lock:
+            watermark, n_days = self._watermark(field_key)
+            closed = [d for d in days[:-1] if watermark is None or d > watermark]
+            if not closed:
+                return 0
+
+            # chỉ các item xuất hiện trong các ngày vừa đóng bị đổi
+            start_days = n_days
+            state: Dict[Tuple[str, str], List] = {}
+            for day in closed:
+                articles, counts = self.store.day_counts(day, field)
+                if not articles:
+                    continue
+                new_items = [item for item in counts if item not in state]
+                state.update(self._load_state(field_key, new_items, start_days))
+                for item, count in counts.items():
+                    entry = state.setdefault(item, [0.0, 0.0, 0, n_days])
+                    self._decay(entry, n_days)
+                    diff = count / articles - entry[0]
+                    incr = self.alpha * diff
+                    entry[0] += incr
+                    entry[1] = (1 - self.alpha) * (entry[1] + diff * incr)
+                    entry[2] += 1
+                    entry[3] = n_days + 1
+                n_days += 1
+
+            with self._conn:
+                self._conn.executemany("""
+                    INSERT INTO burst_state (field, kind, key, mean, var, days, day) VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (field, kind, key) DO UPDATE SET
+                        mean = excluded.mean, var = excluded.var, days = excluded.days, day = excluded.day
+                """, [(field_key, kind, key, *entry) for (kind, key), entry in state.items()])
+                # bỏ các item đã nguội hẳn (trung bình sau decay dưới prune_rate)
+                self._conn.execute(
+                    "DELETE FROM burst_state WHERE field = ? AND burst_decay(mean, ? - COALESCE(day, ?)) < ?",
+                    (field_key, n_days, start_days, self.prune_rate)
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO burst_watermark (field, last_date, days) VALUES (?, ?, ?)",
+                    (field_key, closed[-1], n_days)
+                )
+        return len(closed)
+
+    def trending(self, field: Optional[str] = None, top_n: int = 20,
+                 kind: Optional[str] = None) -> Dict:
+        """
+        Các từ khóa / thực thể đang burst trong ngày mới nhất
+
+        Args:
+            kind: 'term' | 'entity' | None (cả hai)
+        Returns:
+            {'date', 'articles', 'baseline_days', 'warm', 'items': [{'kind', 'text', 'type'?, 'count',
+             'rate', 'baseline_rate', 'z'}]}
+        """
+        # chỉ đọc: trạng thái được advance lúc ingest (xem _update_trends trong api.py)
+        field_key = field or ALL_FIELDS
+        days = self.store.dates(field)
+        if not days:
+            return {'date': None, 'articles': 0, 'baseline_days': 0, 'warm': False, 'items': []}
+
+        day = days[-1]
+        articles, counts = self.store.day_counts(day, field)
+        candidates = [item for item, count in counts.items()
+                      if count >= self.min_count and (kind is None or item[0] == kind)]
+        with self._lock:
+            _, n_days = self._watermark(field_key)
+            state = self._load_state(field_key, candidates, n_days)
+        for entry in state.values():
+            self._decay(entry, n_days)
+
+        items = []
+        for item in candidates:
+            count = counts[item]
+            x = count / articles
+            mean, var = state.get(item, (0.0, 0.0))[:2]
+            # sàn phương sai kiểu Poisson: từ hiếm / trạng thái mới không cho z vô hạn
+            z = (x - mean) / math.sqrt(var + max(mean, 1 / articles) / articles)
+            if z < self.z_threshold:
+                continue
+            entry = {'kind': item[0], 'text': item[1], 'count': count,
+                     'rate': round(x, 4), 'baseline_rate': round(mean, 4), 'z': round(z, 2)}
+            if item[0] == 'entity':
+                entry['text'], entry['type'] = item[1].rsplit('|', 1)
+            items.append(entry)
+        items.sort(key=lambda e: e['z'], reverse=True)
+
+        return {
+            'date': day,
+            'articles': articles,
+            'baseline_days': n_days,
+            # chưa đủ ngày lịch sử thì mọi từ đều "mới", kết quả chỉ mang tính tham khảo
+            'warm': n_days >= self.warmup_days,
+            'items': items[:top_n],
+        }
+
+    def close(self) -> None:
+        """Connection thuộc về TrendStore, đóng bằng TrendStore.close()"""
@@ -29,6 +29,7 @@ class DantriCrawler(BaseCrawler):
         # 'bat-dong-san'
         self.field = field
         self.results = []
+        self.duplicates = []
         self.results_lock = threading.Lock()
         self.max_workers = max_workers
         urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -233,12 +234,17 @@ class DantriCrawler(BaseCrawler):
                 "date": date_str,
                 "title": article_data['title'],
                 "body": article_data['body'],
-                "url": link
+                "url": link,
+                "field": self.field
             }
         return None
 
-    def crawl_by_date_range(self, start_date: str, end_date: str, num_articles: int = 5, save: bool = False):
+    def crawl_by_date_range(self, start_date: str, end_date: str, num_articles: int = 5, save: bool = False,
+                            duplicate_checker=None):
+        # duplicate_checker (ArticleVectorDB.duplicate_checker()): bài gần trùng với bài đã lưu / đã crawl
+        # trong lần này không được tính vào kết quả, chỉ ghi vào self.duplicates kèm 'duplicate_of'
         self.results = []
+        self.duplicates = []
 
         try:
             start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
@@ -281,14 +287,24 @@ class DantriCrawler(BaseCrawler):
             for link in links:
                 result = self._process_article(link, target_dates_set, crawled_dates_counter)
 
-                if result:
-                    date_str = result['date']
-                    with self.results_lock:
-                        if crawled_dates_counter[date_str] < num_articles:
-                            crawled_dates_counter[date_str] += 1
-                            self.results.append(result)
-                            # pbar.update(1)
-                            print(f"✓ Tìm thấy [{date_str}] ({crawled_dates_counter[date_str]}/{num_articles}): {result['title'][:60]}...", flush=True)
+                if not result:
+                    continue
+                date_str = result['date']
+                with self.results_lock:
+                    # đủ bài cho ngày này thì bỏ qua trước khi kiểm tra trùng: check_article ghi
+                    # chữ ký của bài được nhận vào lô, bài bị bỏ vì hết chỉ tiêu không được ghi
+                    if crawled_dates_counter[date_str] >= num_articles:
+                        continue
+                    match = duplicate_checker.check_article(result) if duplicate_checker is not None else None
+                    if match:
+                        result['duplicate_of'], result['similarity'] = match
+                        self.duplicates.append(result)
+                        print(f"✗ Bỏ qua bài gần trùng ({match[1]:.2f}): {result['title'][:60]}...", flush=True)
+                        continue
+                    crawled_dates_counter[date_str] += 1
+                    self.results.append(result)
+                    # pbar.update(1)
+                    print(f"✓ Tìm thấy [{date_str}] ({crawled_dates_counter[date_str]}/{num_articles}): {result['title'][:60]}...", flush=True)
 
             current_d -= timedelta(days=1)
 
@@ -0,0 +1,141 @@
+from sentence_transformers import SentenceTransformer
+from typing import List, Optional
+import os
+import numpy as np
+
+ENCODER_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+class TextEncoder:
+    """
+    Bọc SentenceTransformer cho hot path của ArticleVectorDB
+
+    - backend 'torch' (mặc định), 'onnx' (ONNX Runtime) hoặc 'onnx-int8'
+      (ONNX + dynamic int8 quantization, nhanh nhất trên CPU)
+    - encode_documents: batch theo độ dài, mỗi batch giới hạn theo tổng số token
+      nên bài dài không kéo cả batch bị pad theo (độ dài ước lượng từ số ký tự,
+      không tokenize trước: model.encode đã tự tokenize một lần)
+    - encode_query: fast path cho một câu, không progress bar, không convert list
+    """
+
+    def __init__(self, model_name: str, backend: str = "torch", device: str = "cpu",
+                 max_tokens_per_batch: int = 8192, quantization: str = "avx2",
+                 cache_dir: Optional[str] = None, chars_per_token: float = 3.0, model=None):
+        """
+        Args:
+            model_name: tên model trên HuggingFace Hub
+            backend: 'torch' | 'onnx' | 'onnx-int8'
+            device: 'cpu' hoặc 'cuda'
+            max_tokens_per_batch: ngân sách token (đã pad) cho mỗi batch khi ingest
+            quantization: cấu hình int8 ('avx2', 'avx512', 'avx512_vnni', 'arm64')
+            cache_dir: nơi lưu model int8 tự export nếu Hub không có sẵn
+            chars_per_token: tỉ lệ ký tự / token để ước lượng độ dài khi chia batch
+            model: model đã load sẵn, có encode(...) (mặc định load theo backend)
+        """
+        if backend not in ENCODER_BACKENDS:
+            raise ValueError(f"Unknown encoder backend: {backend}. Valid: {', '.join(ENCODER_BACKENDS)}")
+
+        self.model_name = model_name
+        self.backend = backend
+        self.device = device
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.quantization = quantization
+        self.chars_per_token = chars_per_token
+
+        if cache_dir is None:
+            base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            cache_dir = os.path.join(base_dir, "data", "encoders")
+        self.cache_dir = cache_dir
+
+        if model is not None:
+            self.model = model
+        elif backend == "torch":
+            self.model = SentenceTransformer(model_name, device=device)
+        elif backend == "onnx":
+            self.model = SentenceTransformer(model_name, device=device, backend="onnx")
+        else:
+            self.model = self._load_int8()
+
+    def _load_int8(self) -> SentenceTransformer:
+        file_name = f"onnx/model_qint8_{self.quantization}.onnx"
+        try:
+            # nhiều model sentence-transformers đã có sẵn bản int8 trên Hub
+            return SentenceTransformer(self.model_name, device=self.device, backend="onnx",
+                                       model_kwargs={"file_name": file_name})
+        except Exception:
+            pass
+
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        local_dir = os.path.join(self.cache_dir, self.model_name.replace('/', '__'))
+        if not os.path.exists(os.path.join(local_dir, file_name)):
+            print(f"Exporting int8 ONNX model to {local_dir}...")
+            model = SentenceTransformer(self.model_name, device=self.device, backend="onnx")
+            model.save(local_dir)
+            export_dynamic_quantized_onnx_model(model, self.quantization, local_dir)
+        return SentenceTransformer(local_dir, device=self.device, backend="onnx",
+                                   model_kwargs={"file_name": file_name})
+
+    def _token_lengths(self, texts: List[str]) -> List[int]:
+        """
+        Ước lượng số token từ số ký tự: chỉ dùng để sắp xếp và chia batch nên không cần chính xác,
+        tokenize thật ở đây thì mỗi bài bị tokenize hai lần (model.encode tokenize lại)
+        """
+        max_len = self.model.max_seq_length
+        return [min(int(len(t) / self.chars_per_token) + 2, max_len) for t in texts]
+
+    def encode_documents(self, texts: List[str], show_progress_bar: bool = False) -> np.ndarray:
+        """
+        Encode nhiều văn bản (ingest)
+
+        Sắp xếp theo độ dài (ước lượng) rồi cắt batch sao cho
+        (độ dài dài nhất trong batch) * (số câu) <= max_tokens_per_batch.
+
+        Returns:
+            np.ndarray (len(texts), dim), đúng thứ tự đầu vào
+        """
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+
+        lengths = self._token_lengths(texts)
+        # dài trước: batch đầu là batch tốn bộ nhớ nhất, lỗi OOM lộ ra sớm
+        order = sorted(range(len(texts)), key=lambda i: -lengths[i])
+
+        batches = []
+        current = []
+        for i in order:
+            # lengths giảm dần nên phần tử đầu batch là dài nhất
+            batch_max = lengths[current[0]] if current else lengths[i]
+            if current and batch_max * (len(current) + 1) > self.max_tokens_per_batch:
+                batches.append(current)
+                current = []
+            current.append(i)
+        if current:
+            batches.append(current)
+
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for n, batch in enumerate(batches):
+            if show_progress_bar:
+                print(f"\rEncoding batch {n + 1}/{len(batches)}", end="", flush=True)
+            embeddings[batch] = self.model.encode(
+                [texts[i] for i in batch],
+                batch_size=len(batch),
+                show_progress_bar=False,
+                convert_to_numpy=True
+            )
+        if show_progress_bar:
+            print()
+        return embeddings
+
+    def encode_query(self, text: str) -> np.ndarray:
+        """Fast path cho một query: trả về vector 1-D"""
+        return self.model.encode(
+            text,
+            batch_size=1,
+            show_progress_bar=False,
+            convert_to_numpy=True
+        )
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
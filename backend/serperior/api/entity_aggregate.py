@@ -0,0 +1,155 @@
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+import heapq
+import re
+import unicodedata
+from .term_matrix import bucket_of
+
+_SPACES = re.compile(r"[\s_]+")
+# dấu câu thừa ở hai đầu do ghép subword (VD: "Vingroup," / "(SJC")
+_EDGE_PUNCT = " \t\"'“”‘’.,;:!?()[]{}-–—"
+
+
+def normalize_surface(text: str) -> str:
+    """Dạng hiển thị: NFC, gộp khoảng trắng (kể cả '_' của PhoBERT), bỏ dấu câu ở hai đầu"""
+    return _SPACES.sub(" ", unicodedata.normalize("NFC", text)).strip(_EDGE_PUNCT)
+
+
+def normalize_entity(text: str) -> str:
+    """Khoá so khớp: dạng hiển thị, không phân biệt hoa thường ("Hà Nội" == "hà nội")"""
+    return normalize_surface(text).casefold()
+
+
+class EntityAggregate:
+    """
+    Tổng hợp thực thể gọn nhẹ trên nhiều bài
+
+    - mỗi (tên đã normalize, loại) được intern thành một id số nguyên; tên hiển thị là dạng gặp nhiều nhất
+    - đếm bằng mảng theo id: số lần nhắc, số bài nhắc tới, số lần nhắc theo từng ngày
+    - không giữ danh sách từng lần nhắc; tổng hợp từng phần (VD: mỗi worker một phần) gộp lại bằng merge()
+    """
+
+    def __init__(self):
+        self._ids: Dict[Tuple[str, str], int] = {}
+        self.keys: List[Tuple[str, str]] = []
+        self._surfaces: List[Dict[str, int]] = []
+        self.counts = array('L')
+        self.article_counts = array('L')
+        self._by_date: Dict[str, array] = {}
+        self.articles = 0
+        self.mentions = 0
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def intern(self, text: str, entity_type: str) -> Optional[int]:
+        """Id của thực thể (tạo mới nếu chưa có); tên rỗng sau khi normalize -> None"""
+        surface = normalize_surface(text)
+        if not surface:
+            return None
+        key = (surface.casefold(), entity_type)
+        entity_id = self._ids.get(key)
+        if entity_id is None:
+            entity_id = self._ids[key] = len(self.keys)
+            self.keys.append(key)
+            self._surfaces.append({})
+            self.counts.append(0)
+            self.article_counts.append(0)
+        surfaces = self._surfaces[entity_id]
+        surfaces[surface] = surfaces.get(surface, 0) + 1
+        return entity_id
+
+    def _date_counts(self, date: str) -> array:
+        counts = self._by_date.get(date)
+        if counts is None:
+            counts = self._by_date[date] = array('L')
+        if len(counts) < len(self.keys):
+            counts.extend([0] * (len(self.keys) - len(counts)))
+        return counts
+
+    def add_article(self, entities: Iterable[Dict], date: Optional[str] = None) -> None:
+        """Cộng các thực thể ({'text', 'type'}) của một bài"""
+        self.articles += 1
+        seen = set()
+        ids = []
+        for entity in entities:
+            entity_id = self.intern(entity['text'], entity['type'])
+            if entity_id is None:
+                continue
+            self.counts[entity_id] += 1
+            self.mentions += 1
+            ids.append(entity_id)
+            if entity_id not in seen:
+                seen.add(entity_id)
+                self.article_counts[entity_id] += 1
+        if date and ids:
+            counts = self._date_counts(date)
+            for entity_id in ids:
+                counts[entity_id] += 1
+
+    def merge(self, other: "EntityAggregate") -> "EntityAggregate":
+        """Cộng một tổng hợp khác vào (id của other được ánh xạ sang id của self)"""
+        mapping = []
+        for (key, entity_type), surfaces in zip(other.keys, other._surfaces):
+            entity_id = self._ids.get((key, entity_type))
+            if entity_id is None:
+                entity_id = self._ids[(key, entity_type)] = len(self.keys)
+                self.keys.append((key, entity_type))
+                self._surfaces.append({})
+                self.counts.append(0)
+                self.article_counts.append(0)
+            merged = self._surfaces[entity_id]
+            for surface, count in surfaces.items():
+                merged[surface] = merged.get(surface, 0) + count
+            mapping.append(entity_id)
+
+        for other_id, entity_id in enumerate(mapping):
+            self.counts[entity_id] += other.counts[other_id]
+            self.article_counts[entity_id] += other.article_counts[other_id]
+        for date, other_counts in other._by_date.items():
+            counts = self._date_counts(date)
+            for other_id, count in enumerate(other_counts):
+                if count:
+                    counts[mapping[other_id]] += count
+        self.articles += other.articles
+        self.mentions += other.mentions
+        return self
+
+    def text(self, entity_id: int) -> str:
+        """Tên hiển thị: dạng gặp nhiều nhất (bằng nhau thì dạng gặp trước)"""
+        surfaces = self._surfaces[entity_id]
+        return max(surfaces, key=surfaces.get)
+
+    def entity_type(self, entity_id: int) -> str:
+        return self.keys[entity_id][1]
+
+    def most_common(self, n: Optional[int] = None, entity_type: Optional[str] = None) -> List[Tuple[int, int]]:
+        """[(id, số lần nhắc)] nhiều nhất trước; bằng nhau thì thực thể gặp trước đứng trước"""
+        ids = range(len(self.keys)) if entity_type is None else \
+            [i for i, (_, etype) in enumerate(self.keys) if etype == entity_type]
+        if n is None:
+            ranked = sorted(ids, key=lambda i: (-self.counts[i], i))
+        else:
+            ranked = heapq.nsmallest(n, ids, key=lambda i: (-self.counts[i], i))
+        return [(i, self.counts[i]) for i in ranked]
+
+    def types(self) -> Dict[str, int]:
+        """Số thực thể khác nhau theo loại"""
+        result: Dict[str, int] = {}
+        for _, entity_type in self.keys:
+            result[entity_type] = result.get(entity_type, 0) + 1
+        return result
+
+    def timeline(self, entity_ids: List[int], freq: str = 'day') -> Dict[str, Dict[str, int]]:
+        """Số lần nhắc của các thực thể theo ngày/tuần/tháng: {bucket: {tên: count}}"""
+        result: Dict[str, Dict[str, int]] = {}
+        for date in sorted(self._by_date):
+            bucket = bucket_of(date, freq)
+            if bucket is None:
+                continue
+            counts = self._by_date[date]
+            row = result.setdefault(bucket, {self.text(i): 0 for i in entity_ids})
+            for i in entity_ids:
+                if i < len(counts):
+                    row[self.text(i)] += counts[i]
+        return result
@@ -0,0 +1,309 @@
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+import os
+import re
+import sqlite3
+import threading
+from .entity_aggregate import normalize_entity, normalize_surface
+from .term_matrix import bucket_of
+
+_WORD = re.compile(r'\w+')
+
+
+class EntityIndex:
+    """
+    Inverted index thực thể -> bài, điền lúc ingest (NER theo batch), lưu cạnh vector store
+
+    Khoá thực thể là tên đã normalize (xem normalize_entity) + loại; mỗi posting giữ id bài
+    (id của ArticleVectorDB), ngày, lĩnh vực và số lần nhắc trong bài. Tra "các bài nhắc tới X",
+    thực thể hay đi cùng X, timeline của X đều là truy vấn SQL, không phải chạy lại NER.
+
+    Dùng chung cho mọi generation (như TokenCache): bài không còn trong generation đang active
+    được lọc khi đọc lại từ vector store.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_query_words: int = 4, min_key_length: int = 3):
+        """
+        Args:
+            path: file SQLite (None = chỉ giữ trong RAM)
+            max_query_words: cụm dài nhất (số từ) được thử khi tìm thực thể trong câu hỏi
+            min_key_length: thực thể ngắn hơn (ký tự) không được khớp trong câu hỏi
+        """
+        self.path = path
+        self.max_query_words = max_query_words
+        self.min_key_length = min_key_length
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS entities (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    key TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    UNIQUE (key, type)
+                );
+                CREATE TABLE IF NOT EXISTS postings (
+                    entity_id INTEGER NOT NULL,
+                    article_id TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    field TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (entity_id, article_id)
+                );
+                CREATE INDEX IF NOT EXISTS postings_article ON postings (article_id);
+                CREATE INDEX IF NOT EXISTS postings_entity_date ON postings (entity_id, date);
+                CREATE TABLE IF NOT EXISTS indexed_articles (
+                    article_id TEXT PRIMARY KEY,
+                    date TEXT NOT NULL,
+                    field TEXT NOT NULL
+                );
+            """)
+
+    # ---------------- ingest ----------------
+
+    def missing(self, article_ids: List[str]) -> List[str]:
+        """Các id bài chưa được đưa vào index (kể cả bài không có thực thể nào đã được đánh dấu)"""
+        known = set()
+        with self._lock:
+            for start in range(0, len(article_ids), 500):
+                batch = article_ids[start:start + 500]
+                known.update(row[0] for row in self._conn.execute(
+                    f"SELECT article_id FROM indexed_articles WHERE article_id IN ({','.join('?' * len(batch))})",
+                    batch
+                ))
+        return [doc_id for doc_id in dict.fromkeys(article_ids) if doc_id not in known]
+
+    def add_articles(self, articles: List[Dict], entities: List[List[Dict]]) -> int:
+        """
+        Đưa thực thể của các bài vào index; bài đã có thì bỏ qua
+
+        Args:
+            articles: dict có 'id', 'date' (+ 'field')
+            entities: thực thể của từng bài [{'text', 'type'}] (kết quả NER)
+        Returns:
+            số bài được thêm
+        """
+        added = 0
+        with self._lock, self._conn:
+            for article, article_entities in zip(articles, entities):
+                day, field = article.get('date') or '', article.get('field') or ''
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO indexed_articles (article_id, date, field) VALUES (?, ?, ?)",
+                    (article['id'], day, field)
+                )
+                if cursor.rowcount == 0:
+                    continue
+                added += 1
+
+                counts: Counter = Counter()
+                names: Dict[Tuple[str, str], str] = {}
+                for entity in article_entities:
+                    surface = normalize_surface(entity['text'])
+                    if not surface:
+                        continue
+                    key = (surface.casefold(), entity['type'])
+                    counts[key] += 1
+                    names.setdefault(key, surface)
+
+                for (key, entity_type), count in counts.items():
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO entities (key, type, name) VALUES (?, ?, ?)",
+                        (key, entity_type, names[(key, entity_type)])
+                    )
+                    entity_id = self._conn.execute(
+                        "SELECT id FROM entities WHERE key = ? AND type = ?", (key, entity_type)
+                    ).fetchone()[0]
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO postings (entity_id, article_id, date, field, count) "
+                        "VALUES (?, ?, ?, ?, ?)", (entity_id, article['id'], day, field, count)
+                    )
+        return added
+
+    # ---------------- queries ----------------
+
+    @staticmethod
+    def _filters(start_date: Optional[str], end_date: Optional[str], field: Optional[str],
+                 alias: str = "p") -> Tuple[str, List]:
+        clauses, params = [], []
+        if start_date and end_date:
+            # API nhận khoảng ngày theo cả hai chiều (crawl dùng start_date >= end_date)
+            start_date, end_date = sorted((start_date, end_date))
+            clauses.append(f"{alias}.date BETWEEN ? AND ?")
+            params.extend((start_date, end_date))
+        if field:
+            clauses.append(f"{alias}.field = ?")
+            params.append(field)
+        return "".join(f" AND {clause}" for clause in clauses), params
+
+    def _resolve(self, name: str, entity_type: Optional[str] = None) -> List[int]:
+        key = normalize_entity(name)
+        if entity_type:
+            rows = self._conn.execute("SELECT id FROM entities WHERE key = ? AND type = ?", (key, entity_type))
+        else:
+            rows = self._conn.execute("SELECT id FROM entities WHERE key = ?", (key,))
+        return [row[0] for row in rows]
+
+    def find(self, name: str, entity_type: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """
+        Thực thể khớp tên: khớp chính xác (sau normalize) trước, sau đó các thực thể chứa tên
+
+        Returns:
+            [{'name', 'type', 'articles', 'mentions'}], nhiều bài nhất trước
+        """
+        key = normalize_entity(name)
+        if not key:
+            return []
+        type_clause, params = ("AND e.type = ?", [entity_type]) if entity_type else ("", [])
+        pattern = "%" + key.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        with self._lock:
+            rows = self._conn.execute(f"""
+                SELECT e.name, e.type, COUNT(p.article_id) AS articles, COALESCE(SUM(p.count), 0),
+                       e.key = ? AS exact
+                FROM entities e LEFT JOIN postings p ON p.entity_id = e.id
+                WHERE e.key LIKE ? ESCAPE '\\' {type_clause}
+                GROUP BY e.id ORDER BY exact DESC, articles DESC, e.name LIMIT ?
+            """, [key, pattern] + params + [limit]).fetchall()
+        return [{'name': entity, 'type': etype, 'articles': articles, 'mentions': mentions}
+                for entity, etype, articles, mentions, _ in rows]
+
+    def articles(self, name: str, entity_type: Optional[str] = None, start_date: Optional[str] = None,
+                 end_date: Optional[str] = None, field: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """
+        Các bài nhắc tới thực thể, mới nhất trước
+
+        Returns:
+            [{'id', 'date', 'field', 'mentions'}]
+        """
+        filters, params = self._filters(start_date, end_date, field)
+        with self._lock:
+            ids = self._resolve(name, entity_type)
+            if not ids:
+                return []
+            rows = self._conn.execute(f"""
+                SELECT p.article_id, p.date, p.field, SUM(p.count) FROM postings p
+                WHERE p.entity_id IN ({','.join('?' * len(ids))}){filters}
+                GROUP BY p.article_id ORDER BY p.date DESC, p.article_id LIMIT ?
+            """, ids + params + [limit]).fetchall()
+        return [{'id': doc_id, 'date': day, 'field': doc_field, 'mentions': mentions}
+                for doc_id, day, doc_field, mentions in rows]
+
+    def cooccurrence(self, name: str, entity_type: Optional[str] = None, start_date: Optional[str] = None,
+                     end_date: Optional[str] = None, field: Optional[str] = None, top_n: int = 20) -> List[Dict]:
+        """
+        Các thực thể xuất hiện cùng bài với thực thể này
+
+        Returns:
+            [{'name', 'type', 'articles'}] - số bài có cả hai, nhiều nhất trước
+        """
+        filters, params = self._filters(start_date, end_date, field)
+        with self._lock:
+            ids = self._resolve(name, entity_type)
+            if not ids:
+                return []
+            marks = ','.join('?' * len(ids))
+            rows = self._conn.execute(f"""
+                SELECT e.name, e.type, COUNT(DISTINCT other.article_id) AS articles
+                FROM postings p
+                JOIN postings other ON other.article_id = p.article_id AND other.entity_id NOT IN ({marks})
+                JOIN entities e ON e.id = other.entity_id
+                WHERE p.entity_id IN ({marks}){filters}
+                GROUP BY other.entity_id ORDER BY articles DESC, e.name LIMIT ?
+            """, ids + ids + params + [top_n]).fetchall()
+        return [{'name': entity, 'type': etype, 'articles': articles} for entity, etype, articles in rows]
+
+    def timeline(self, name: str, entity_type: Optional[str] = None, start_date: Optional[str] = None,
+                 end_date: Optional[str] = None, field: Optional[str] = None,
+                 freq: str = 'day') -> Dict[str, Dict[str, int]]:
+        """Số bài và số lần nhắc theo ngày/tuần/tháng: {bucket: {'articles', 'mentions'}}"""
+        filters, params = self._filters(start_date, end_date, field)
+        with self._lock:
+            ids = self._resolve(name, entity_type)
+            if not ids:
+                return {}
+            rows = self._conn.execute(f"""
+                SELECT p.date, COUNT(DISTINCT p.article_id), SUM(p.count) FROM postings p
+                WHERE p.entity_id IN ({','.join('?' * len(ids))}){filters}
+                GROUP BY p.date ORDER BY p.date
+            """, ids + params).fetchall()
+        result: Dict[str, Dict[str, int]] = {}
+        for day, articles, mentions in rows:
+            bucket = bucket_of(day, freq)
+            if bucket is None:
+                continue
+            entry = result.setdefault(bucket, {'articles': 0, 'mentions': 0})
+            entry['articles'] += articles
+            entry['mentions'] += mentions
+        return result
+
+    def match_query(self, query: str) -> List[int]:
+        """Id các thực thể đã biết được nhắc tới trong câu hỏi (khớp các cụm 1..max_query_words từ)"""
+        words = _WORD.findall(normalize_entity(query))
+        phrases = {
+            " ".join(words[i:i + n])
+            for n in range(1, self.max_query_words + 1)
+            for i in range(len(words) - n + 1)
+        }
+        phrases = [phrase for phrase in phrases if len(phrase) >= self.min_key_length]
+        if not phrases:
+            return []
+        ids = []
+        with self._lock:
+            for start in range(0, len(phrases), 500):
+                batch = phrases[start:start + 500]
+                ids.extend(row[0] for row in self._conn.execute(
+                    f"SELECT id FROM entities WHERE key IN ({','.join('?' * len(batch))})", batch
+                ))
+        return ids
+
+    def mentions(self, entity_ids: List[int], article_ids: Iterable[str]) -> Dict[str, int]:
+        """Với mỗi bài trong article_ids: số thực thể (trong entity_ids) mà bài nhắc tới"""
+        article_ids = list(article_ids)
+        if not entity_ids or not article_ids:
+            return {}
+        result: Dict[str, int] = {}
+        with self._lock:
+            for start in range(0, len(article_ids), 400):
+                batch = article_ids[start:start + 400]
+                result.update(self._conn.execute(f"""
+                    SELECT article_id, COUNT(*) FROM postings
+                    WHERE entity_id IN ({','.join('?' * len(entity_ids))})
+                      AND article_id IN ({','.join('?' * len(batch))})
+                    GROUP BY article_id
+                """, list(entity_ids) + batch).fetchall())
+        return result
+
+    def article_entities(self, article_ids: List[str]) -> Dict[str, List[Dict]]:
+        """
+        Thực thể đã index của từng bài ({'text', 'type'}, lặp theo số lần nhắc), dùng như cache NER
+
+        Bài chưa index không có trong kết quả; bài đã index nhưng không có thực thể -> []
+        """
+        result: Dict[str, List[Dict]] = {}
+        with self._lock:
+            for start in range(0, len(article_ids), 500):
+                batch = article_ids[start:start + 500]
+                marks = ','.join('?' * len(batch))
+                for (doc_id,) in self._conn.execute(
+                    f"SELECT article_id FROM indexed_articles WHERE article_id IN ({marks})", batch
+                ):
+                    result[doc_id] = []
+                for doc_id, name, etype, count in self._conn.execute(f"""
+                    SELECT p.article_id, e.name, e.type, p.count FROM postings p JOIN entities e ON e.id = p.entity_id
+                    WHERE p.article_id IN ({marks}) ORDER BY p.article_id, e.id
+                """, batch):
+                    result[doc_id].extend({'text': name, 'type': etype} for _ in range(count))
+        return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            articles = self._conn.execute("SELECT COUNT(*) FROM indexed_articles").fetchone()[0]
+            entities = self._conn.execute("SELECT COUNT(*) FROM entities").fetchone()[0]
+            postings = self._conn.execute("SELECT COUNT(*) FROM postings").fetchone()[0]
+        return {"articles": articles, "entities": entities, "postings": postings}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -57,79 +57,96 @@ class PhoBERTEntityExtractor:
         Returns:
             List of entities with type and text (vd: )
         """
-        try:
-            # Tokenize input
-            inputs = self.tokenizer(
-                text,
-                # đầu vào định dạng pytorch tensor
-                return_tensors="pt",
-                truncation=True,
-                max_length=256,
-                padding=True
-            ).to(self.device)
-            
-            # inference 
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-                predictions = torch.argmax(outputs.logits, dim=2)
-            
-            # post processing
-            tokens = self.tokenizer.convert_ids_to_tokens(inputs["input_ids"][0])
-            labels = predictions[0].cpu().numpy()
-            
-            # Extract entities
-            entities = []
-            current_entity = None
-            current_tokens = []
-            
-            for token, label_id in zip(tokens, labels):
-                if token in ["<s>", "</s>", "<pad>", "<unk>"]:
-                    continue
+        return self.extract_entities_batch([text], batch_size=1)[0]
+
+    def extract_entities_batch(self, texts: List[str], batch_size: int = 16) -> List[List[Dict]]:
+        """
+        Như extract_entities cho nhiều text, mỗi lần forward một batch (padding theo text dài nhất batch)
+
+        Returns:
+            danh sách thực thể của từng text, cùng thứ tự; batch lỗi -> [] cho các text của batch đó
+        """
+        results = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            try:
+                # Tokenize input
+                inputs = self.tokenizer(
+                    batch,
+                    # đầu vào định dạng pytorch tensor
+                    return_tensors="pt",
+                    truncation=True,
+                    max_length=256,
+                    padding=True
+                ).to(self.device)
                 
-                # Get label from model config
-                if hasattr(self.model.config, 'id2label'):
-                    label = self.model.config.id2label.get(int(label_id), "O")
-                else:
-                    label = "O"
+                # inference 
+                with torch.no_grad():
+                    outputs = self.model(**inputs)
+                    predictions = torch.argmax(outputs.logits, dim=2).cpu().numpy()
                 
-                if label.startswith("B-"):
-                    # Save previous entity
-                    if current_entity:
-                        entities.append({
-                            "text": self._merge_tokens(current_tokens),
-                            "type": current_entity,
-                            "type_vi": self.entity_labels.get(current_entity, current_entity)
-                        })
-                    # Start new entity
-                    current_entity = label[2:]
-                    current_tokens = [token]
-                elif label.startswith("I-") and current_entity == label[2:]:
-                    # Continue current entity
-                    current_tokens.append(token)
-                else:
-                    # Outside any entity
-                    if current_entity:
-                        entities.append({
-                            "text": self._merge_tokens(current_tokens),
-                            "type": current_entity,
-                            "type_vi": self.entity_labels.get(current_entity, current_entity)
-                        })
-                    current_entity = None
-                    current_tokens = []
-            
-            # Add last entity if exists
-            if current_entity:
-                entities.append({
-                    "text": self._merge_tokens(current_tokens),
-                    "type": current_entity,
-                    "type_vi": self.entity_labels.get(current_entity, current_entity)
-                })
+                # post processing, bỏ phần padding của từng text
+                lengths = inputs["attention_mask"].sum(dim=1).tolist()
+                for i, length in enumerate(lengths):
+                    tokens = self.tokenizer.convert_ids_to_tokens(inputs["input_ids"][i][:length])
+                    results.append(self._decode(tokens, predictions[i][:length]))
+                    
+            except Exception as e:
+                print(f"lỗi: {e}")
+                results.extend([] for _ in batch)
+        return results
+
+    def _decode(self, tokens: List[str], labels) -> List[Dict]:
+        """Gom các token theo nhãn BIO thành thực thể"""
+        # Extract entities
+        entities = []
+        current_entity = None
+        current_tokens = []
+        
+        for token, label_id in zip(tokens, labels):
+            if token in ["<s>", "</s>", "<pad>", "<unk>"]:
+                continue
             
-            return entities
+            # Get label from model config
+            if hasattr(self.model.config, 'id2label'):
+                label = self.model.config.id2label.get(int(label_id), "O")
+            else:
+                label = "O"
             
-        except Exception as e:
-            print(f"lỗi: {e}")
-            return []
+            if label.startswith("B-"):
+                # Save previous entity
+                if current_entity:
+                    entities.append({
+                        "text": self._merge_tokens(current_tokens),
+                        "type": current_entity,
+                        "type_vi": self.entity_labels.get(current_entity, current_entity)
+                    })
+                # Start new entity
+                current_entity = label[2:]
+                current_tokens = [token]
+            elif label.startswith("I-") and current_entity == label[2:]:
+                # Continue current entity
+                current_tokens.append(token)
+            else:
+                # Outside any entity
+                if current_entity:
+                    entities.append({
+                        "text": self._merge_tokens(current_tokens),
+                        "type": current_entity,
+                        "type_vi": self.entity_labels.get(current_entity, current_entity)
+                    })
+                current_entity = None
+                current_tokens = []
+        
+        # Add last entity if exists
+        if current_entity:
+            entities.append({
+                "text": self._merge_tokens(current_tokens),
+                "type": current_entity,
+                "type_vi": self.entity_labels.get(current_entity, current_entity)
+            })
+        
+        return entities
     
     def _merge_tokens(self, tokens: List[str]) -> str:
         """Merge subword tokens back to words"""
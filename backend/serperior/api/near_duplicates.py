@@ -0,0 +1,246 @@
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+import numpy as np
+
+_WORD = re.compile(r'\w+')
+# số nguyên tố > 2^32: (a * h + b) với a < 2^31, h < 2^32 không tràn uint64
+_PRIME = np.uint64((1 << 32) + 15)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def shingles(text: str, size: int = 3) -> Set[str]:
+    """Tập các cụm `size` từ liên tiếp (chữ thường, bỏ dấu câu); bài ngắn hơn size từ -> một shingle"""
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """MinHash: num_perm hàm băm hoán vị, xác suất hai chữ ký trùng ở một vị trí = Jaccard của hai tập shingle"""
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self._a = rng.randint(1, 1 << 31, size=num_perm, dtype=np.int64).astype(np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.int64).astype(np.uint64)
+
+    def signature(self, items: Iterable[str]) -> np.ndarray:
+        hashes = np.fromiter((zlib.crc32(item.encode('utf-8')) for item in items), dtype=np.uint64)
+        if not len(hashes):
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint32)
+        permuted = (hashes[:, None] * self._a + self._b) % _PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+def jaccard(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    """Ước lượng Jaccard từ hai chữ ký MinHash"""
+    return float(np.mean(sig_a == sig_b))
+
+
+class NearDuplicateIndex:
+    """
+    Index phát hiện bài gần trùng (Dân Trí đăng lại / cập nhật bài dưới URL khác)
+
+    Mỗi bài gốc (canonical) được lưu một chữ ký MinHash trên shingle 3 từ, chia thành `bands` dải;
+    hai bài rơi chung bucket ở ít nhất một dải là ứng viên (LSH), sau đó xác nhận bằng Jaccard ước lượng
+    từ chữ ký >= threshold. Bài trùng không được lưu / embed lại mà chỉ được ghi lại là bản sao của bài gốc.
+
+    Dùng chung cho mọi generation (như TokenCache); SQLite trên đĩa (path=None -> chỉ RAM).
+    """
+
+    def __init__(self, path: Optional[str] = None, threshold: float = 0.7, num_perm: int = 128,
+                 bands: int = 32, shingle_size: int = 3):
+        """
+        Args:
+            path: file SQLite (None = chỉ giữ trong RAM)
+            threshold: Jaccard (trên shingle) tối thiểu để coi là trùng
+            num_perm: độ dài chữ ký MinHash
+            bands: số dải LSH (num_perm chia hết cho bands); nhiều dải -> ít bỏ sót, nhiều ứng viên hơn
+            shingle_size: số từ mỗi shingle
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.path = path
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.hasher = MinHasher(num_perm)
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS signatures (
+                    article_id TEXT PRIMARY KEY,
+                    signature BLOB NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS lsh_buckets (
+                    band INTEGER NOT NULL,
+                    bucket BLOB NOT NULL,
+                    article_id TEXT NOT NULL,
+                    PRIMARY KEY (band, bucket, article_id)
+                );
+                CREATE TABLE IF NOT EXISTS duplicates (
+                    article_id TEXT PRIMARY KEY,
+                    canonical_id TEXT NOT NULL,
+                    similarity REAL NOT NULL,
+                    url TEXT,
+                    title TEXT,
+                    date TEXT,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS duplicates_canonical ON duplicates (canonical_id);
+            """)
+
+    def signature(self, text: str) -> np.ndarray:
+        return self.hasher.signature(shingles(text, self.shingle_size))
+
+    def band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def candidates(self, signature: np.ndarray) -> List[Tuple[str, float]]:
+        """Các bài gốc đã lưu giống chữ ký này >= threshold, giống nhất trước"""
+        with self._lock:
+            ids = set()
+            for band, bucket in enumerate(self.band_keys(signature)):
+                ids.update(row[0] for row in self._conn.execute(
+                    "SELECT article_id FROM lsh_buckets WHERE band = ? AND bucket = ?", (band, bucket)
+                ))
+            if not ids:
+                return []
+            ids = list(ids)
+            stored = []
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                stored.extend(self._conn.execute(
+                    f"SELECT article_id, signature FROM signatures WHERE article_id IN ({','.join('?' * len(batch))})",
+                    batch
+                ))
+        matches = [(doc_id, jaccard(signature, np.frombuffer(blob, dtype=np.uint32))) for doc_id, blob in stored]
+        matches = [(doc_id, score) for doc_id, score in matches if score >= self.threshold]
+        matches.sort(key=lambda m: m[1], reverse=True)
+        return matches
+
+    def add(self, article_ids: List[str], signatures: List[np.ndarray]) -> None:
+        """Đưa các bài gốc vào index"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO signatures (article_id, signature) VALUES (?, ?)",
+                [(doc_id, np.asarray(sig, dtype=np.uint32).tobytes()) for doc_id, sig in zip(article_ids, signatures)]
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO lsh_buckets (band, bucket, article_id) VALUES (?, ?, ?)",
+                [(band, bucket, doc_id) for doc_id, sig in zip(article_ids, signatures)
+                 for band, bucket in enumerate(self.band_keys(np.asarray(sig, dtype=np.uint32)))]
+            )
+            # bài từng là bản sao nay được lưu làm bài gốc (VD: bài gốc đã bị xoá khỏi generation mới)
+            self._conn.executemany("DELETE FROM duplicates WHERE article_id = ?", [(doc_id,) for doc_id in article_ids])
+
+    def link(self, links: List[Tuple[Dict, str, float]]) -> None:
+        """
+        Ghi lại các bản sao
+
+        Args:
+            links: [(article (có 'id'), canonical_id, similarity)]
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany("""
+                INSERT OR REPLACE INTO duplicates (article_id, canonical_id, similarity, url, title, date, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [(article['id'], canonical_id, round(similarity, 4), article.get('url'), article.get('title'),
+                   article.get('date'), now) for article, canonical_id, similarity in links])
+
+    def canonical(self, article_id: str) -> str:
+        """Id bài gốc của một bài (chính nó nếu không phải bản sao)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT canonical_id FROM duplicates WHERE article_id = ?", (article_id,)
+            ).fetchone()
+        return row[0] if row else article_id
+
+    def duplicates_of(self, canonical_id: str) -> List[Dict]:
+        """Các bản sao đã được gắn vào một bài gốc"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT article_id, similarity, url, title, date FROM duplicates WHERE canonical_id = ? ORDER BY date",
+                (canonical_id,)
+            ).fetchall()
+        return [{'id': doc_id, 'similarity': similarity, 'url': url, 'title': title, 'date': date}
+                for doc_id, similarity, url, title, date in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            indexed = self._conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+            linked = self._conn.execute("SELECT COUNT(*) FROM duplicates").fetchone()[0]
+        return {"indexed": indexed, "duplicates": linked}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class DuplicateChecker:
+    """
+    Kiểm tra trùng cho một lô bài (một lần ingest / crawl), chưa ghi gì vào index
+
+    So với các bài gốc đã lưu trong index (chỉ tính những bài `exists` xác nhận còn trong generation đích)
+    và với các bài đã nhận trước đó trong cùng lô.
+    """
+
+    def __init__(self, index: NearDuplicateIndex, exists: Optional[Callable[[List[str]], Set[str]]] = None,
+                 id_of: Optional[Callable[[Dict], str]] = None):
+        """
+        Args:
+            index: index các bài gốc đã lưu
+            exists: lọc các id bài gốc còn trong generation đích (None = tin index)
+            id_of: id của một bài dict (ArticleVectorDB.article_id), dùng cho check_article
+        """
+        self.index = index
+        self.exists = exists
+        self.id_of = id_of
+        self.signatures: Dict[str, np.ndarray] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[str]] = {}
+
+    def check(self, article_id: str, text: str) -> Optional[Tuple[str, float]]:
+        """
+        Returns:
+            (canonical_id, similarity) nếu bài trùng một bài đã lưu / đã nhận trong lô, ngược lại None
+            (bài được nhận làm bài gốc). Cùng id (crawl lại đúng URL) không tính là trùng.
+        """
+        signature = self.index.signature(text)
+        bands = list(enumerate(self.index.band_keys(signature)))
+
+        matches = [(doc_id, score) for doc_id, score in self.index.candidates(signature) if doc_id != article_id]
+        if matches and self.exists is not None:
+            alive = self.exists([doc_id for doc_id, _ in matches])
+            matches = [(doc_id, score) for doc_id, score in matches if doc_id in alive]
+
+        pending = {doc_id for key in bands for doc_id in self._buckets.get(key, ()) if doc_id != article_id}
+        for doc_id in pending:
+            score = jaccard(signature, self.signatures[doc_id])
+            if score >= self.index.threshold:
+                matches.append((doc_id, score))
+
+        if matches:
+            return max(matches, key=lambda m: m[1])
+        self.signatures[article_id] = signature
+        for key in bands:
+            self._buckets.setdefault(key, []).append(article_id)
+        return None
+
+    def check_article(self, article: Dict) -> Optional[Tuple[str, float]]:
+        """Như check, với id và text (title + body, giống lúc ingest) lấy từ bài"""
+        return self.check(self.id_of(article), f"{article.get('title', '')}. {article.get('body', '')}")
@@ -0,0 +1,183 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+import numpy as np
+
+# số bit 1 trong mỗi byte, dùng để tính hamming distance trên vector nhị phân
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+# ABSTRACT
+class VectorQuantizer(ABC):
+    """
+    Nén vector (đã normalize) thành code nhỏ để search stage 1 trong RAM
+
+    score() chỉ cần đúng thứ tự tương đối; điểm chính xác được tính lại
+    trên full vectors (ở đĩa) cho top ứng viên.
+    """
+
+    name: str
+    # True nếu cần fit() trên dữ liệu trước khi encode
+    trainable = False
+
+    def fit(self, vectors: np.ndarray) -> None:
+        """Học tham số từ dữ liệu (mặc định không cần)"""
+
+    @property
+    def is_fitted(self) -> bool:
+        return True
+
+    @abstractmethod
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        pass
+
+    @abstractmethod
+    def score(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Điểm tương đồng xấp xỉ (càng lớn càng giống)"""
+        pass
+
+    @abstractmethod
+    def code_shape(self, dim: int) -> tuple:
+        pass
+
+    @property
+    @abstractmethod
+    def code_dtype(self) -> np.dtype:
+        pass
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {}
+
+    def load_state(self, state: Dict[str, np.ndarray]) -> None:
+        pass
+
+
+class Int8Quantizer(VectorQuantizer):
+    """Scalar quantization int8 theo từng chiều (4x nhỏ hơn float32)"""
+
+    name = "int8"
+    trainable = True
+
+    def __init__(self):
+        self.scale: Optional[np.ndarray] = None
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.scale is not None
+
+    def fit(self, vectors):
+        scale = np.abs(vectors).max(axis=0) / 127.0
+        scale[scale == 0] = 1.0
+        self.scale = scale.astype(np.float32)
+
+    def encode(self, vectors):
+        return np.clip(np.rint(vectors / self.scale), -127, 127).astype(np.int8)
+
+    def score(self, codes, query):
+        # (codes * scale) @ q == codes @ (scale * q), đổi sang float theo block để không nhân 4 RAM
+        weighted = (query * self.scale).astype(np.float32)
+        scores = np.empty(len(codes), dtype=np.float32)
+        block = 65536
+        for start in range(0, len(codes), block):
+            scores[start:start + block] = codes[start:start + block].astype(np.float32) @ weighted
+        return scores
+
+    def code_shape(self, dim):
+        return (dim,)
+
+    @property
+    def code_dtype(self):
+        return np.dtype(np.int8)
+
+    def state(self):
+        return {'scale': self.scale}
+
+    def load_state(self, state):
+        self.scale = state['scale']
+
+
+class BinaryQuantizer(VectorQuantizer):
+    """Giữ dấu mỗi chiều (1 bit), so sánh bằng hamming distance (32x nhỏ hơn float32)"""
+
+    name = "binary"
+
+    def encode(self, vectors):
+        return np.packbits(vectors > 0, axis=-1)
+
+    def score(self, codes, query):
+        query_code = np.packbits(query > 0)
+        hamming = _POPCOUNT[codes ^ query_code].sum(axis=1, dtype=np.int32)
+        return -hamming.astype(np.float32)
+
+    def code_shape(self, dim):
+        return ((dim + 7) // 8,)
+
+    @property
+    def code_dtype(self):
+        return np.dtype(np.uint8)
+
+
+class PCAQuantizer(VectorQuantizer):
+    """Giảm chiều bằng PCA, lưu float16 (768 -> 192 chiều: 8x nhỏ hơn float32)"""
+
+    name = "pca"
+    trainable = True
+
+    def __init__(self, n_components: int = 192):
+        self.n_components = n_components
+        self.mean: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.components is not None
+
+    def fit(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.mean = vectors.mean(axis=0)
+        # SVD trên dữ liệu đã trừ mean; chỉ cần Vt
+        _, _, vt = np.linalg.svd(vectors - self.mean, full_matrices=False)
+        k = min(self.n_components, vt.shape[0])
+        self.n_components = k
+        self.components = np.ascontiguousarray(vt[:k].T, dtype=np.float32)
+
+    def encode(self, vectors):
+        return ((vectors - self.mean) @ self.components).astype(np.float16)
+
+    def score(self, codes, query):
+        # x ~ mean + components @ code  =>  q.x ~ q.mean + (q @ components) . code
+        # q.mean là hằng số với mọi x nên bỏ qua khi xếp hạng
+        projected = (query @ self.components).astype(np.float32)
+        scores = np.empty(len(codes), dtype=np.float32)
+        block = 65536
+        for start in range(0, len(codes), block):
+            scores[start:start + block] = codes[start:start + block].astype(np.float32) @ projected
+        return scores
+
+    def code_shape(self, dim):
+        return (self.n_components,)
+
+    @property
+    def code_dtype(self):
+        return np.dtype(np.float16)
+
+    def state(self):
+        return {'mean': self.mean, 'components': self.components}
+
+    def load_state(self, state):
+        self.mean = state['mean']
+        self.components = state['components']
+        self.n_components = self.components.shape[1]
+
+
+def create_quantizer(compression: str, pca_components: int = 192) -> VectorQuantizer:
+    """
+    Args:
+        compression: 'int8', 'binary' hoặc 'pca'
+    """
+    if compression == "int8":
+        return Int8Quantizer()
+    if compression == "binary":
+        return BinaryQuantizer()
+    if compression == "pca":
+        return PCAQuantizer(pca_components)
+    raise ValueError(f"Unknown compression: {compression}")
@@ -0,0 +1,163 @@
+from typing import Dict, Iterable, List
+from .term_matrix import bucket_of
+
+SENTIMENT_LABELS = ('positive', 'negative', 'neutral')
+DEFAULT_SENTIMENT_MODEL = "wonrax/phobert-base-vietnamese-sentiment"
+
+
+def label_of(score: float, threshold: float = 0.2) -> str:
+    if score >= threshold:
+        return 'positive'
+    if score <= -threshold:
+        return 'negative'
+    return 'neutral'
+
+
+class LexiconSentimentScorer:
+    """
+    Chấm sắc thái theo từ điển trên tokens đã tách (token cache), không cần model
+
+    Đếm từ tích cực / tiêu cực (kể cả cụm nhiều từ như "tăng trưởng", "khó khăn"),
+    từ phủ định ngay trước ("không", "chưa"...) đảo chiều. score = (pos - neg) / (pos + neg + 1) trong (-1, 1).
+    """
+
+    method = 'lexicon'
+
+    def __init__(self, positive_words: Iterable[str], negative_words: Iterable[str],
+                 negations: Iterable[str] = ('không', 'chưa', 'chẳng', 'chả', 'không hề', 'chưa hề'),
+                 negation_window: int = 2, threshold: float = 0.2):
+        """
+        Args:
+            positive_words / negative_words: từ điển (VD: NewsAnalyzer.positive_words)
+            negations: từ phủ định
+            negation_window: số token phía trước được xét phủ định
+            threshold: |score| tối thiểu để gán nhãn positive / negative
+        """
+        self.polarity = {word: 1 for word in positive_words}
+        self.polarity.update({word: -1 for word in negative_words})
+        self.negations = set(negations)
+        self.negation_window = negation_window
+        self.threshold = threshold
+        # cụm dài nhất trong từ điển, tính theo số từ
+        self.max_phrase = max((len(word.split()) for word in self.polarity), default=1)
+
+    def score_tokens(self, tokens: List[str]) -> Dict:
+        """
+        Returns:
+            {'score', 'label', 'positive', 'negative'}
+        """
+        positive = negative = 0
+        i = 0
+        while i < len(tokens):
+            polarity, length = 0, 1
+            # underthesea có thể tách cụm thành nhiều token: thử ghép dài nhất trước
+            for n in range(min(self.max_phrase, len(tokens) - i), 0, -1):
+                phrase = " ".join(tokens[i:i + n])
+                if phrase in self.polarity:
+                    polarity, length = self.polarity[phrase], n
+                    break
+            if polarity:
+                if any(token in self.negations for token in tokens[max(0, i - self.negation_window):i]):
+                    polarity = -polarity
+                if polarity > 0:
+                    positive += 1
+                else:
+                    negative += 1
+            i += length
+
+        score = (positive - negative) / (positive + negative + 1)
+        return {'score': round(score, 4), 'label': label_of(score, self.threshold),
+                'positive': positive, 'negative': negative}
+
+    def score_many(self, token_lists: List[List[str]]) -> List[Dict]:
+        return [self.score_tokens(tokens) for tokens in token_lists]
+
+
+class TransformerSentimentScorer:
+    """
+    Chấm sắc thái bằng model phân loại (mặc định PhoBERT fine-tune cho tiếng Việt), theo batch
+
+    Input là tokens đã tách của token cache, ghép lại theo kiểu PhoBERT (từ ghép nối bằng '_'),
+    nên không phải tách từ lại. score = P(tích cực) - P(tiêu cực).
+    """
+
+    method = 'transformer'
+
+    def __init__(self, model_name: str = DEFAULT_SENTIMENT_MODEL, batch_size: int = 16,
+                 max_tokens: int = 200, threshold: float = 0.2, device: int = -1):
+        """
+        Args:
+            model_name: model text-classification (HuggingFace) có nhãn tích cực / tiêu cực / trung tính
+            batch_size: số bài mỗi lần forward
+            max_tokens: chỉ lấy phần đầu bài (title + sapo), PhoBERT giới hạn 256 subword
+            threshold: |score| tối thiểu để gán nhãn positive / negative
+            device: -1 = CPU
+        """
+        from transformers import pipeline
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self.threshold = threshold
+        self.pipeline = pipeline("text-classification", model=model_name, tokenizer=model_name,
+                                 device=device, top_k=None)
+
+    @staticmethod
+    def _polarity(label: str) -> int:
+        label = label.lower()
+        if label.startswith('pos'):
+            return 1
+        if label.startswith('neg'):
+            return -1
+        return 0
+
+    def score_many(self, token_lists: List[List[str]]) -> List[Dict]:
+        if not token_lists:
+            return []
+        texts = [" ".join(token.replace(" ", "_") for token in tokens[:self.max_tokens]) or "."
+                 for tokens in token_lists]
+        outputs = self.pipeline(texts, batch_size=self.batch_size, truncation=True)
+        results = []
+        for output in outputs:
+            probs = {self._polarity(item['label']): item['score'] for item in output}
+            score = probs.get(1, 0.0) - probs.get(-1, 0.0)
+            results.append({'score': round(score, 4), 'label': label_of(score, self.threshold),
+                            'positive': round(probs.get(1, 0.0), 4), 'negative': round(probs.get(-1, 0.0), 4)})
+        return results
+
+
+def sentiment_summary(articles: int, labels: Dict[str, int], score_sum: float) -> Dict:
+    """Số bài, số bài theo nhãn và điểm trung bình của một nhóm bài"""
+    return {
+        'articles': articles,
+        **{label: labels.get(label, 0) for label in SENTIMENT_LABELS},
+        'average_score': round(score_sum / articles, 4) if articles else 0.0,
+    }
+
+
+def aggregate_sentiment(articles: List[Dict], scores: List[Dict], method: str, freq: str = 'day') -> Dict:
+    """
+    Gộp điểm từng bài thành phân bố + timeline (cùng dạng với SentimentStore.sentiment)
+
+    Returns:
+        {'method', 'articles', 'positive', 'negative', 'neutral', 'average_score',
+         'timeline': {bucket: {... như trên}}}
+    """
+    total_labels, total_sum = {}, 0.0
+    buckets: Dict[str, list] = {}
+    for article, score in zip(articles, scores):
+        total_labels[score['label']] = total_labels.get(score['label'], 0) + 1
+        total_sum += score['score']
+        bucket = bucket_of(article.get('date'), freq)
+        if bucket is None:
+            continue
+        entry = buckets.setdefault(bucket, [0, {}, 0.0])
+        entry[0] += 1
+        entry[1][score['label']] = entry[1].get(score['label'], 0) + 1
+        entry[2] += score['score']
+
+    return {
+        'method': method,
+        **sentiment_summary(len(scores), total_labels, total_sum),
+        'timeline': {bucket: sentiment_summary(*buckets[bucket]) for bucket in sorted(buckets)},
+    }
@@ -0,0 +1,158 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import os
+import sqlite3
+import threading
+from .sentiment import SENTIMENT_LABELS, sentiment_summary
+from .term_matrix import bucket_of
+from .trend_store import article_key
+
+
+class SentimentStore:
+    """
+    Điểm sắc thái của từng bài + tổng hợp tính sẵn theo (ngày, lĩnh vực, phương pháp) trong SQLite
+
+    Mỗi bài được chấm một lần lúc ingest (theo article_key, như TrendStore); phân bố và timeline
+    của một khoảng ngày là SUM trên day_sentiment, không phải chạy lại model.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS article_sentiment (
+                    key TEXT NOT NULL,
+                    method TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    field TEXT NOT NULL,
+                    score REAL NOT NULL,
+                    label TEXT NOT NULL,
+                    PRIMARY KEY (key, method)
+                );
+                CREATE TABLE IF NOT EXISTS day_sentiment (
+                    date TEXT NOT NULL,
+                    field TEXT NOT NULL,
+                    method TEXT NOT NULL,
+                    articles INTEGER NOT NULL,
+                    positive INTEGER NOT NULL,
+                    negative INTEGER NOT NULL,
+                    neutral INTEGER NOT NULL,
+                    score_sum REAL NOT NULL,
+                    PRIMARY KEY (date, field, method)
+                );
+            """)
+
+    # ---------------- ingest ----------------
+
+    def missing(self, articles: Iterable[Dict], method: str) -> List[Dict]:
+        """Các bài (có ngày) chưa được chấm bằng method"""
+        articles = [a for a in articles if a.get('date')]
+        keys = [article_key(a) for a in articles]
+        known = set()
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                known.update(row[0] for row in self._conn.execute(
+                    f"SELECT key FROM article_sentiment WHERE method = ? AND key IN ({','.join('?' * len(batch))})",
+                    [method] + batch
+                ))
+        seen = set()
+        result = []
+        for article, key in zip(articles, keys):
+            if key not in known and key not in seen:
+                seen.add(key)
+                result.append(article)
+        return result
+
+    def add_scores(self, articles: List[Dict], scores: List[Dict], method: str) -> int:
+        """
+        Lưu điểm từng bài và cộng vào dòng (ngày, lĩnh vực); bài đã có thì bỏ qua
+
+        Args:
+            scores: kết quả của scorer ({'score', 'label', ...}) cùng thứ tự articles
+        Returns:
+            số bài được lưu
+        """
+        days: Dict[Tuple[str, str], list] = {}
+        with self._lock, self._conn:
+            for article, score in zip(articles, scores):
+                day, field = article.get('date'), article.get('field') or ''
+                if not day:
+                    continue
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO article_sentiment (key, method, date, field, score, label) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (article_key(article), method, day, field, score['score'], score['label'])
+                )
+                if cursor.rowcount == 0:
+                    continue
+                entry = days.setdefault((day, field), [0, 0, 0, 0, 0.0])
+                entry[0] += 1
+                entry[1 + SENTIMENT_LABELS.index(score['label'])] += 1
+                entry[4] += score['score']
+
+            self._conn.executemany("""
+                INSERT INTO day_sentiment (date, field, method, articles, positive, negative, neutral, score_sum)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (date, field, method) DO UPDATE SET
+                    articles = articles + excluded.articles,
+                    positive = positive + excluded.positive,
+                    negative = negative + excluded.negative,
+                    neutral = neutral + excluded.neutral,
+                    score_sum = score_sum + excluded.score_sum
+            """, [(day, field, method, *entry) for (day, field), entry in days.items()])
+        return sum(entry[0] for entry in days.values())
+
+    # ---------------- queries ----------------
+
+    def article_scores(self, articles: List[Dict], method: str) -> List[Optional[Dict]]:
+        """Điểm đã lưu của từng bài (None nếu chưa chấm)"""
+        keys = [article_key(a) for a in articles]
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                found.update({key: {'score': score, 'label': label} for key, score, label in self._conn.execute(
+                    f"SELECT key, score, label FROM article_sentiment "
+                    f"WHERE method = ? AND key IN ({','.join('?' * len(batch))})", [method] + batch
+                )})
+        return [found.get(key) for key in keys]
+
+    def sentiment(self, start_date: str, end_date: str, field: Optional[str] = None,
+                  method: str = 'lexicon', freq: str = 'day') -> Dict:
+        """
+        Phân bố sắc thái + timeline của một khoảng ngày (cùng dạng với aggregate_sentiment)
+        """
+        start_date, end_date = sorted((start_date, end_date))
+        where, params = "method = ? AND date BETWEEN ? AND ?", [method, start_date, end_date]
+        if field:
+            where += " AND field = ?"
+            params.append(field)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT date, SUM(articles), SUM(positive), SUM(negative), SUM(neutral), SUM(score_sum) "
+                f"FROM day_sentiment WHERE {where} GROUP BY date ORDER BY date", params
+            ).fetchall()
+
+        total = [0, 0, 0, 0, 0.0]
+        buckets: Dict[str, list] = {}
+        for day, *values in rows:
+            entry = buckets.setdefault(bucket_of(day, freq), [0, 0, 0, 0, 0.0])
+            for i, value in enumerate(values):
+                entry[i] += value
+                total[i] += value
+
+        def summary(entry):
+            return sentiment_summary(entry[0], dict(zip(SENTIMENT_LABELS, entry[1:4])), entry[4])
+
+        return {
+            'method': method,
+            **summary(total),
+            'timeline': {bucket: summary(buckets[bucket]) for bucket in sorted(buckets)},
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,109 @@
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from scipy import sparse
+
+TIME_BUCKETS = ('day', 'week', 'month')
+
+
+def bucket_of(date_str: Optional[str], freq: str = 'day') -> Optional[str]:
+    """
+    Nhãn khoảng thời gian của một ngày YYYY-MM-DD
+
+    day -> '2024-12-15', week -> '2024-W50' (tuần ISO), month -> '2024-12'; ngày không hợp lệ -> None
+    """
+    if not date_str:
+        return None
+    try:
+        day = datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+    if freq == 'day':
+        return day.isoformat()
+    if freq == 'week':
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    if freq == 'month':
+        return f"{day.year}-{day.month:02d}"
+    raise ValueError(f"freq must be one of {TIME_BUCKETS}, got {freq!r}")
+
+
+class TermMatrix:
+    """
+    Ma trận thưa bài × từ (CSR) kèm ngày của từng bài
+
+    Xây một lần từ tần suất từ của từng bài (NewsAnalyzer.article_word_counts), sau đó:
+    - top_terms: tổng theo cột
+    - timeline: (khoảng thời gian × bài) @ (bài × từ khóa) -> đếm theo ngày/tuần/tháng bằng một phép nhân
+    """
+
+    def __init__(self, word_counts: Iterable[Counter], dates: Iterable[Optional[str]]):
+        self.vocabulary: Dict[str, int] = {}
+        self.terms: List[str] = []
+        indptr, indices, data = [0], [], []
+        for counts in word_counts:
+            for term, count in counts.items():
+                col = self.vocabulary.get(term)
+                if col is None:
+                    col = self.vocabulary[term] = len(self.terms)
+                    self.terms.append(term)
+                indices.append(col)
+                data.append(count)
+            indptr.append(len(indices))
+
+        self.dates = list(dates)
+        self.matrix = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.int32), np.asarray(indices, dtype=np.int32), np.asarray(indptr)),
+            shape=(len(indptr) - 1, len(self.terms))
+        )
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.matrix.shape
+
+    def totals(self) -> np.ndarray:
+        """Tổng số lần xuất hiện của từng từ trên toàn bộ các bài"""
+        return np.asarray(self.matrix.sum(axis=0)).ravel()
+
+    def top_terms(self, n: int = 20) -> List[Tuple[str, int]]:
+        """Các từ xuất hiện nhiều nhất; bằng nhau thì từ gặp trước đứng trước (giống Counter.most_common)"""
+        totals = self.totals()
+        order = np.argsort(-totals, kind='stable')[:n]
+        return [(self.terms[i], int(totals[i])) for i in order]
+
+    def timeline(self, terms: List[str], freq: str = 'day') -> Dict[str, Dict[str, int]]:
+        """
+        Số lần xuất hiện của từng từ theo khoảng thời gian
+
+        Args:
+            terms: các từ cần theo dõi (từ không có trong ma trận -> 0)
+            freq: 'day' | 'week' | 'month'
+
+        Returns:
+            {bucket: {term: count}}, bucket tăng dần; bài không có ngày bị bỏ qua
+        """
+        labels = [bucket_of(date, freq) for date in self.dates]
+        buckets = sorted({label for label in labels if label is not None})
+        if not buckets:
+            return {}
+
+        row_of = {bucket: i for i, bucket in enumerate(buckets)}
+        articles = [i for i, label in enumerate(labels) if label is not None]
+        # ma trận chỉ định bucket × bài
+        assign = sparse.csr_matrix(
+            (np.ones(len(articles), dtype=np.int32), ([row_of[labels[i]] for i in articles], articles)),
+            shape=(len(buckets), self.shape[0])
+        )
+
+        cols = [self.vocabulary.get(term) for term in terms]
+        known = [c for c in cols if c is not None]
+        counts = np.zeros((len(buckets), len(terms)), dtype=np.int64)
+        if known:
+            aggregated = (assign @ self.matrix[:, known]).toarray()
+            counts[:, [j for j, c in enumerate(cols) if c is not None]] = aggregated
+
+        return {
+            bucket: {term: int(counts[i, j]) for j, term in enumerate(terms)}
+            for i, bucket in enumerate(buckets)
+        }
@@ -0,0 +1,168 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from .tokenizer import tokenize, tokenize_batch
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class TokenCache:
+    """
+    Cache kết quả tách từ theo từng bài (underthesea là bước chậm nhất của phân tích)
+
+    Mỗi bài chỉ được tách từ một lần, lúc ingest (ArticleVectorDB.add_articles, dùng luôn cho BM25),
+    sau đó NewsAnalyzer (từ khóa, timeline, digest...) đọc lại từ cache.
+
+    Tra cứu theo hash nội dung (bài bị sửa sẽ được tách lại), rồi tới article id: bài đọc lại từ DB
+    chỉ có body rút gọn trong metadata, khi đó dùng tokens của toàn văn đã tách lúc ingest.
+
+    Hai tầng: LRU trong RAM + SQLite trên đĩa (path=None -> chỉ RAM).
+    """
+
+    def __init__(self, path: Optional[str] = None, max_memory_entries: int = 20000,
+                 tokenizer: Callable[[str], List[str]] = tokenize, workers: Optional[int] = None):
+        """
+        Args:
+            path: file SQLite (None = chỉ giữ trong RAM)
+            max_memory_entries: số bài giữ trong LRU
+            tokenizer: hàm tách từ, mặc định giống BM25Index
+            workers: số process tách các bài chưa có trong cache (xem tokenize_batch)
+        """
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.tokenizer = tokenizer
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, List[str]]" = OrderedDict()
+        # article id -> hash nội dung lúc ingest
+        self._ids: "OrderedDict[str, str]" = OrderedDict()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+        self._conn = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            with self._lock, self._conn:
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS tokens (
+                        content_hash TEXT PRIMARY KEY,
+                        article_id TEXT,
+                        tokens TEXT NOT NULL
+                    )
+                """)
+                self._conn.execute("CREATE INDEX IF NOT EXISTS tokens_article_id ON tokens (article_id)")
+
+    def _remember(self, key: str, tokens: List[str], article_id: Optional[str] = None) -> None:
+        self._memory[key] = tokens
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+        if article_id is not None:
+            self._ids[article_id] = key
+            self._ids.move_to_end(article_id)
+            while len(self._ids) > self.max_memory_entries:
+                self._ids.popitem(last=False)
+
+    def _select(self, column: str, values: List[str]) -> List[Tuple[str, str, str]]:
+        rows = []
+        # SQLite giới hạn số tham số mỗi câu lệnh
+        for start in range(0, len(values), 500):
+            batch = values[start:start + 500]
+            rows.extend(self._conn.execute(
+                f"SELECT content_hash, article_id, tokens FROM tokens "
+                f"WHERE {column} IN ({','.join('?' * len(batch))}) ORDER BY rowid",
+                batch
+            ).fetchall())
+        return rows
+
+    def tokenize(self, text: str, article_id: Optional[str] = None) -> List[str]:
+        return self.tokenize_many([(article_id, text)])[0]
+
+    def tokenize_many(self, items: Iterable[Tuple[Optional[str], str]], ingest: bool = True) -> List[List[str]]:
+        """
+        Args:
+            items: (article_id, text), article_id có thể None
+            ingest: text là toàn văn của bài (lúc ingest) -> ghi nhận article_id để lần sau
+                tra được theo id. False khi text chỉ là một phần của bài (VD: body rút gọn từ DB)
+        Returns:
+            tokens của từng text, cùng thứ tự
+        """
+        items = list(items)
+        keys = [content_hash(text) for _, text in items]
+        found: Dict[str, List[str]] = {}
+        # item không khớp hash nhưng khớp article id -> key của bản đã ingest
+        alias: Dict[int, str] = {}
+
+        with self._lock:
+            for i, ((article_id, _), key) in enumerate(zip(items, keys)):
+                if key not in self._memory and not ingest and article_id in self._ids:
+                    if self._ids[article_id] in self._memory:
+                        alias[i] = self._ids[article_id]
+                        key = alias[i]
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                    self._stats["memory_hits"] += 1
+
+            missing = [key for i, key in enumerate(keys) if i not in alias and key not in found]
+            if missing and self._conn is not None:
+                for key, article_id, tokens in self._select("content_hash", list(set(missing))):
+                    found[key] = json.loads(tokens)
+                    self._remember(key, found[key], article_id)
+                    self._stats["disk_hits"] += 1
+
+            if not ingest and self._conn is not None:
+                by_id = {items[i][0]: i for i, key in enumerate(keys)
+                         if i not in alias and key not in found and items[i][0] is not None}
+                for key, article_id, tokens in self._select("article_id", list(by_id)):
+                    # ORDER BY rowid: bản ingest mới nhất ghi đè bản cũ
+                    found[key] = json.loads(tokens)
+                    self._remember(key, found[key], article_id)
+                    alias[by_id[article_id]] = key
+                self._stats["disk_hits"] += len({i for i in by_id.values() if i in alias})
+
+        # tách từ ngoài lock: chậm (song song trên process pool khi nhiều bài),
+        # và hai thread cùng tách một bài cũng không sao
+        pending: Dict[str, Tuple[Optional[str], str]] = {}
+        for i, ((article_id, text), key) in enumerate(zip(items, keys)):
+            if i not in alias and key not in found and key not in pending:
+                pending[key] = (article_id, text)
+        token_lists = tokenize_batch([text for _, text in pending.values()], workers=self.workers,
+                                     tokenizer=self.tokenizer)
+        new_rows = []
+        for (key, (article_id, _)), tokens in zip(pending.items(), token_lists):
+            found[key] = tokens
+            new_rows.append((key, article_id if ingest else None, json.dumps(tokens, ensure_ascii=False)))
+
+        if new_rows:
+            with self._lock:
+                self._stats["misses"] += len(new_rows)
+                for key, article_id, _ in new_rows:
+                    self._remember(key, found[key], article_id)
+                if self._conn is not None:
+                    with self._conn:
+                        self._conn.executemany(
+                            "INSERT OR REPLACE INTO tokens (content_hash, article_id, tokens) VALUES (?, ?, ?)",
+                            new_rows
+                        )
+
+        return [found[alias.get(i, key)] for i, key in enumerate(keys)]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            disk_size = None
+            if self._conn is not None:
+                disk_size = self._conn.execute("SELECT COUNT(*) FROM tokens").fetchone()[0]
+            return dict(self._stats, memory_size=len(self._memory), disk_size=disk_size)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,124 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, List, Optional
+import atexit
+import logging
+import multiprocessing
+import os
+import re
+import threading
+from underthesea import word_tokenize
+
+logger = logging.getLogger(__name__)
+
+# giữ lại chữ cái (kể cả tiếng Việt có dấu), chữ số và dấu nối trong mã chứng khoán/số liệu
+_TOKEN_CLEAN = re.compile(r"[^\w\s.,%-]", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tách từ tiếng Việt bằng underthesea cho việc đánh chỉ mục
+
+    Khác với NewsAnalyzer.extract_keywords, hàm này giữ lại số, mã chứng khoán
+    (VD: "vnm", "2.5%") vì đây chính là những thứ người dùng hay tìm chính xác.
+
+    Args:
+        text: Văn bản
+
+    Returns:
+        List các token đã lowercase, bỏ dấu câu
+    """
+    if not text:
+        return []
+
+    tokens = []
+    for word in word_tokenize(text.lower()):
+        word = _TOKEN_CLEAN.sub("", word).strip(" .,-")
+        if word:
+            tokens.append(word)
+    return tokens
+
+
+# ---------------- tách từ song song (process pool) ----------------
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def default_workers() -> int:
+    """Số process tách từ: env SERPERIOR_TOKENIZE_WORKERS, mặc định số core"""
+    return max(int(os.getenv("SERPERIOR_TOKENIZE_WORKERS", 0)) or os.cpu_count() or 1, 1)
+
+
+def _init_worker() -> None:
+    """Nạp model underthesea một lần cho mỗi worker (lần gọi đầu mới load CRF model)"""
+    word_tokenize("khởi động")
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """Pool dùng chung giữa các lần gọi (khởi động worker + import underthesea chỉ tốn một lần)"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # không fork thẳng từ server: process đang có nhiều thread (threadpool, rebuild, torch),
+            # fork có thể để lại lock đang bị giữ trong worker -> treo. forkserver/spawn bắt đầu từ
+            # một interpreter sạch.
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method),
+                                        initializer=_init_worker)
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_pool() -> None:
+    """Dừng process pool (gọi ở shutdown hook của app; atexit là lưới an toàn)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+atexit.register(shutdown_pool)
+
+
+def _tokenize_chunk(args) -> List[List[str]]:
+    tokenizer, texts = args
+    return [tokenizer(text) for text in texts]
+
+
+def tokenize_batch(texts: List[str], workers: Optional[int] = None, min_parallel: int = 64,
+                   tokenizer: Callable[[str], List[str]] = tokenize) -> List[List[str]]:
+    """
+    Tách từ nhiều văn bản, chia thành các chunk chạy trên process pool
+
+    underthesea là Python thuần (CPU-bound, giữ GIL) nên thread không giúp được gì.
+    Ít văn bản (< min_parallel) hoặc workers=1 thì chạy luôn trong process hiện tại.
+
+    Args:
+        workers: số process (mặc định default_workers())
+        tokenizer: phải pickle được (hàm cấp module)
+
+    Returns:
+        tokens của từng văn bản, cùng thứ tự
+    """
+    texts = list(texts)
+    workers = workers or default_workers()
+    if workers <= 1 or len(texts) < min_parallel:
+        return [tokenizer(text) for text in texts]
+
+    # ~4 chunk mỗi worker: đủ nhỏ để cân tải (bài dài ngắn khác nhau), đủ lớn để bớt chi phí pickle
+    size = max(len(texts) // (workers * 4), 1)
+    chunks = [(tokenizer, texts[i:i + size]) for i in range(0, len(texts), size)]
+    try:
+        results = _get_pool(workers).map(_tokenize_chunk, chunks)
+        return [tokens for chunk in results for tokens in chunk]
+    except Exception as e:
+        # pool hỏng (worker bị kill, không fork được) hoặc tokenizer không pickle được
+        logger.warning(f"Tokenizer pool failed ({e!r}), falling back to a single process")
+        if isinstance(e, BrokenProcessPool):
+            shutdown_pool()
+        return [tokenizer(text) for text in texts]
@@ -0,0 +1,248 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import os
+import sqlite3
+import threading
+import numpy as np
+
+
+def _shift(day: str, days: int) -> str:
+    return (datetime.strptime(day, '%Y-%m-%d') + timedelta(days=days)).date().isoformat()
+
+
+def _ordinal(day: str) -> int:
+    return datetime.strptime(day, '%Y-%m-%d').toordinal()
+
+
+class TopicClusterer:
+    """
+    Gom bài thành các câu chuyện / chủ đề từ embeddings đã lưu trong ArticleVectorDB
+
+    Online clustering (leader + centroid trung bình): mỗi bài mới được gán vào cluster gần nhất
+    (cosine với centroid) nếu đủ giống, ngược lại mở cluster mới; centroid cập nhật tăng dần.
+    Không phải cluster lại từ đầu và không cần chạy thêm model nào.
+
+    Tin tức có tính thời điểm: bài chỉ được gán vào cluster còn "sống" trong window_days ngày,
+    nên hai sự kiện giống nhau cách xa nhau thành hai câu chuyện riêng.
+    Nhãn cluster = các từ khóa xuất hiện nhiều nhất trong các bài của nó.
+    """
+
+    def __init__(self, path: str, threshold: float = 0.6, window_days: int = 7, label_size: int = 5):
+        """
+        Args:
+            path: file SQLite lưu cluster, centroid và bài thuộc cluster
+            threshold: cosine tối thiểu giữa bài và centroid để vào cluster
+            window_days: cluster không có bài mới quá số ngày này thì không nhận thêm bài
+            label_size: số từ khóa làm nhãn
+        """
+        self.path = path
+        self.threshold = threshold
+        self.window_days = window_days
+        self.label_size = label_size
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS clusters (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    model TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    first_date TEXT NOT NULL,
+                    last_date TEXT NOT NULL,
+                    centroid BLOB NOT NULL,
+                    vector_sum BLOB
+                );
+                CREATE INDEX IF NOT EXISTS clusters_last_date ON clusters (model, last_date);
+                CREATE TABLE IF NOT EXISTS members (
+                    article_id TEXT PRIMARY KEY,
+                    cluster_id INTEGER NOT NULL,
+                    date TEXT NOT NULL,
+                    field TEXT NOT NULL,
+                    title TEXT,
+                    url TEXT,
+                    similarity REAL
+                );
+                CREATE INDEX IF NOT EXISTS members_date ON members (date, cluster_id);
+                CREATE TABLE IF NOT EXISTS cluster_terms (
+                    cluster_id INTEGER NOT NULL,
+                    term TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (cluster_id, term)
+                );
+            """)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(clusters)")}
+            if 'vector_sum' not in columns:
+                self._conn.execute("ALTER TABLE clusters ADD COLUMN vector_sum BLOB")
+
+    def missing(self, article_ids: List[str]) -> List[str]:
+        """Các id chưa được gán cluster"""
+        with self._lock:
+            return self._missing_locked(article_ids)
+
+    def add_articles(self, articles: List[Dict], vectors: np.ndarray, word_counts: List[Counter],
+                     model: str) -> int:
+        """
+        Gán các bài mới vào cluster
+
+        Args:
+            articles: dict có 'id', 'date' (+ 'field', 'title', 'url')
+            vectors: embeddings đã normalize, cùng thứ tự articles
+            word_counts: tần suất từ khóa của từng bài (NewsAnalyzer.article_word_counts), dùng làm nhãn
+            model: embedding model (centroid của model khác không so sánh được)
+        Returns:
+            số bài được gán
+        """
+        items = [(a, v, c) for a, v, c in zip(articles, np.asarray(vectors, dtype=np.float32), word_counts)
+                 if a.get('date')]
+        if not items:
+            return 0
+        # xử lý theo thời gian để cửa sổ window_days có ý nghĩa
+        items.sort(key=lambda item: item[0]['date'])
+
+        with self._lock, self._conn:
+            new_ids = set(self._missing_locked([a['id'] for a, _, _ in items]))
+            items = [item for item in items if item[0]['id'] in new_ids]
+            if not items:
+                return 0
+
+            oldest = _shift(items[0][0]['date'], -self.window_days)
+            rows = self._conn.execute(
+                "SELECT id, size, first_date, last_date, centroid, vector_sum FROM clusters "
+                "WHERE model = ? AND last_date >= ?",
+                (model, oldest)
+            ).fetchall()
+            # cấp phát một lần: mỗi bài mở tối đa một cluster mới
+            capacity = len(rows) + len(items)
+            dim = items[0][1].shape[0]
+            cluster_ids = [row[0] for row in rows]
+            sizes = [row[1] for row in rows]
+            first_dates = [row[2] for row in rows]
+            last_dates = [row[3] for row in rows]
+            # tổng (chưa normalize) các vector của cluster, centroid = sums / |sums|, cập nhật tại chỗ
+            sums = np.zeros((capacity, dim), dtype=np.float32)
+            norms = np.ones(capacity, dtype=np.float32)
+            last_ordinals = np.zeros(capacity, dtype=np.int64)
+            for i, row in enumerate(rows):
+                if row[5] is not None:
+                    sums[i] = np.frombuffer(row[5], dtype=np.float32)
+                else:
+                    # cluster lưu trước khi có vector_sum: xấp xỉ bằng centroid * size
+                    sums[i] = np.frombuffer(row[4], dtype=np.float32) * row[1]
+                norms[i] = np.linalg.norm(sums[i]) or 1.0
+                last_ordinals[i] = _ordinal(row[3])
+            count = len(rows)
+            touched = set()
+            members, terms = [], Counter()
+
+            for article, vector, counts in items:
+                day = article['date']
+                day_ordinal = _ordinal(day)
+                best, similarity = -1, 0.0
+                if count:
+                    scores = (sums[:count] @ vector) / norms[:count]
+                    # cluster đã quá window_days so với bài này thì không nhận nữa
+                    scores[last_ordinals[:count] < day_ordinal - self.window_days] = -1.0
+                    best = int(np.argmax(scores))
+                    similarity = float(scores[best])
+
+                if best < 0 or similarity < self.threshold:
+                    cursor = self._conn.execute(
+                        "INSERT INTO clusters (model, size, first_date, last_date, centroid) VALUES (?, 0, ?, ?, ?)",
+                        (model, day, day, vector.tobytes())
+                    )
+                    cluster_ids.append(cursor.lastrowid)
+                    sizes.append(0)
+                    first_dates.append(day)
+                    last_dates.append(day)
+                    best, similarity = count, 1.0
+                    count += 1
+
+                sums[best] += vector
+                norms[best] = np.linalg.norm(sums[best]) or 1.0
+                last_ordinals[best] = max(last_ordinals[best], day_ordinal)
+                sizes[best] += 1
+                first_dates[best] = min(first_dates[best], day)
+                last_dates[best] = max(last_dates[best], day)
+                touched.add(best)
+                members.append((article['id'], cluster_ids[best], day, article.get('field') or '',
+                                article.get('title'), article.get('url'), round(similarity, 4)))
+                for term, term_count in counts.items():
+                    terms[(cluster_ids[best], term)] += term_count
+
+            self._conn.executemany(
+                "UPDATE clusters SET size = ?, first_date = ?, last_date = ?, centroid = ?, vector_sum = ? WHERE id = ?",
+                [(sizes[i], first_dates[i], last_dates[i], (sums[i] / norms[i]).tobytes(), sums[i].tobytes(),
+                  cluster_ids[i]) for i in sorted(touched)]
+            )
+            self._conn.executemany(
+                "INSERT INTO members (article_id, cluster_id, date, field, title, url, similarity) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", members
+            )
+            self._conn.executemany("""
+                INSERT INTO cluster_terms (cluster_id, term, count) VALUES (?, ?, ?)
+                ON CONFLICT (cluster_id, term) DO UPDATE SET count = count + excluded.count
+            """, [(*key, count) for key, count in terms.items()])
+        return len(members)
+
+    def _missing_locked(self, article_ids: List[str]) -> List[str]:
+        known = set()
+        for start in range(0, len(article_ids), 500):
+            batch = article_ids[start:start + 500]
+            known.update(row[0] for row in self._conn.execute(
+                f"SELECT article_id FROM members WHERE article_id IN ({','.join('?' * len(batch))})", batch
+            ))
+        return [doc_id for doc_id in article_ids if doc_id not in known]
+
+    def clusters(self, start_date: str, end_date: str, field: Optional[str] = None,
+                 min_size: int = 2, top_n: int = 20, articles_per_cluster: int = 5) -> List[Dict]:
+        """
+        Các câu chuyện trong khoảng ngày, lớn nhất trước
+
+        Returns:
+            [{'id', 'label', 'keywords', 'size', 'first_date', 'last_date', 'articles': [...]}],
+            size = số bài của cluster trong khoảng (và lĩnh vực) được hỏi
+        """
+        start_date, end_date = sorted((start_date, end_date))
+        where, params = "date BETWEEN ? AND ?", [start_date, end_date]
+        if field:
+            where += " AND field = ?"
+            params.append(field)
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT cluster_id, COUNT(*) AS n FROM members WHERE {where} GROUP BY cluster_id "
+                f"HAVING n >= ? ORDER BY n DESC, cluster_id DESC LIMIT ?", params + [min_size, top_n]
+            ).fetchall()
+            result = []
+            for cluster_id, size in rows:
+                first_date, last_date = self._conn.execute(
+                    "SELECT first_date, last_date FROM clusters WHERE id = ?", (cluster_id,)
+                ).fetchone()
+                keywords = self._conn.execute(
+                    "SELECT term, count FROM cluster_terms WHERE cluster_id = ? ORDER BY count DESC, term LIMIT ?",
+                    (cluster_id, self.label_size)
+                ).fetchall()
+                # bài gần centroid nhất đại diện cho câu chuyện
+                articles = self._conn.execute(
+                    f"SELECT article_id, title, date, url, similarity FROM members WHERE cluster_id = ? AND {where} "
+                    f"ORDER BY similarity DESC, date DESC LIMIT ?", [cluster_id] + params + [articles_per_cluster]
+                ).fetchall()
+                result.append({
+                    'id': cluster_id,
+                    'label': ", ".join(term for term, _ in keywords),
+                    'keywords': [{'word': term, 'count': count} for term, count in keywords],
+                    'size': size,
+                    'first_date': first_date,
+                    'last_date': last_date,
+                    'articles': [
+                        {'id': doc_id, 'title': title, 'date': day, 'url': url, 'similarity': similarity}
+                        for doc_id, title, day, url, similarity in articles
+                    ],
+                })
+        return result
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,289 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+import math
+import os
+import sqlite3
+import threading
+from .term_matrix import bucket_of
+
+
+def article_key(article: Dict) -> str:
+    """Khoá của bài trong store: url (giống nhau giữa bài vừa crawl và bài đọc lại từ DB)"""
+    return article.get('url') or article.get('id') or f"{article.get('title', '')}|{article.get('date', '')}"
+
+
+class TrendStore:
+    """
+    Thống kê xu hướng tính sẵn theo (ngày, lĩnh vực) trong SQLite
+
+    - term_counts: tần suất từ khóa (đã lọc stopword, xem NewsAnalyzer.article_word_counts)
+    - entity_counts: số lần xuất hiện của thực thể
+    - day_stats: số bài, tổng số từ
+
+    Cập nhật tăng dần mỗi lần ingest (mỗi bài chỉ được cộng một lần, theo article_key).
+    Truy vấn một khoảng ngày = SUM trên các dòng theo ngày, không phụ thuộc số bài.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # RLock: BurstDetector dùng chung connection + lock này và gọi dates()/day_counts() khi đang giữ lock
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS articles (
+                    key TEXT PRIMARY KEY,
+                    date TEXT NOT NULL,
+                    field TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS day_stats (
+                    date TEXT NOT NULL,
+                    field TEXT NOT NULL,
+                    articles INTEGER NOT NULL,
+                    tokens INTEGER NOT NULL,
+                    PRIMARY KEY (date, field)
+                );
+                CREATE TABLE IF NOT EXISTS term_counts (
+                    date TEXT NOT NULL,
+                    field TEXT NOT NULL,
+                    term TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (date, field, term)
+                );
+                CREATE TABLE IF NOT EXISTS entity_counts (
+                    date TEXT NOT NULL,
+                    field TEXT NOT NULL,
+                    entity TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (date, field, entity, type)
+                );
+            """)
+
+    # ---------------- ingest ----------------
+
+    def missing(self, articles: Iterable[Dict]) -> List[Dict]:
+        """Các bài chưa được cộng vào store"""
+        articles = [a for a in articles if a.get('date')]
+        keys = [article_key(a) for a in articles]
+        known = set()
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                known.update(row[0] for row in self._conn.execute(
+                    f"SELECT key FROM articles WHERE key IN ({','.join('?' * len(batch))})", batch
+                ))
+        seen = set()
+        result = []
+        for article, key in zip(articles, keys):
+            if key not in known and key not in seen:
+                seen.add(key)
+                result.append(article)
+        return result
+
+    def add_articles(self, articles: List[Dict], word_counts: List[Counter],
+                     entities: Optional[List[List[Dict]]] = None) -> int:
+        """
+        Cộng thống kê của các bài vào dòng (ngày, lĩnh vực) tương ứng; bài đã có thì bỏ qua
+
+        Args:
+            word_counts: tần suất từ khóa của từng bài
+            entities: thực thể của từng bài [{'text', 'type'}] (None nếu không trích xuất)
+        Returns:
+            số bài được cộng
+        """
+        entities = entities or [[] for _ in articles]
+        days: Dict[Tuple[str, str], List[int]] = {}
+        terms: Counter = Counter()
+        ents: Counter = Counter()
+        rows = []
+
+        with self._lock, self._conn:
+            for article, counts, article_entities in zip(articles, word_counts, entities):
+                day, field = article.get('date'), article.get('field') or ''
+                if not day:
+                    continue
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO articles (key, date, field) VALUES (?, ?, ?)",
+                    (article_key(article), day, field)
+                )
+                if cursor.rowcount == 0:
+                    continue
+                stats = days.setdefault((day, field), [0, 0])
+                stats[0] += 1
+                stats[1] += sum(counts.values())
+                for term, count in counts.items():
+                    terms[(day, field, term)] += count
+                for entity in article_entities:
+                    ents[(day, field, entity['text'], entity['type'])] += 1
+                rows.append(article)
+
+            self._conn.executemany("""
+                INSERT INTO day_stats (date, field, articles, tokens) VALUES (?, ?, ?, ?)
+                ON CONFLICT (date, field) DO UPDATE SET
+                    articles = articles + excluded.articles, tokens = tokens + excluded.tokens
+            """, [(day, field, n, tokens) for (day, field), (n, tokens) in days.items()])
+            self._conn.executemany("""
+                INSERT INTO term_counts (date, field, term, count) VALUES (?, ?, ?, ?)
+                ON CONFLICT (date, field, term) DO UPDATE SET count = count + excluded.count
+            """, [(*key, count) for key, count in terms.items()])
+            self._conn.executemany("""
+                INSERT INTO entity_counts (date, field, entity, type, count) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (date, field, entity, type) DO UPDATE SET count = count + excluded.count
+            """, [(*key, count) for key, count in ents.items()])
+        return len(rows)
+
+    # ---------------- queries ----------------
+
+    @staticmethod
+    def _where(start_date: str, end_date: str, field: Optional[str]) -> Tuple[str, Tuple]:
+        # API nhận khoảng ngày theo cả hai chiều (crawl dùng start_date >= end_date)
+        start_date, end_date = sorted((start_date, end_date))
+        if field:
+            return "date BETWEEN ? AND ? AND field = ?", (start_date, end_date, field)
+        return "date BETWEEN ? AND ?", (start_date, end_date)
+
+    def _query(self, sql: str, params: Tuple) -> List[Tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def dates(self, field: Optional[str] = None) -> List[str]:
+        """Các ngày có dữ liệu, tăng dần"""
+        if field:
+            rows = self._query("SELECT date FROM day_stats WHERE field = ? ORDER BY date", (field,))
+        else:
+            rows = self._query("SELECT DISTINCT date FROM day_stats ORDER BY date", ())
+        return [row[0] for row in rows]
+
+    def day_counts(self, day: str, field: Optional[str] = None) -> Tuple[int, Dict[Tuple[str, str], int]]:
+        """
+        Toàn bộ thống kê của một ngày
+
+        Returns:
+            (số bài, {('term', từ) | ('entity', 'tên|loại'): count})
+        """
+        where, params = self._where(day, day, field)
+        articles = self.summary(day, day, field)['articles']
+        counts = {('term', term): count for term, count in self._query(
+            f"SELECT term, SUM(count) FROM term_counts WHERE {where} GROUP BY term", params
+        )}
+        counts.update({('entity', f"{entity}|{etype}"): count for entity, etype, count in self._query(
+            f"SELECT entity, type, SUM(count) FROM entity_counts WHERE {where} GROUP BY entity, type", params
+        )})
+        return articles, counts
+
+    def summary(self, start_date: str, end_date: str, field: Optional[str] = None) -> Dict:
+        """Số bài, tổng số từ và ngày đầu / cuối có dữ liệu trong khoảng"""
+        where, params = self._where(start_date, end_date, field)
+        articles, tokens, first, last = self._query(
+            f"SELECT COALESCE(SUM(articles), 0), COALESCE(SUM(tokens), 0), MIN(date), MAX(date) "
+            f"FROM day_stats WHERE {where}", params
+        )[0]
+        return {'articles': articles, 'tokens': tokens, 'start': first, 'end': last}
+
+    def top_terms(self, start_date: str, end_date: str, field: Optional[str] = None,
+                  top_n: int = 20) -> List[Tuple[str, int]]:
+        where, params = self._where(start_date, end_date, field)
+        return self._query(
+            f"SELECT term, SUM(count) AS total FROM term_counts WHERE {where} "
+            f"GROUP BY term ORDER BY total DESC, term LIMIT ?", params + (top_n,)
+        )
+
+    def top_entities(self, start_date: str, end_date: str, field: Optional[str] = None,
+                     top_n: int = 20) -> List[Dict]:
+        where, params = self._where(start_date, end_date, field)
+        rows = self._query(
+            f"SELECT entity, type, SUM(count) AS total FROM entity_counts WHERE {where} "
+            f"GROUP BY entity, type ORDER BY total DESC, entity LIMIT ?", params + (top_n,)
+        )
+        return [{'text': text, 'type': etype, 'count': count} for text, etype, count in rows]
+
+    def timeline(self, start_date: str, end_date: str, terms: List[str], field: Optional[str] = None,
+                 freq: str = 'day') -> Dict[str, Dict[str, int]]:
+        """{bucket: {term: count}} theo day | week | month, chỉ các ngày có bài"""
+        where, params = self._where(start_date, end_date, field)
+        days = [row[0] for row in self._query(
+            f"SELECT DISTINCT date FROM day_stats WHERE {where} ORDER BY date", params
+        )]
+        timeline: Dict[str, Dict[str, int]] = {}
+        for day in days:
+            bucket = bucket_of(day, freq)
+            if bucket is not None:
+                timeline.setdefault(bucket, {term: 0 for term in terms})
+        if not terms or not timeline:
+            return timeline
+
+        rows = self._query(
+            f"SELECT date, term, SUM(count) FROM term_counts WHERE {where} "
+            f"AND term IN ({','.join('?' * len(terms))}) GROUP BY date, term",
+            params + tuple(terms)
+        )
+        for day, term, count in rows:
+            bucket = bucket_of(day, freq)
+            if bucket is not None:
+                timeline[bucket][term] += count
+        return dict(sorted(timeline.items()))
+
+    def trending(self, start_date: str, end_date: str, field: Optional[str] = None,
+                 top_n: int = 20, baseline_days: int = 28, candidates: int = 200) -> List[Dict]:
+        """
+        Từ khóa nổi bật của khoảng so với baseline là baseline_days ngày liền trước
+
+        - tfidf: tần suất trong khoảng × idf, idf tính theo số ngày baseline có từ đó
+          (từ ngày nào cũng có như "giá", "thị trường" bị hạ điểm)
+        - lift: tỉ lệ tần suất (đã làm trơn) trong khoảng so với baseline, > 1 là tăng
+        """
+        period = self.top_terms(start_date, end_date, field, top_n=candidates)
+        if not period:
+            return []
+
+        base_end = (datetime.strptime(min(start_date, end_date), '%Y-%m-%d') - timedelta(days=1)).date()
+        base_start = base_end - timedelta(days=baseline_days - 1)
+        where, params = self._where(base_start.isoformat(), base_end.isoformat(), field)
+        terms = [term for term, _ in period]
+        baseline = {
+            term: (total, days) for term, total, days in self._query(
+                f"SELECT term, SUM(count), COUNT(DISTINCT date) FROM term_counts WHERE {where} "
+                f"AND term IN ({','.join('?' * len(terms))}) GROUP BY term",
+                params + tuple(terms)
+            )
+        }
+        base_days = self._query(f"SELECT COUNT(DISTINCT date) FROM day_stats WHERE {where}", params)[0][0]
+        base_tokens = self.summary(base_start.isoformat(), base_end.isoformat(), field)['tokens']
+        period_tokens = self.summary(start_date, end_date, field)['tokens'] or 1
+        vocab = len(terms)
+
+        result = []
+        for term, count in period:
+            base_count, df = baseline.get(term, (0, 0))
+            idf = math.log((base_days + 1) / (df + 1)) + 1
+            lift = ((count + 1) / (period_tokens + vocab)) / ((base_count + 1) / (base_tokens + vocab))
+            result.append({
+                'word': term,
+                'count': count,
+                'baseline_count': base_count,
+                'tfidf': round(count / period_tokens * idf, 6),
+                'lift': round(lift, 3),
+            })
+        result.sort(key=lambda r: r['tfidf'], reverse=True)
+        return result[:top_n]
+
+    def trend(self, start_date: str, end_date: str, field: Optional[str] = None,
+              top_n: int = 20, freq: str = 'day', baseline_days: int = 28) -> Dict:
+        """Cùng format với NewsAnalyzer.analyze_trend, thêm 'trending' và 'entities'"""
+        summary = self.summary(start_date, end_date, field)
+        keywords = self.top_terms(start_date, end_date, field, top_n)
+        return {
+            "keywords": [{"word": word, "count": count} for word, count in keywords],
+            "total_articles": summary['articles'],
+            "date_range": {"start": summary['start'], "end": summary['end']},
+            "timeline": self.timeline(start_date, end_date, [word for word, _ in keywords[:5]], field, freq),
+            "trending": self.trending(start_date, end_date, field, top_n, baseline_days),
+            "entities": self.top_entities(start_date, end_date, field, top_n),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,46 +1,345 @@
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
 from typing import List, Dict, Optional
 import hashlib
 import json
+import os
+import re
+import threading
+import time
+from .bm25_index import BM25Index
+from .encoder import TextEncoder
+from .token_cache import TokenCache
+from .near_duplicates import DuplicateChecker, NearDuplicateIndex
+from .entity_index import EntityIndex
+from .vector_store import VectorStore, ChromaVectorStore, DEFAULT_COLLECTION, create_vector_store
+
+DEFAULT_EMBEDDING_MODEL = 'sentence-transformers/paraphrase-multilingual-mpnet-base-v2'
+
+
+class _Generation:
+    """Một phiên bản của database: vector store + BM25 + model đã dùng để encode"""
+
+    def __init__(self, name: str, store: VectorStore, bm25: BM25Index,
+                 encoder: TextEncoder, model_name: str):
+        self.name = name
+        self.store = store
+        self.bm25 = bm25
+        self.encoder = encoder
+        self.model_name = model_name
+
 
 class ArticleVectorDB:
     
-    def __init__(self, persist_directory: str = None):
+    def __init__(self, persist_directory: str = None, backend: str = None,
+                 model_name: str = DEFAULT_EMBEDDING_MODEL, gc_grace_seconds: float = 300,
+                 encoder_backend: str = None, **store_kwargs):
         """
-        Initialize ChromaDB with PhoBERT embeddings
+        Initialize vector store with PhoBERT embeddings
+
+        Dữ liệu được chia thành các generation (collection có version). File alias.json
+        trỏ tới generation đang active; rebuild/reset tạo generation mới ở background
+        rồi mới đổi con trỏ, nên người đang chat không bao giờ thấy DB rỗng.
         
         Args:
             persist_directory: Where to store the database
+            backend: 'chroma' (mặc định) hoặc 'numpy' (in-process, memory-mapped),
+                     có thể set qua env SERPERIOR_VECTOR_BACKEND
+            model_name: embedding model cho các generation mới
+            gc_grace_seconds: generation cũ được giữ lại bao lâu sau khi bị thay thế
+                     (để các request đang chạy trên nó kết thúc) trước khi bị xoá
+            encoder_backend: 'torch' (mặc định), 'onnx' hoặc 'onnx-int8',
+                     có thể set qua env SERPERIOR_ENCODER_BACKEND
+            store_kwargs: tham số riêng của backend (VD: dtype='float16' hoặc
+                     compression='int8'|'pca'|'binary' cho numpy, env SERPERIOR_VECTOR_COMPRESSION)
         """
         if persist_directory is None:
-            import os
             # Default to backend/data/real_chroma_db
             base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
             persist_directory = os.path.join(base_dir, "data", "real_chroma_db")
 
-        
+        self.persist_directory = persist_directory
+        self.backend = backend or os.getenv("SERPERIOR_VECTOR_BACKEND", "chroma")
+        self.model_name = model_name
+        self.encoder_backend = encoder_backend or os.getenv("SERPERIOR_ENCODER_BACKEND", "torch")
+        self.gc_grace_seconds = gc_grace_seconds
+        if self.backend == "numpy" and 'compression' not in store_kwargs:
+            store_kwargs['compression'] = os.getenv("SERPERIOR_VECTOR_COMPRESSION") or None
+        self._store_kwargs = store_kwargs
+        self._encoders: Dict[str, TextEncoder] = {}
+        # ghi (add_articles, swap alias) đi qua lock này, đọc thì không cần lock
+        self._write_lock = threading.RLock()
+        self._rebuild_thread: Optional[threading.Thread] = None
+        # id các bài được add vào generation nguồn trong lúc rebuild (bước bắt kịp chỉ copy phần này)
+        self._rebuild_source: Optional[_Generation] = None
+        self._rebuild_added: List[str] = []
 
-        self.client = chromadb.PersistentClient(path=persist_directory)
-        self.embedding_model = SentenceTransformer('sentence-transformers/paraphrase-multilingual-mpnet-base-v2')
-        # a collection: a table in db
-        try:
-            # to get the collection existed in that client (A persistent client instance defined by path folder)
-            self.collection = self.client.get_collection("dantri_articles")
-            print(" Loaded existing collection")
-        except:
+        os.makedirs(persist_directory, exist_ok=True)
+        # tokens của từng bài, tách một lần lúc ingest, dùng chung cho BM25 mọi generation và NewsAnalyzer
+        self.token_cache = TokenCache(os.path.join(persist_directory, "tokens.db"))
+        # chữ ký MinHash của các bài gốc, bài gần trùng chỉ được gắn vào bài gốc chứ không embed lại
+        self.duplicates = NearDuplicateIndex(os.path.join(persist_directory, "duplicates.db"))
+        # thực thể -> bài, điền ở background sau mỗi lần ingest (NER không chạy trong add_articles)
+        self.entities = EntityIndex(os.path.join(persist_directory, "entities.db"))
+        self._alias_path = os.path.join(persist_directory, f"alias_{self.backend}.json")
+        self._alias = self._read_alias()
+        current = self._alias['current']
+        info = self._alias['generations'].setdefault(current, {'model': model_name, 'created_at': time.time()})
 
-            # nếu chưa có hoặc lỗi thì tạo collection đó 
-         
-            self.collection = self.client.create_collection(
-                # tên bảng
-                name="dantri_articles",
-                # 
-                metadata={"description": "Dantri news articles"}
-            )
-            print("Created new collection")
+        self._active = self._open_generation(current, info['model'])
+        self._write_alias()
+        self._sync_duplicates(self._active)
+        self.collect_garbage()
+
+    # ---------------- generations ----------------
+
+    def _read_alias(self) -> Dict:
+        if os.path.exists(self._alias_path):
+            with open(self._alias_path, encoding='utf-8') as f:
+                return json.load(f)
+        return {'current': DEFAULT_COLLECTION, 'generations': {}, 'retired': []}
+
+    def _write_alias(self) -> None:
+        """Ghi file tạm rồi os.replace -> đổi con trỏ là atomic kể cả khi crash"""
+        tmp_path = f"{self._alias_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._alias, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._alias_path)
+
+    def _load_encoder(self, model_name: str) -> TextEncoder:
+        if model_name not in self._encoders:
+            self._encoders[model_name] = TextEncoder(model_name, backend=self.encoder_backend)
+        return self._encoders[model_name]
+
+    def _open_generation(self, name: str, model_name: str) -> _Generation:
+        store = create_vector_store(self.backend, self.persist_directory, name=name, **self._store_kwargs)
+        # keyword index (BM25) song song với vector index, dùng cho hybrid search
+        bm25 = BM25Index(os.path.join(store.directory, "bm25_index.npz"))
+        generation = _Generation(name, store, bm25, self._load_encoder(model_name), model_name)
+        self._sync_bm25(generation)
+        return generation
+
+    def _next_generation_name(self) -> str:
+        versions = [0]
+        for name in list(self._alias['generations']) + [r['name'] for r in self._alias['retired']]:
+            match = re.fullmatch(rf"{DEFAULT_COLLECTION}_v(\d+)", name)
+            if match:
+                versions.append(int(match.group(1)))
+        return f"{DEFAULT_COLLECTION}_v{max(versions) + 1}"
+
+    @property
+    def generation(self) -> str:
+        """tên generation đang active"""
+        return self._active.name
+
+    @property
+    def store(self) -> VectorStore:
+        return self._active.store
+
+    @property
+    def bm25(self) -> BM25Index:
+        return self._active.bm25
+
+    @property
+    def encoder(self) -> TextEncoder:
+        return self._active.encoder
+
+    @property
+    def embedding_model(self):
+        """SentenceTransformer bên dưới encoder đang active"""
+        return self._active.encoder.model
+
+    @property
+    def client(self):
+        """chromadb client (chỉ có với backend chroma)"""
+        return self.store.client if isinstance(self.store, ChromaVectorStore) else None
+
+    @property
+    def collection(self):
+        """chromadb collection (chỉ có với backend chroma)"""
+        return self.store.collection if isinstance(self.store, ChromaVectorStore) else None
+
+    def create_generation(self, model_name: Optional[str] = None) -> _Generation:
+        """
+        Tạo generation mới (rỗng) để nạp dữ liệu ở background.
+        Chưa ai đọc được nó cho tới khi promote().
+        """
+        with self._write_lock:
+            name = self._next_generation_name()
+            model_name = model_name or self.model_name
+            self._alias['generations'][name] = {'model': model_name, 'created_at': time.time()}
+            self._write_alias()
+        print(f"Created staging generation {name}")
+        return self._open_generation(name, model_name)
+
+    def promote(self, generation: _Generation, allow_empty: bool = False) -> None:
+        """
+        Đổi alias sang generation mới; generation cũ được retire và GC sau gc_grace_seconds
+
+        Không promote generation rỗng (trừ khi allow_empty, VD: rebuild một DB vốn đã rỗng),
+        nếu không người đang chat sẽ thấy DB trống.
+        """
+        with self._write_lock:
+            old = self._active
+            if old.name == generation.name:
+                return
+            if not allow_empty and generation.store.count() == 0:
+                raise ValueError(f"Refusing to promote empty generation {generation.name}")
+            self._alias['current'] = generation.name
+            self._alias['retired'].append({'name': old.name, 'retired_at': time.time()})
+            self._write_alias()
+            # gán một attribute là atomic với các thread đọc
+            self._active = generation
+        print(f"Promoted generation {generation.name} (was {old.name})")
+        self.collect_garbage()
+
+    def discard_generation(self, generation: _Generation) -> None:
+        """Bỏ một generation staging chưa promote (VD: crawl lỗi giữa chừng)"""
+        with self._write_lock:
+            if generation.name == self._active.name:
+                raise ValueError("Cannot discard the active generation")
+            self._alias['generations'].pop(generation.name, None)
+            self._write_alias()
+        generation.store.drop()
+
+    def collect_garbage(self, grace_seconds: Optional[float] = None) -> int:
+        """
+        Xoá các generation đã retire quá grace_seconds
+
+        Returns:
+            số generation đã xoá
+        """
+        grace_seconds = self.gc_grace_seconds if grace_seconds is None else grace_seconds
+        now = time.time()
+        dropped = 0
+        with self._write_lock:
+            keep = []
+            for retired in self._alias['retired']:
+                name = retired['name']
+                if name == self._active.name or now - retired['retired_at'] < grace_seconds:
+                    keep.append(retired)
+                    continue
+                try:
+                    create_vector_store(self.backend, self.persist_directory, name=name,
+                                        **self._store_kwargs).drop()
+                    self._alias['generations'].pop(name, None)
+                    dropped += 1
+                    print(f"Garbage-collected generation {name}")
+                except Exception as e:
+                    print(f"Could not drop generation {name}: {e}")
+                    keep.append(retired)
+            self._alias['retired'] = keep
+            if dropped:
+                self._write_alias()
+        return dropped
+
+    def _copy_batch(self, source: _Generation, target: _Generation, batch: Dict) -> int:
+        """Copy một batch {'ids', 'embeddings', 'documents', 'metadatas'} sang target, bỏ các bài đã có"""
+        existing = {row['id'] for row in target.store.get_by_ids(batch['ids'])}
+        keep = [i for i, doc_id in enumerate(batch['ids']) if doc_id not in existing]
+        if not keep:
+            return 0
+        ids = [batch['ids'][i] for i in keep]
+        documents = [batch['documents'][i] for i in keep]
+        metadatas = [batch['metadatas'][i] for i in keep]
+        if source.model_name == target.model_name:
+            # cùng model: dùng lại embeddings, không encode lại
+            embeddings = batch['embeddings'][keep]
+        else:
+            embeddings = target.encoder.encode_documents(documents)
+        target.store.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        target.bm25.add_documents(ids, documents, self.token_cache.tokenize_many(zip(ids, documents)))
+        return len(ids)
+
+    def _copy_records(self, source: _Generation, target: _Generation) -> int:
+        """Copy toàn bộ các bài chưa có trong target"""
+        copied = sum(self._copy_batch(source, target, batch) for batch in source.store.iter_records())
+        target.bm25.save()
+        return copied
+
+    def _copy_ids(self, source: _Generation, target: _Generation, ids: List[str]) -> int:
+        """Copy đúng các bài theo id (bước bắt kịp của rebuild), không quét lại cả generation"""
+        rows = source.store.get_by_ids(list(dict.fromkeys(ids)))
+        if not rows:
+            return 0
+        ids = [row['id'] for row in rows]
+        copied = self._copy_batch(source, target, {
+            'ids': ids,
+            'embeddings': source.store.get_vectors(ids),
+            'documents': [row['content'] for row in rows],
+            'metadatas': [row['metadata'] for row in rows],
+        })
+        target.bm25.flush()
+        return copied
+
+    def rebuild(self, model_name: Optional[str] = None, background: bool = True):
+        """
+        Re-index toàn bộ sang generation mới rồi swap, không có khoảng DB rỗng
 
+        - cùng model: copy embeddings có sẵn, không encode lại
+        - model khác (nâng cấp model): encode lại ở background, query vẫn dùng
+          model cũ + generation cũ cho tới lúc swap
+
+        Returns:
+            Thread nếu background=True, ngược lại là tên generation mới
+        """
+        if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+            raise RuntimeError("A rebuild is already running")
+
+        def _run():
+            with self._write_lock:
+                source = self._active
+                # từ đây add_articles ghi lại id các bài mới của source; bài có trước đó nằm trong lần copy đầu
+                self._rebuild_source, self._rebuild_added = source, []
+            target = self.create_generation(model_name or source.model_name)
+            try:
+                copied = self._copy_records(source, target)
+                # bắt kịp: chỉ copy các bài được add vào generation cũ trong lúc copy,
+                # giữ write lock ngắn (tỉ lệ với số bài mới, không phải cả corpus)
+                with self._write_lock:
+                    # generation khác đã được promote trong lúc copy (replace_articles, reset_db):
+                    # promote bản copy của generation cũ sẽ âm thầm huỷ thay đổi đó
+                    if self._active is not source:
+                        raise RuntimeError(f"Active generation changed from {source.name} to "
+                                           f"{self._active.name} during rebuild")
+                    copied += self._copy_ids(source, target, self._rebuild_added)
+                    self.promote(target, allow_empty=source.store.count() == 0)
+                print(f"Rebuild done: {copied} articles in {target.name}")
+            except Exception as e:
+                print(f"Rebuild failed: {e}")
+                self.discard_generation(target)
+                raise
+            finally:
+                with self._write_lock:
+                    self._rebuild_source, self._rebuild_added = None, []
+            return target.name
+
+        if not background:
+            return _run()
+        self._rebuild_thread = threading.Thread(target=_run, name="vector-db-rebuild", daemon=True)
+        self._rebuild_thread.start()
+        return self._rebuild_thread
+
+    def _sync_bm25(self, generation: _Generation):
+        """Build lại BM25 từ store nếu index thiếu bài (VD: db cũ tạo trước khi có BM25)"""
+        total = generation.store.count()
+        if total == len(generation.bm25):
+            return
+
+        print(f"Syncing BM25 index ({len(generation.bm25)}/{total} documents)...")
+        generation.bm25.clear()
+        for ids, documents in generation.store.iter_documents():
+            generation.bm25.add_documents(ids, documents, self.token_cache.tokenize_many(zip(ids, documents)))
+        generation.bm25.save()
+
+    def _sync_duplicates(self, generation: _Generation):
+        """Đưa các bài đã lưu trước khi có index trùng lặp vào index (chỉ chạy khi index thiếu bài)"""
+        if len(self.duplicates) >= generation.store.count():
+            return
+
+        print(f"Syncing near-duplicate index ({len(self.duplicates)}/{generation.store.count()} documents)...")
+        for ids, documents in generation.store.iter_documents():
+            self.duplicates.add(ids, [self.duplicates.signature(document) for document in documents])
+
+    # ---------------- articles ----------------
 
     def _generate_id(self, article: Dict) -> str:
         """Generate unique ID for AN article
@@ -53,15 +352,41 @@ class ArticleVectorDB:
             text = f"{article.get('title', '')}{article.get('date', '')}"
             return hashlib.md5(text.encode()).hexdigest()
         
-    def add_articles(self, articles: List[Dict]) -> int:
+    def duplicate_checker(self, generation: Optional[_Generation] = None) -> DuplicateChecker:
+        """
+        Bộ kiểm tra bài gần trùng cho một lô (VD: một lần crawl)
+
+        Chỉ so với các bài gốc còn trong generation đích (generation staging rỗng thì chỉ so trong lô).
+        """
+        gen = generation or self._active
+        return DuplicateChecker(
+            self.duplicates,
+            exists=lambda ids: {row['id'] for row in gen.store.get_by_ids(ids)},
+            id_of=self.article_id
+        )
+
+    def link_duplicates(self, articles: List[Dict]) -> int:
+        """Ghi lại các bài đã được xác định là bản sao (có 'duplicate_of', 'similarity'), VD: bài crawler bỏ qua"""
+        links = [(dict(article, id=self.article_id(article)), article['duplicate_of'], article.get('similarity', 1.0))
+                 for article in articles if article.get('duplicate_of')]
+        with self._write_lock:
+            self.duplicates.link(links)
+        return len(links)
+
+    def add_articles(self, articles: List[Dict], generation: Optional[_Generation] = None) -> int:
         """
         thêm các articals (list of dicts) vào vector db
+
+        Bài gần trùng (MinHash) với một bài đã lưu hoặc một bài trước đó trong cùng lô
+        không được embed / lưu lại, chỉ được gắn vào bài gốc (xem NearDuplicateIndex).
         
         Args:
             articles: List of article dicts {'title', 'body', 'date', 'url'}
+            generation: generation đích (mặc định generation đang active),
+                        VD: generation staging từ create_generation()
             
         Returns:
-            số lượng bài báo
+            số lượng bài báo được lưu (không tính bản sao)
         """
         if not articles:
             print("Không có báo sao đc")
@@ -73,6 +398,9 @@ class ArticleVectorDB:
         metadatas = [] 
         ids = []        
         seen_ids = set()        
+        gen = generation or self._active
+        checker = self.duplicate_checker(gen)
+        links = []
         
         # duyệt từng bài báo trong danh sách
         for article in articles:
@@ -99,6 +427,11 @@ class ArticleVectorDB:
                 
             seen_ids.add(article_id)
 
+            match = checker.check(article_id, text)
+            if match:
+                links.append((dict(article, id=article_id), *match))
+                continue
+
             # documents là những thông tin quan trọng
             # metadatas là những thông tin phụ, ko cần preprocess và ko cần LLM phải nhận
             documents.append(text)
@@ -107,43 +440,80 @@ class ArticleVectorDB:
                 'date': date_int, # Store as int
                 'date_str': date_str, # Store original string for display
                 'url': article.get('url', ''),
+                'field': article.get('field', ''),
                 'body': article.get('body', '')[:500]  
             })
             ids.append(article_id)
         
+        if links:
+            print(f"bỏ qua {len(links)} bài gần trùng (gắn vào bài gốc)")
+
         if not documents:
+            with self._write_lock:
+                self.duplicates.link(links)
             print(" No valid articles to add")
             return 0
-        
+
         # Generate embeddings
         print("generating embeddings...")
-        embeddings = self.embedding_model.encode(
-            documents, 
-            show_progress_bar=True,
-            # save in numpy form 
-            convert_to_numpy=True 
-        ).tolist()
-        
-        # Add to ChromaDB
-        print("lưu vào collection (named ...)...")
-        self.collection.add(
-            embeddings=embeddings,
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
-        )
+        embeddings = gen.encoder.encode_documents(documents, show_progress_bar=True)
         
+        # tách từ ngoài write lock, kết quả được cache cho BM25 và phân tích sau này
+        tokens = self.token_cache.tokenize_many(zip(ids, documents))
+
+        # Add to vector store
+        print(f"lưu vào vector store ({self.backend}, {gen.name})...")
+        with self._write_lock:
+            gen.store.add(
+                ids=ids,
+                embeddings=embeddings,
+                documents=documents,
+                metadatas=metadatas
+            )
+
+            if gen is self._rebuild_source:
+                self._rebuild_added.extend(ids)
+            gen.bm25.add_documents(ids, documents, tokens)
+            # chỉ ghi segment của các bài mới, không ghi lại cả index
+            gen.bm25.flush()
+            self.duplicates.add(ids, [checker.signatures[doc_id] for doc_id in ids])
+            self.duplicates.link(links)
     
         #self.client.persist()
         
         print(f"đã thêm {len(documents)} articles to database")
         return len(documents)
     
+    def article_id(self, article: Dict) -> str:
+        """Id của bài trong DB (bài đọc từ DB đã có 'id', bài vừa crawl thì tính như lúc add)"""
+        return article.get('id') or self._generate_id(article)
+
+    def get_embeddings(self, ids: List[str]):
+        """
+        Embeddings đã lưu (generation đang active), không encode lại
+
+        Returns:
+            (embedding model, ids có trong DB, ma trận vector đã normalize cùng thứ tự);
+            model đi kèm vì vector của hai model khác nhau không so sánh được
+        """
+        active = self._active
+        ids = list(ids)
+        try:
+            return active.model_name, ids, active.store.get_vectors(ids)
+        except KeyError:
+            existing = {row['id'] for row in active.store.get_by_ids(ids)}
+            ids = [doc_id for doc_id in ids if doc_id in existing]
+            return active.model_name, ids, active.store.get_vectors(ids)
+
+    def encode_query(self, query: str):
+        """Embedding của query bằng encoder của generation đang active"""
+        return self._active.encoder.encode_query(query)
+
     def search(self, query: str, top_k: int = 5) -> List[Dict]:
         """
         Search for relevant articles
         1. embed the query
-        2. tìm kiếm : self.collection.query(...)
+        2. tìm kiếm : self.store.query(...)
         3. hậu xử lý
         
         Args:
@@ -153,36 +523,77 @@ class ArticleVectorDB:
         Returns:
             List of dicts các bài liên quan
         """
+        return self._search(self._active, query, top_k)
+
+    def _search(self, gen: _Generation, query: str, top_k: int, query_embedding=None) -> List[Dict]:
         # Generate query embedding
-        query_embedding = self.embedding_model.encode(
-            query,
-            convert_to_numpy=True
-        ).tolist()
-        
-        #-- tìm kiếm trong chromadb
-        # need to find the structure of results
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=top_k
-        )
+        if query_embedding is None:
+            query_embedding = gen.encoder.encode_query(query)
         
-        #--post processing kết quả
-        articles = []
+        #-- tìm kiếm trong vector store
+        return gen.store.query(query_embedding, top_k=top_k)
 
-        if results['documents'] and results['documents'][0]:
-            for i in range(len(results['documents'][0])):
-                meta = results['metadatas'][0][i]
-                articles.append({
-                    'content': results['documents'][0][i],
-                    'metadata': meta,
-                    'distance': results['distances'][0][i] if 'distances' in results else None
-                })
-        
+    def keyword_search(self, query: str, top_k: int = 5) -> List[Dict]:
+        """
+        Search bằng BM25 (khớp chính xác tên riêng, mã chứng khoán, con số)
+
+        Returns:
+            List of dicts cùng format với search(), kèm 'bm25_score'
+        """
+        return self._keyword_search(self._active, query, top_k)
+
+    def _keyword_search(self, gen: _Generation, query: str, top_k: int) -> List[Dict]:
+        hits = gen.bm25.search(query, top_k=top_k)
+        if not hits:
+            return []
+
+        by_id = {row['id']: row for row in gen.store.get_by_ids([doc_id for doc_id, _ in hits])}
+
+        articles = []
+        for doc_id, score in hits:
+            if doc_id not in by_id:
+                continue
+            articles.append(dict(by_id[doc_id], distance=None, bm25_score=score))
         return articles
+
+    def hybrid_search(self, query: str, top_k: int = 5, candidate_k: Optional[int] = None,
+                      rrf_k: int = 60, query_embedding=None) -> List[Dict]:
+        """
+        Hybrid search: vector + BM25, trộn bằng reciprocal-rank fusion
+        score(d) = sum 1 / (rrf_k + rank_i(d))
+
+        Args:
+            query:
+            top_k: số kết quả trả về
+            candidate_k: số ứng viên lấy từ mỗi nguồn (mặc định 4 * top_k)
+            rrf_k: hằng số RRF (60 theo paper gốc)
+            query_embedding: embedding đã tính sẵn của query (tránh encode lại)
+        """
+        candidate_k = candidate_k or top_k * 4
+        # cả hai nguồn phải đọc cùng một generation dù có swap xen giữa
+        gen = self._active
+        dense = self._search(gen, query, candidate_k, query_embedding=query_embedding)
+        sparse = self._keyword_search(gen, query, candidate_k)
+
+        fused: Dict[str, Dict] = {}
+        for results in (dense, sparse):
+            for rank, doc in enumerate(results):
+                entry = fused.get(doc['id'])
+                if entry is None:
+                    entry = dict(doc, rrf_score=0.0)
+                    fused[doc['id']] = entry
+                else:
+                    # giữ lại distance từ dense và bm25_score từ sparse
+                    for key, value in doc.items():
+                        if entry.get(key) is None:
+                            entry[key] = value
+                entry['rrf_score'] += 1.0 / (rrf_k + rank + 1)
+
+        return sorted(fused.values(), key=lambda d: d['rrf_score'], reverse=True)[:top_k]
     
     def count(self) -> int:
         """ tổng số bài """
-        return self.collection.count()
+        return self.store.count()
     
     
     def get_articles_by_date(self, start_date: str, end_date: str) -> List[Dict]:
@@ -194,50 +605,69 @@ class ArticleVectorDB:
             start_int = int(start_date.replace('-', ''))
             end_int = int(end_date.replace('-', ''))
 
-            results = self.collection.get(
-                where={
-                    "$and": [
-                        {"date": {"$gte": start_int}},
-                        {"date": {"$lte": end_int}}
-                    ]
-                }
-            )
-            
-            articles = []
-            if results['documents']:
-                for i in range(len(results['documents'])):
-                    meta = results['metadatas'][i]
-                    articles.append({
-                        'title': meta.get('title', ''),
-                        'body': meta.get('body', ''), 
-                        'date': meta.get('date_str', ''), # Retrieve original string
-                        'url': meta.get('url', ''),
-                    })
-            return articles
+            results = self.store.get_by_date(start_int, end_int)
+            return [self._article_from_row(row) for row in results]
         except Exception as e:
             print(f"Error querying DB: {e}")
             return []
 
+    @staticmethod
+    def _article_from_row(row: Dict) -> Dict:
+        meta = row['metadata']
+        return {
+            'id': row['id'],
+            'title': meta.get('title', ''),
+            'body': meta.get('body', ''), 
+            'date': meta.get('date_str', ''), # Retrieve original string
+            'url': meta.get('url', ''),
+            'field': meta.get('field', ''),
+        }
+
+    def get_articles_by_ids(self, ids: List[str]) -> List[Dict]:
+        """Các bài theo id, giữ thứ tự ids; id không có trong generation đang active bị bỏ qua"""
+        by_id = {row['id']: row for row in self.store.get_by_ids(list(ids))}
+        return [self._article_from_row(by_id[doc_id]) for doc_id in ids if doc_id in by_id]
+
     def check_existence(self, date: str) -> bool:
         """Check if we have any articles for a specific date"""
         try:
             date_int = int(date.replace('-', ''))
-            results = self.collection.get(
-                where={"date": date_int},
-                limit=1
-            )
-            return len(results['ids']) > 0
+            return len(self.store.get_by_date(date_int, date_int, limit=1)) > 0
         except:
             return False
 
     def get_stats(self) -> Dict:
         """Get database statistics"""
         return {
-            "total_articles": self.collection.count()
+            "total_articles": self.store.count(),
+            "backend": self.backend,
+            "generation": self.generation,
+            "index_bytes": getattr(self.store, 'index_nbytes', None),
+            "near_duplicates": self.duplicates.stats(),
+            "entities": self.entities.stats(),
+            "rebuilding": self._rebuild_thread is not None and self._rebuild_thread.is_alive()
         }
 
-    def clear(self):
-        """mỗi lần người dùng request crawl mới thì những dữ liệu cũ sẽ bị clear"""
-        self.client.delete_collection("dantri_articles")
-        self.collection = self.client.create_collection("dantri_articles")
-        print("Database cleared")
+    def replace_articles(self, articles: List[Dict]) -> int:
+        """
+        Thay toàn bộ dữ liệu bằng các bài mới (thay cho clear() + add_articles())
+
+        Nạp vào một generation staging rồi mới promote, generation cũ bị GC sau;
+        không lưu được bài nào thì giữ nguyên dữ liệu cũ. Không có lúc nào DB rỗng.
+
+        Returns:
+            số bài đã lưu
+        """
+        staging = self.create_generation()
+        try:
+            added = self.add_articles(articles, generation=staging)
+        except Exception:
+            self.discard_generation(staging)
+            raise
+        if not added:
+            self.discard_generation(staging)
+            print("No articles stored, keeping the current generation")
+            return 0
+        self.promote(staging)
+        print(f"Database replaced with {added} articles ({staging.name})")
+        return added
@@ -0,0 +1,622 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional, Tuple
+import json
+import os
+import shutil
+import threading
+import numpy as np
+from .quantization import VectorQuantizer, create_quantizer
+
+try:
+    import hnswlib
+except ImportError:  # HNSW là tuỳ chọn, không có thì luôn dùng exact search
+    hnswlib = None
+
+DEFAULT_COLLECTION = "dantri_articles"
+
+
+# ABSTRACT
+class VectorStore(ABC):
+    """
+    Interface lưu trữ vector cho ArticleVectorDB
+
+    Mọi kết quả trả về là dict {'id', 'content', 'metadata'} (+ 'distance' với query)
+    để ArticleVectorDB không phụ thuộc vào backend cụ thể.
+    """
+
+    # thư mục chứa dữ liệu của store, các index phụ (BM25, ...) đặt cạnh đây
+    directory: str
+
+    @abstractmethod
+    def add(self, ids: List[str], embeddings: np.ndarray,
+            documents: List[str], metadatas: List[Dict]) -> None:
+        pass
+
+    @abstractmethod
+    def query(self, embedding: np.ndarray, top_k: int = 5) -> List[Dict]:
+        pass
+
+    @abstractmethod
+    def get_by_ids(self, ids: List[str]) -> List[Dict]:
+        pass
+
+    @abstractmethod
+    def get_by_date(self, start_int: int, end_int: int, limit: Optional[int] = None) -> List[Dict]:
+        pass
+
+    @abstractmethod
+    def get_vectors(self, ids: List[str]) -> np.ndarray:
+        """Vector đã normalize (float32) theo đúng thứ tự ids; KeyError nếu có id không tồn tại"""
+        pass
+
+    @abstractmethod
+    def iter_documents(self, batch_size: int = 1000) -> Iterator[Tuple[List[str], List[str]]]:
+        """Duyệt toàn bộ (ids, documents) theo batch"""
+        pass
+
+    @abstractmethod
+    def iter_records(self, batch_size: int = 1000) -> Iterator[Dict]:
+        """
+        Duyệt toàn bộ store kèm embeddings, dùng khi build generation mới
+        mà không phải encode lại
+
+        Yields:
+            dict {'ids', 'embeddings' (np.ndarray), 'documents', 'metadatas'}
+        """
+        pass
+
+    @abstractmethod
+    def count(self) -> int:
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        pass
+
+    @abstractmethod
+    def drop(self) -> None:
+        """Xoá hẳn store khỏi đĩa (dùng khi garbage-collect generation cũ)"""
+        pass
+
+
+class ChromaVectorStore(VectorStore):
+    """Backend mặc định: ChromaDB PersistentClient"""
+
+    def __init__(self, persist_directory: str, collection_name: str = DEFAULT_COLLECTION):
+        import chromadb
+
+        self.name = collection_name
+        # chroma tự quản lý file của nó, thư mục này chỉ chứa index phụ của collection
+        self.directory = os.path.join(persist_directory, "indexes", collection_name)
+        os.makedirs(self.directory, exist_ok=True)
+        self.collection_name = collection_name
+        self.client = chromadb.PersistentClient(path=persist_directory)
+        # a collection: a table in db
+        try:
+            # to get the collection existed in that client (A persistent client instance defined by path folder)
+            self.collection = self.client.get_collection(collection_name)
+            print(" Loaded existing collection")
+        except:
+
+            # nếu chưa có hoặc lỗi thì tạo collection đó
+
+            self.collection = self.client.create_collection(
+                # tên bảng
+                name=collection_name,
+                #
+                metadata={"description": "Dantri news articles"}
+            )
+            print("Created new collection")
+
+    @staticmethod
+    def _rows(results: Dict) -> List[Dict]:
+        return [
+            {'id': results['ids'][i], 'content': results['documents'][i], 'metadata': results['metadatas'][i]}
+            for i in range(len(results['ids']))
+        ]
+
+    def add(self, ids, embeddings, documents, metadatas):
+        self.collection.add(
+            embeddings=np.asarray(embeddings).tolist(),
+            documents=documents,
+            metadatas=metadatas,
+            ids=ids
+        )
+
+    def query(self, embedding, top_k=5):
+        results = self.collection.query(
+            query_embeddings=[np.asarray(embedding).tolist()],
+            n_results=top_k
+        )
+
+        articles = []
+        if results['documents'] and results['documents'][0]:
+            for i in range(len(results['documents'][0])):
+                articles.append({
+                    'id': results['ids'][0][i],
+                    'content': results['documents'][0][i],
+                    'metadata': results['metadatas'][0][i],
+                    'distance': results['distances'][0][i] if 'distances' in results else None
+                })
+        return articles
+
+    def get_by_ids(self, ids):
+        if not ids:
+            return []
+        return self._rows(self.collection.get(ids=ids, include=['documents', 'metadatas']))
+
+    def get_by_date(self, start_int, end_int, limit=None):
+        if start_int == end_int:
+            where = {"date": start_int}
+        else:
+            where = {
+                "$and": [
+                    {"date": {"$gte": start_int}},
+                    {"date": {"$lte": end_int}}
+                ]
+            }
+        return self._rows(self.collection.get(where=where, limit=limit, include=['documents', 'metadatas']))
+
+    def get_vectors(self, ids):
+        if not ids:
+            return np.zeros((0, 0), dtype=np.float32)
+        results = self.collection.get(ids=ids, include=['embeddings'])
+        by_id = dict(zip(results['ids'], results['embeddings']))
+        missing = [doc_id for doc_id in ids if doc_id not in by_id]
+        if missing:
+            raise KeyError(missing[0])
+        vectors = np.asarray([by_id[doc_id] for doc_id in ids], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def iter_documents(self, batch_size=1000):
+        total = self.collection.count()
+        for offset in range(0, total, batch_size):
+            results = self.collection.get(include=['documents'], limit=batch_size, offset=offset)
+            yield results['ids'], results['documents']
+
+    def iter_records(self, batch_size=1000):
+        total = self.collection.count()
+        for offset in range(0, total, batch_size):
+            results = self.collection.get(
+                include=['embeddings', 'documents', 'metadatas'], limit=batch_size, offset=offset
+            )
+            yield {
+                'ids': results['ids'],
+                'embeddings': np.asarray(results['embeddings'], dtype=np.float32),
+                'documents': results['documents'],
+                'metadatas': results['metadatas'],
+            }
+
+    def count(self):
+        return self.collection.count()
+
+    def clear(self):
+        self.client.delete_collection(self.collection_name)
+        self.collection = self.client.create_collection(self.collection_name)
+
+    def drop(self):
+        self.client.delete_collection(self.collection_name)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Backend in-process: ma trận vector đã normalize trên memory-mapped file
+
+    - exact top-k bằng một phép matmul (BLAS) + argpartition, distance = 1 - cosine
+    - float16 để giảm một nửa RAM/disk (tính toán vẫn ở float32)
+    - khi corpus lớn hơn hnsw_threshold và có hnswlib thì dùng HNSW index
+    - compression ('int8', 'pca', 'binary'): chỉ giữ code nén trong RAM để search
+      stage 1, full vectors nằm trên đĩa và chỉ được đọc để chấm lại top ứng viên
+    - documents/metadatas lưu dạng jsonl, append-only
+    """
+
+    # số vector tối thiểu trước khi fit quantizer (trước đó search exact)
+    min_fit_size = 512
+    # fit trên tối đa chừng này vector, và ngừng refit khi corpus đã đủ lớn
+    fit_sample_size = 20000
+    max_refit_size = 200000
+
+    def __init__(self, directory: str, dtype: str = "float32",
+                 hnsw_threshold: Optional[int] = 50000, hnsw_ef: int = 64,
+                 name: str = DEFAULT_COLLECTION, compression: Optional[str] = None,
+                 rerank_factor: int = 10, pca_components: int = 192):
+        """
+        Args:
+            directory: thư mục lưu store
+            dtype: 'float32' hoặc 'float16'
+            hnsw_threshold: số vector tối thiểu để bật HNSW (None = luôn exact)
+            hnsw_ef: tham số ef khi query HNSW (cao hơn = recall cao hơn, chậm hơn)
+            name: tên collection/generation
+            compression: None | 'int8' (4x) | 'pca' (8x với 192 chiều) | 'binary' (32x)
+            rerank_factor: số ứng viên chấm lại bằng full vectors = top_k * rerank_factor
+            pca_components: số chiều giữ lại khi compression='pca'
+        """
+        self.name = name
+        self.directory = directory
+        self.hnsw_threshold = hnsw_threshold
+        self.hnsw_ef = hnsw_ef
+        self.rerank_factor = rerank_factor
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+        self._info_path = os.path.join(directory, "store.json")
+        self._vectors_path = os.path.join(directory, "vectors.bin")
+        self._records_path = os.path.join(directory, "records.jsonl")
+        self._hnsw_path = os.path.join(directory, "hnsw.bin")
+        self._codes_path = os.path.join(directory, "codes.bin")
+        self._quantizer_path = os.path.join(directory, "quantizer.npz")
+
+        info = {}
+        if os.path.exists(self._info_path):
+            with open(self._info_path, encoding='utf-8') as f:
+                info = json.load(f)
+        # dtype của store đã có trên đĩa được ưu tiên
+        self.dtype = np.dtype(info.get('dtype', dtype))
+        self.dim: Optional[int] = info.get('dim')
+        self.compression: Optional[str] = info.get('compression', compression)
+        self._pca_components = pca_components
+        self._fitted_on: int = info.get('fitted_on', 0)
+        self.quantizer: Optional[VectorQuantizer] = self._new_quantizer()
+        if self.quantizer is not None and os.path.exists(self._quantizer_path):
+            with np.load(self._quantizer_path, allow_pickle=False) as state:
+                self.quantizer.load_state(dict(state))
+
+        self._load()
+
+    def _new_quantizer(self) -> Optional[VectorQuantizer]:
+        if not self.compression:
+            return None
+        return create_quantizer(self.compression, pca_components=self._pca_components)
+
+    def _load(self) -> None:
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict] = []
+        self._id_to_idx: Dict[str, int] = {}
+        self._dates = np.zeros(0, dtype=np.int32)
+        self._matrix = None
+        self._hnsw = None
+        self._codes = None
+
+        if os.path.exists(self._records_path):
+            with open(self._records_path, encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # dòng cuối bị ghi dở (crash giữa chừng) -> bỏ qua
+                        break
+                    self._id_to_idx[record['id']] = len(self.ids)
+                    self.ids.append(record['id'])
+                    self.documents.append(record['document'])
+                    self.metadatas.append(record['metadata'])
+
+        self._dates = np.array([m.get('date', 0) for m in self.metadatas], dtype=np.int32)
+        self._open_matrix()
+        self._load_codes()
+        self._maybe_load_hnsw()
+
+    def _open_matrix(self) -> None:
+        n = len(self.ids)
+        if n == 0 or not self.dim:
+            self._matrix = None
+            return
+        self._matrix = np.memmap(self._vectors_path, dtype=self.dtype, mode='r', shape=(n, self.dim))
+
+    def _write_info(self) -> None:
+        tmp_path = f"{self._info_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'dim': self.dim, 'dtype': self.dtype.name, 'count': len(self.ids),
+                'compression': self.compression, 'fitted_on': self._fitted_on
+            }, f)
+        os.replace(tmp_path, self._info_path)
+
+    # ---------------- compression ----------------
+
+    def _load_codes(self) -> None:
+        """Đọc code nén vào RAM; encode bù phần thiếu (VD: crash sau khi ghi vectors)"""
+        if self.quantizer is None or not self.quantizer.is_fitted or self._matrix is None:
+            self._maybe_fit()
+            return
+
+        shape = self.quantizer.code_shape(self.dim)
+        codes = np.zeros((0,) + shape, dtype=self.quantizer.code_dtype)
+        if os.path.exists(self._codes_path):
+            codes = np.fromfile(self._codes_path, dtype=self.quantizer.code_dtype).reshape((-1,) + shape)
+        n = len(self.ids)
+        if len(codes) != n:
+            codes = codes[:n]
+            missing = self._encode_rows(len(codes), n)
+            codes = np.concatenate([codes, missing])
+            self._write_codes(codes)
+        self._codes = codes
+        self._maybe_fit()
+
+    def _encode_rows(self, start: int, end: int) -> np.ndarray:
+        shape = self.quantizer.code_shape(self.dim)
+        codes = np.empty((end - start,) + shape, dtype=self.quantizer.code_dtype)
+        block = 65536
+        for i in range(start, end, block):
+            j = min(i + block, end)
+            codes[i - start:j - start] = self.quantizer.encode(np.asarray(self._matrix[i:j], dtype=np.float32))
+        return codes
+
+    def _write_codes(self, codes: np.ndarray) -> None:
+        tmp_path = f"{self._codes_path}.tmp"
+        codes.tofile(tmp_path)
+        os.replace(tmp_path, self._codes_path)
+
+    def _maybe_fit(self) -> None:
+        """
+        Fit quantizer khi đủ dữ liệu, và fit lại mỗi khi corpus tăng 4 lần
+        (scale int8 / trục PCA học từ vài trăm bài đầu không đại diện cho cả corpus)
+        """
+        q = self.quantizer
+        n = len(self.ids)
+        if q is None or self._matrix is None:
+            return
+
+        if q.trainable:
+            if q.is_fitted and (n < 4 * self._fitted_on or self._fitted_on >= self.max_refit_size):
+                return
+            if not q.is_fitted and n < self.min_fit_size:
+                return
+            sample = np.arange(n)
+            if n > self.fit_sample_size:
+                sample = np.sort(np.random.default_rng(0).choice(n, self.fit_sample_size, replace=False))
+            q.fit(np.asarray(self._matrix[sample], dtype=np.float32))
+            np.savez(self._quantizer_path, **q.state())
+            print(f"Fitted {q.name} quantizer on {len(sample)} vectors")
+        elif self._codes is not None:
+            return
+
+        self._fitted_on = n
+        self._codes = self._encode_rows(0, n)
+        self._write_codes(self._codes)
+        self._write_info()
+
+    @property
+    def index_nbytes(self) -> int:
+        """RAM cần cho search stage 1 (codes nếu có nén, ngược lại là cả ma trận)"""
+        if self._codes is not None:
+            return int(self._codes.nbytes)
+        return len(self.ids) * (self.dim or 0) * self.dtype.itemsize
+
+    # ---------------- hnsw ----------------
+
+    def _use_hnsw(self) -> bool:
+        # có compression thì stage 1 đã là code nén, không dùng HNSW
+        return (hnswlib is not None and self.quantizer is None and self.hnsw_threshold is not None
+                and self.dim is not None and len(self.ids) > 0
+                and len(self.ids) >= self.hnsw_threshold)
+
+    def _maybe_load_hnsw(self) -> None:
+        if not self._use_hnsw():
+            return
+        if os.path.exists(self._hnsw_path):
+            index = hnswlib.Index(space='ip', dim=self.dim)
+            index.load_index(self._hnsw_path, max_elements=len(self.ids))
+            if index.get_current_count() == len(self.ids):
+                self._hnsw = index
+                self._hnsw.set_ef(self.hnsw_ef)
+                return
+        self._build_hnsw()
+
+    def _build_hnsw(self) -> None:
+        n = len(self.ids)
+        index = hnswlib.Index(space='ip', dim=self.dim)
+        index.init_index(max_elements=max(n * 2, 1024), ef_construction=200, M=16)
+        batch_size = 10000
+        for start in range(0, n, batch_size):
+            end = min(start + batch_size, n)
+            index.add_items(np.asarray(self._matrix[start:end], dtype=np.float32), np.arange(start, end))
+        index.set_ef(self.hnsw_ef)
+        index.save_index(self._hnsw_path)
+        self._hnsw = index
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def add(self, ids, embeddings, documents, metadatas):
+        embeddings = self._normalize(np.atleast_2d(embeddings))
+
+        with self._lock:
+            keep = []
+            seen = set()
+            for i, doc_id in enumerate(ids):
+                if doc_id in self._id_to_idx or doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                keep.append(i)
+            if not keep:
+                return
+
+            if self.dim is None:
+                self.dim = embeddings.shape[1]
+            elif embeddings.shape[1] != self.dim:
+                raise ValueError(f"Embedding dim {embeddings.shape[1]} != store dim {self.dim}")
+
+            start = len(self.ids)
+            # nhả memmap cũ trước khi ghi (Windows không cho truncate file đang được map)
+            self._matrix = None
+            # vector ghi trước, records ghi sau: nếu crash giữa chừng thì
+            # records (nguồn sự thật về số lượng) vẫn nhất quán với phần đầu của vectors.bin
+            with open(self._vectors_path, 'r+b' if os.path.exists(self._vectors_path) else 'wb') as f:
+                f.seek(start * self.dim * self.dtype.itemsize)
+                f.write(embeddings[keep].astype(self.dtype).tobytes())
+                f.truncate()
+
+            with open(self._records_path, 'a', encoding='utf-8') as f:
+                for i in keep:
+                    f.write(json.dumps({
+                        'id': ids[i], 'document': documents[i], 'metadata': metadatas[i]
+                    }, ensure_ascii=False) + "\n")
+
+            for i in keep:
+                self._id_to_idx[ids[i]] = len(self.ids)
+                self.ids.append(ids[i])
+                self.documents.append(documents[i])
+                self.metadatas.append(metadatas[i])
+            self._dates = np.concatenate([
+                self._dates,
+                np.array([metadatas[i].get('date', 0) for i in keep], dtype=np.int32)
+            ])
+            self._write_info()
+            self._open_matrix()
+
+            if self._codes is not None:
+                new_codes = self.quantizer.encode(embeddings[keep])
+                with open(self._codes_path, 'ab') as f:
+                    f.write(new_codes.tobytes())
+                self._codes = np.concatenate([self._codes, new_codes])
+            self._maybe_fit()
+
+            if self._hnsw is not None:
+                if len(self.ids) > self._hnsw.get_max_elements():
+                    self._hnsw.resize_index(len(self.ids) * 2)
+                self._hnsw.add_items(embeddings[keep], np.arange(start, len(self.ids)))
+                self._hnsw.save_index(self._hnsw_path)
+            elif self._use_hnsw():
+                self._build_hnsw()
+
+    def _row(self, idx: int) -> Dict:
+        return {'id': self.ids[idx], 'content': self.documents[idx], 'metadata': self.metadatas[idx]}
+
+    def _exact_scores(self, query: np.ndarray) -> np.ndarray:
+        if self.dtype == np.float32:
+            return self._matrix @ query
+        # float16: nhân theo block để BLAS vẫn chạy trên float32 mà không nhân đôi RAM
+        scores = np.empty(len(self.ids), dtype=np.float32)
+        block = 65536
+        for start in range(0, len(self.ids), block):
+            end = min(start + block, len(self.ids))
+            scores[start:end] = self._matrix[start:end].astype(np.float32) @ query
+        return scores
+
+    def query(self, embedding, top_k=5):
+        query = self._normalize(embedding).reshape(-1)
+
+        with self._lock:
+            n = len(self.ids)
+            if n == 0:
+                return []
+            top_k = min(top_k, n)
+
+            if self._hnsw is not None:
+                labels, distances = self._hnsw.knn_query(query, k=top_k)
+                # hnswlib 'ip' trả về 1 - dot, đúng bằng cosine distance vì đã normalize
+                pairs = zip(labels[0].tolist(), distances[0].tolist())
+            elif self._codes is not None:
+                # stage 1: điểm xấp xỉ trên code nén trong RAM
+                approx = self.quantizer.score(self._codes, query)
+                n_candidates = min(n, top_k * self.rerank_factor)
+                if n_candidates < n:
+                    candidates = np.argpartition(-approx, n_candidates - 1)[:n_candidates]
+                else:
+                    candidates = np.arange(n)
+                # stage 2: chấm lại bằng full vectors trên đĩa (đọc theo thứ tự file)
+                candidates.sort()
+                exact = np.asarray(self._matrix[candidates], dtype=np.float32) @ query
+                order = np.argsort(-exact, kind='stable')[:top_k]
+                pairs = ((int(candidates[i]), float(1.0 - exact[i])) for i in order)
+            else:
+                scores = self._exact_scores(query)
+                if top_k < n:
+                    idx = np.argpartition(-scores, top_k - 1)[:top_k]
+                else:
+                    idx = np.arange(n)
+                idx = idx[np.argsort(-scores[idx], kind='stable')]
+                pairs = ((int(i), float(1.0 - scores[i])) for i in idx)
+
+            return [dict(self._row(i), distance=distance) for i, distance in pairs]
+
+    def get_by_ids(self, ids):
+        with self._lock:
+            return [self._row(self._id_to_idx[doc_id]) for doc_id in ids if doc_id in self._id_to_idx]
+
+    def get_by_date(self, start_int, end_int, limit=None):
+        with self._lock:
+            idx = np.flatnonzero((self._dates >= start_int) & (self._dates <= end_int))
+            if limit is not None:
+                idx = idx[:limit]
+            return [self._row(int(i)) for i in idx]
+
+    def get_vectors(self, ids: List[str]) -> np.ndarray:
+        """Lấy vector (đã normalize, float32) theo id"""
+        with self._lock:
+            idx = [self._id_to_idx[doc_id] for doc_id in ids]
+            return np.asarray(self._matrix[idx], dtype=np.float32)
+
+    def iter_documents(self, batch_size=1000):
+        with self._lock:
+            ids, documents = list(self.ids), list(self.documents)
+        for start in range(0, len(ids), batch_size):
+            yield ids[start:start + batch_size], documents[start:start + batch_size]
+
+    def iter_records(self, batch_size=1000):
+        with self._lock:
+            n = len(self.ids)
+        for start in range(0, n, batch_size):
+            end = min(start + batch_size, n)
+            with self._lock:
+                batch = {
+                    'ids': self.ids[start:end],
+                    'embeddings': np.asarray(self._matrix[start:end], dtype=np.float32),
+                    'documents': self.documents[start:end],
+                    'metadatas': self.metadatas[start:end],
+                }
+            yield batch
+
+    def count(self):
+        return len(self.ids)
+
+    def clear(self):
+        with self._lock:
+            self._matrix = None
+            self._hnsw = None
+            self._codes = None
+            for path in (self._vectors_path, self._records_path, self._hnsw_path, self._info_path,
+                         self._codes_path, self._quantizer_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.dim = None
+            self._fitted_on = 0
+            self.quantizer = self._new_quantizer()
+            self._load()
+
+    def drop(self):
+        with self._lock:
+            self._matrix = None
+            self._hnsw = None
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def create_vector_store(backend: str, persist_directory: str,
+                        name: str = DEFAULT_COLLECTION, **kwargs) -> VectorStore:
+    """
+    Factory tạo vector store theo tên backend
+
+    Args:
+        backend: 'chroma' hoặc 'numpy'
+        persist_directory: thư mục gốc của database
+        name: tên collection (mỗi generation là một collection riêng)
+    """
+    if backend == "chroma":
+        if kwargs.get('compression'):
+            raise ValueError("Vector compression is only supported by the 'numpy' backend")
+        kwargs.pop('compression', None)
+        return ChromaVectorStore(persist_directory, collection_name=name, **kwargs)
+    if backend == "numpy":
+        return NumpyVectorStore(os.path.join(persist_directory, "numpy_store", name), name=name, **kwargs)
+    raise ValueError(f"Unknown vector store backend: {backend}")
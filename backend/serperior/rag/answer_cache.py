@@ -0,0 +1,112 @@
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, List, Optional
+import threading
+import time
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Cache câu trả lời RAG theo ngữ nghĩa của câu hỏi
+
+    Một entry khớp khi:
+    - tập article id retrieve được giống hệt (context đổi -> câu trả lời cũ không còn đúng)
+    - cosine(query embedding, embedding đã cache) >= threshold
+      ("giá vàng hôm nay" ~ "giá vàng hôm nay thế nào")
+
+    Có TTL, LRU eviction và đếm hit/miss.
+    """
+
+    def __init__(self, threshold: float = 0.92, ttl_seconds: float = 3600, max_entries: int = 1000):
+        """
+        Args:
+            threshold: cosine tối thiểu để coi hai câu hỏi là một
+            ttl_seconds: thời gian sống của một câu trả lời
+            max_entries: số entry tối đa (LRU)
+        """
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        # tập article id -> các entry key; lookup chỉ so embedding trong cùng bucket
+        self._by_context: Dict[FrozenSet[str], List[int]] = {}
+        self._next_key = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove(self, key: int) -> None:
+        entry = self._entries.pop(key)
+        bucket = self._by_context.get(entry['context'])
+        if bucket is not None:
+            bucket.remove(key)
+            if not bucket:
+                del self._by_context[entry['context']]
+
+    def lookup(self, query_embedding, article_ids: Iterable[str]) -> Optional[Dict]:
+        """
+        Returns:
+            {'answer', 'sources', 'similarity'} nếu hit, None nếu miss
+        """
+        context = frozenset(article_ids)
+        query = self._normalize(query_embedding)
+        now = time.time()
+
+        with self._lock:
+            best_key, best_sim = None, self.threshold
+            for key in list(self._by_context.get(context, ())):
+                entry = self._entries[key]
+                if now - entry['created_at'] > self.ttl_seconds:
+                    self._remove(key)
+                    self._stats["expirations"] += 1
+                    continue
+                sim = float(entry['embedding'] @ query)
+                if sim >= best_sim:
+                    best_key, best_sim = key, sim
+
+            if best_key is None:
+                self._stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(best_key)
+            self._stats["hits"] += 1
+            entry = self._entries[best_key]
+            return {"answer": entry['answer'], "sources": entry['sources'], "similarity": best_sim}
+
+    def put(self, query_embedding, article_ids: Iterable[str], answer: str, sources: List) -> None:
+        context = frozenset(article_ids)
+        with self._lock:
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = {
+                'embedding': self._normalize(query_embedding),
+                'context': context,
+                'answer': answer,
+                'sources': sources,
+                'created_at': time.time(),
+            }
+            self._by_context.setdefault(context, []).append(key)
+
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self._stats["hits"] + self._stats["misses"]
+            return dict(
+                self._stats,
+                size=len(self._entries),
+                hit_rate=self._stats["hits"] / total if total else 0.0
+            )
@@ -0,0 +1,124 @@
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import math
+import re
+
+
+def approx_tokens(text: str) -> int:
+    """
+    Ước lượng số token mà không cần tokenizer của provider.
+    Tiếng Việt có dấu: ~3 ký tự / token với tokenizer của Gemini.
+    """
+    return math.ceil(len(text) / 3)
+
+
+class ContextBuilder:
+    """
+    Đóng gói kết quả retrieve thành context cho LLM trong một token budget
+
+    - sắp theo score (rerank_score, rrf_score, hoặc distance nhỏ nhất nếu không có)
+    - bỏ các đoạn gần trùng (cùng một tin đăng lại ở nhiều ngày) bằng Jaccard trên word shingles
+    - đoạn cuối bị cắt ở ranh giới câu nếu vượt budget
+    - trả về kèm danh sách source có cấu trúc, không phải parse lại chuỗi
+    """
+
+    def __init__(self, max_tokens: int = 2000, dedup_threshold: float = 0.8,
+                 min_passage_tokens: int = 60, shingle_size: int = 3,
+                 token_counter: Callable[[str], int] = approx_tokens):
+        """
+        Args:
+            max_tokens: budget token cho toàn bộ context
+            dedup_threshold: Jaccard tối thiểu để coi hai đoạn là trùng
+            min_passage_tokens: phần budget còn lại nhỏ hơn mức này thì không cắt thêm đoạn nữa
+            shingle_size: số từ mỗi shingle khi so trùng
+            token_counter: hàm đếm token
+        """
+        self.max_tokens = max_tokens
+        self.dedup_threshold = dedup_threshold
+        self.min_passage_tokens = min_passage_tokens
+        self.shingle_size = shingle_size
+        self.token_counter = token_counter
+
+    @staticmethod
+    def _score(doc: Dict) -> float:
+        if doc.get('rerank_score') is not None:
+            return doc['rerank_score']
+        if doc.get('rrf_score') is not None:
+            return doc['rrf_score']
+        if doc.get('distance') is not None:
+            return -doc['distance']
+        return doc.get('bm25_score') or 0.0
+
+    def _shingles(self, text: str) -> Set[Tuple[str, ...]]:
+        words = re.findall(r"\w+", text.lower())
+        n = self.shingle_size
+        if len(words) < n:
+            return {tuple(words)}
+        return {tuple(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+    def _truncate(self, text: str, budget: int) -> str:
+        """Cắt text vừa budget, ưu tiên dừng ở cuối câu"""
+        if self.token_counter(text) <= budget:
+            return text
+        # ước lượng độ dài theo tỉ lệ rồi lùi dần cho tới khi vừa
+        cut = int(len(text) * budget / max(self.token_counter(text), 1))
+        while cut > 0 and self.token_counter(text[:cut]) > budget:
+            cut = int(cut * 0.9)
+        head = text[:cut]
+        end = max(head.rfind(". "), head.rfind(".\n"), head.rfind("! "), head.rfind("? "))
+        if end > len(head) // 2:
+            return head[:end + 1]
+        # không có ranh giới câu hợp lý -> cắt ở khoảng trắng
+        space = head.rfind(" ")
+        return (head[:space] if space > 0 else head) + " ..."
+
+    def build(self, results: List[Dict]) -> Tuple[str, List[Dict]]:
+        """
+        Returns:
+            (context, sources)
+            sources: [{'index', 'id', 'title', 'date', 'url', 'score', 'truncated'}], index khớp "Source {index}" trong context
+        """
+        # đã qua cross-encoder xếp trước, các điểm khác thang đo không so trực tiếp với nhau
+        ranked = sorted(results, key=lambda d: (d.get('rerank_score') is not None, self._score(d)),
+                        reverse=True)
+
+        context_parts: List[str] = []
+        sources: List[Dict] = []
+        kept_shingles: List[Set[Tuple[str, ...]]] = []
+        remaining = self.max_tokens
+
+        for doc in ranked:
+            metadata = doc.get('metadata', {}) or {}
+            title = metadata.get('title', 'Unknown Title')
+            date = metadata.get('date_str', 'Unknown Date')
+            body = doc.get('content', '')  # Content is title + body
+
+            shingles = self._shingles(body)
+            if any(len(shingles & seen) / max(len(shingles | seen), 1) >= self.dedup_threshold
+                   for seen in kept_shingles):
+                continue
+
+            index = len(sources) + 1
+            header = f"Source {index} [{date}]: {title}\n"
+            # "\n\n" giữa các đoạn
+            budget = remaining - self.token_counter(header) - (1 if context_parts else 0)
+            if budget < self.min_passage_tokens and self.token_counter(body) > budget:
+                break
+
+            passage = self._truncate(body, budget)
+            truncated = passage != body
+            context_parts.append(header + passage)
+            kept_shingles.append(shingles)
+            sources.append({
+                'index': index,
+                'id': doc.get('id'),
+                'title': title,
+                'date': date,
+                'url': metadata.get('url', ''),
+                'score': self._score(doc),
+                'truncated': truncated,
+            })
+            remaining = budget - self.token_counter(passage)
+            if truncated:
+                break
+
+        return "\n\n".join(context_parts), sources
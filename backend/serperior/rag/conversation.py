@@ -0,0 +1,165 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import logging
+import threading
+
+from .context_builder import approx_tokens
+from .llm_client import LLMClient, is_error_answer
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """Tóm tắt ngắn gọn (tối đa 120 từ) cuộc hội thoại giữa người dùng và trợ lý tin tức dưới đây.
+Giữ lại các chủ đề, tên riêng, con số, mốc thời gian và câu hỏi còn bỏ ngỏ. Chỉ trả về phần tóm tắt."""
+
+REWRITE_PROMPT = """Viết lại câu hỏi cuối của người dùng thành một câu hỏi độc lập, đầy đủ ý để tìm kiếm tin tức,
+dựa vào ngữ cảnh hội thoại (thay các đại từ như "nó", "họ", "còn ... thì sao" bằng đối tượng cụ thể).
+Chỉ trả về câu hỏi đã viết lại, không giải thích."""
+
+
+class ConversationMemory:
+    """
+    Quản lý lịch sử chat (ChatRequest.history) cho RAG nhiều lượt
+
+    - compress: giữ nguyên các tin nhắn gần nhất, phần cũ hơn gộp thành rolling summary
+      khi lịch sử vượt token budget -> prompt không phình theo số lượt
+    - rewrite_query: viết lại câu hỏi follow-up thành câu độc lập để retrieve
+
+    Server không lưu phiên; summary được cache theo hash của đoạn lịch sử đã tóm tắt,
+    lượt sau chỉ cần tóm tắt tiếp phần mới từ summary cũ.
+    """
+
+    def __init__(self, llm_client: LLMClient, max_history_tokens: int = 1500,
+                 keep_recent_messages: int = 6, rewrite_timeout: float = 5.0,
+                 summary_timeout: float = 10.0, cache_size: int = 512):
+        """
+        Args:
+            llm_client: dùng để tóm tắt và viết lại câu hỏi
+            max_history_tokens: budget cho phần lịch sử đưa vào prompt
+            keep_recent_messages: số tin nhắn gần nhất giữ nguyên văn
+            rewrite_timeout, summary_timeout: deadline cho các lần gọi LLM phụ, giây
+            cache_size: số summary giữ trong cache
+        """
+        self.llm_client = llm_client
+        self.max_history_tokens = max_history_tokens
+        self.keep_recent_messages = keep_recent_messages
+        self.rewrite_timeout = rewrite_timeout
+        self.summary_timeout = summary_timeout
+        self.cache_size = cache_size
+
+        self._lock = threading.Lock()
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+
+    @staticmethod
+    def normalize(history: Optional[List[Dict[str, str]]]) -> List[Dict[str, str]]:
+        """Chỉ giữ tin nhắn user/assistant có nội dung"""
+        messages = []
+        for msg in history or []:
+            role = msg.get('role')
+            content = (msg.get('content') or '').strip()
+            if role in ('user', 'assistant') and content:
+                messages.append({'role': role, 'content': content})
+        return messages
+
+    @staticmethod
+    def _tokens(messages: List[Dict[str, str]]) -> int:
+        return sum(approx_tokens(msg['content']) for msg in messages)
+
+    @staticmethod
+    def _prefix_digests(messages: List[Dict[str, str]]) -> List[str]:
+        """digests[i] = hash của messages[:i + 1]"""
+        h = hashlib.sha1()
+        digests = []
+        for msg in messages:
+            h.update(f"{msg['role']}\x00{msg['content']}\x01".encode('utf-8'))
+            digests.append(h.hexdigest())
+        return digests
+
+    @staticmethod
+    def _transcript(messages: List[Dict[str, str]]) -> str:
+        names = {'user': 'Người dùng', 'assistant': 'Trợ lý'}
+        return "\n".join(f"{names[msg['role']]}: {msg['content']}" for msg in messages)
+
+    async def compress(self, history: List[Dict[str, str]],
+                       timeout: Optional[float] = None) -> Tuple[Optional[str], List[Dict[str, str]]]:
+        """
+        Args:
+            timeout: giới hạn thêm từ deadline của request; <= 0 -> không gọi LLM,
+                chỉ dùng summary đã cache
+        Returns:
+            (summary, recent) - summary là None nếu lịch sử còn vừa budget
+        """
+        messages = self.normalize(history)
+        if self._tokens(messages) <= self.max_history_tokens:
+            return None, messages
+
+        split = max(len(messages) - self.keep_recent_messages, 0)
+        # các tin gần nhất vẫn quá dài -> đẩy bớt vào phần tóm tắt, giữ ít nhất một cặp hỏi/đáp
+        while len(messages) - split > 2 and self._tokens(messages[split:]) > self.max_history_tokens:
+            split += 1
+        older, recent = messages[:split], messages[split:]
+        if not older:
+            return None, recent
+
+        digests = self._prefix_digests(older)
+        base_summary, start = None, 0
+        with self._lock:
+            for i in range(len(digests) - 1, -1, -1):
+                if digests[i] in self._summaries:
+                    self._summaries.move_to_end(digests[i])
+                    base_summary, start = self._summaries[digests[i]], i + 1
+                    break
+        if start == len(older):
+            return base_summary, recent
+        if timeout is not None and timeout <= 0:
+            return base_summary, recent
+
+        prompt = self._transcript(older[start:])
+        if base_summary:
+            prompt = f"Tóm tắt trước đó:\n{base_summary}\n\nHội thoại tiếp theo:\n{prompt}"
+        summary = await self.llm_client.agenerate_answer(
+            [{'role': 'system', 'content': SUMMARY_PROMPT}, {'role': 'user', 'content': prompt}],
+            timeout=min(self.summary_timeout, timeout) if timeout is not None else self.summary_timeout
+        )
+        if is_error_answer(summary) or not summary.strip():
+            logger.warning(f"Conversation summary failed: {summary[:200]!r}")
+            # không có summary mới thì dùng lại summary cũ, bỏ phần giữa
+            return base_summary, recent
+
+        summary = summary.strip()
+        with self._lock:
+            self._summaries[digests[-1]] = summary
+            while len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
+        return summary, recent
+
+    async def rewrite_query(self, query: str, recent: List[Dict[str, str]],
+                            summary: Optional[str] = None, timeout: Optional[float] = None) -> str:
+        """
+        Viết lại câu hỏi follow-up thành câu độc lập để retrieve.
+        Không có lịch sử -> giữ nguyên; LLM lỗi hoặc hết thời gian (timeout <= 0)
+        -> ghép với câu hỏi trước của người dùng.
+        """
+        previous_questions = [msg['content'] for msg in recent if msg['role'] == 'user']
+        if not previous_questions and not summary:
+            return query
+        if timeout is not None and timeout <= 0:
+            return f"{previous_questions[-1]} {query}" if previous_questions else query
+
+        transcript = self._transcript(recent)
+        if summary:
+            transcript = f"Tóm tắt: {summary}\n{transcript}"
+        rewritten = await self.llm_client.agenerate_answer(
+            [{'role': 'system', 'content': REWRITE_PROMPT},
+             {'role': 'user', 'content': f"{transcript}\n\nCâu hỏi cuối: {query}"}],
+            timeout=min(self.rewrite_timeout, timeout) if timeout is not None else self.rewrite_timeout
+        )
+        # kiểm tra lỗi trước khi strip (strip trả về str thường, mất kiểu LLMError)
+        failed = is_error_answer(rewritten)
+        rewritten = rewritten.strip().strip('"')
+        if failed or not rewritten or "\n" in rewritten:
+            logger.warning("Query rewrite failed, falling back to previous question + query")
+            return f"{previous_questions[-1]} {query}" if previous_questions else query
+
+        logger.info(f"Rewrote query: {query!r} -> {rewritten!r}")
+        return rewritten
@@ -0,0 +1,75 @@
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import time
+
+
+class Deadline:
+    """
+    Time budget cho một request, truyền qua các stage của pipeline chat
+
+    - remaining(): thời gian còn lại (giây), các stage dựa vào đó để bỏ qua phần tùy chọn
+    - stage(name): đo thời gian một stage
+    - skip(name, reason): ghi lại stage bị bỏ qua
+    - report(): {'budget_ms', 'elapsed_ms', 'degraded', 'stages': [...]} trả về kèm response
+    """
+
+    def __init__(self, budget_seconds: Optional[float] = None):
+        """
+        Args:
+            budget_seconds: tổng thời gian cho phép; None = không giới hạn
+        """
+        self.budget_seconds = budget_seconds
+        self._start = time.monotonic()
+        self._stages: List[Dict] = []
+        self.degraded = False
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self._start
+
+    def remaining(self) -> float:
+        if self.budget_seconds is None:
+            return float('inf')
+        return max(self.budget_seconds - self.elapsed(), 0.0)
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def allows(self, seconds: float) -> bool:
+        """Còn đủ ít nhất `seconds` giây không"""
+        return self.remaining() >= seconds
+
+    def timeout(self, cap: Optional[float] = None, reserve: float = 0.0) -> Optional[float]:
+        """
+        Timeout cho một lời gọi con: phần budget còn lại trừ đi `reserve` dành cho các stage sau,
+        không vượt quá `cap`. None nếu không giới hạn.
+        """
+        remaining = self.remaining() - reserve
+        if remaining == float('inf'):
+            return cap
+        remaining = max(remaining, 0.0)
+        return min(remaining, cap) if cap is not None else remaining
+
+    @contextmanager
+    def stage(self, name: str, **info):
+        start = time.monotonic()
+        entry = {'name': name, 'status': 'ok', **info}
+        try:
+            yield entry
+        except BaseException:
+            entry['status'] = 'error'
+            raise
+        finally:
+            entry['ms'] = round((time.monotonic() - start) * 1000, 1)
+            self._stages.append(entry)
+
+    def skip(self, name: str, reason: str) -> None:
+        self.degraded = True
+        self._stages.append({'name': name, 'status': 'skipped', 'reason': reason, 'ms': 0.0})
+
+    def report(self) -> Dict:
+        return {
+            'budget_ms': None if self.budget_seconds is None else round(self.budget_seconds * 1000),
+            'elapsed_ms': round(self.elapsed() * 1000, 1),
+            'degraded': self.degraded,
+            'stages': list(self._stages),
+        }
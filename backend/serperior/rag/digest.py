@@ -0,0 +1,297 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from .llm_client import is_error_answer
+
+logger = logging.getLogger(__name__)
+
+FIELD_NAMES = {
+    "kinh-doanh": "Kinh doanh",
+    "thoi-su": "Thời sự",
+    "phap-luat": "Pháp luật",
+    "du-lich": "Du lịch",
+    "bat-dong-san": "Bất động sản",
+}
+
+DIGEST_PROMPT = """Bạn là biên tập viên điểm tin. Dựa trên các bài báo dưới đây, viết bản tin tóm tắt
+trong 3-5 gạch đầu dòng (mỗi dòng một sự kiện chính, có tên riêng và con số nếu có).
+Chỉ dùng thông tin trong bài, không suy diễn."""
+
+# "điểm tin", "có gì mới", "tóm tắt tin"... -> trả digest luôn, không cần gọi LLM
+SUMMARY_PATTERNS = re.compile(
+    r"điểm tin|tóm tắt|tổng hợp|có gì|tin gì|chuyện gì|sự kiện gì|diễn ra|nổi bật|tin tức|điểm qua",
+    re.IGNORECASE
+)
+
+
+def parse_date_scope(query: str, today: Optional[date] = None) -> Optional[Dict]:
+    """
+    Nhận diện câu hỏi gắn với một ngày cụ thể
+
+    Hỗ trợ: "hôm nay", "hôm qua", "hôm kia", "YYYY-MM-DD", "dd/mm", "dd/mm/yyyy"
+    và tên lĩnh vực ("kinh doanh", "kinh-doanh", ...)
+
+    Returns:
+        {'date': 'YYYY-MM-DD', 'field': str | None, 'summary': bool} hoặc None
+    """
+    today = today or datetime.now().date()
+    text = query.lower()
+
+    day = None
+    if "hôm nay" in text:
+        day = today
+    elif "hôm qua" in text:
+        day = today - timedelta(days=1)
+    elif "hôm kia" in text:
+        day = today - timedelta(days=2)
+    else:
+        match = re.search(r"\b(\d{4})-(\d{2})-(\d{2})\b", text)
+        if match:
+            year, month, dom = (int(g) for g in match.groups())
+        else:
+            match = re.search(r"\b(\d{1,2})/(\d{1,2})(?:/(\d{4}))?\b", text)
+            if match:
+                dom, month = int(match.group(1)), int(match.group(2))
+                year = int(match.group(3)) if match.group(3) else today.year
+        if match:
+            try:
+                day = date(year, month, dom)
+            except ValueError:
+                day = None
+    if day is None:
+        return None
+
+    field = None
+    for slug, name in FIELD_NAMES.items():
+        if slug in text or name.lower() in text:
+            field = slug
+            break
+
+    return {'date': day.isoformat(), 'field': field, 'summary': SUMMARY_PATTERNS.search(text) is not None}
+
+
+class DigestStore:
+    """Lưu digest theo (ngày, lĩnh vực) trong SQLite"""
+
+    _COLUMNS = ("date, field, summary, top_stories, entities, keywords, article_count, fingerprint, model, created_at, "
+                "sources_only")
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS digests (
+                    date TEXT NOT NULL,
+                    field TEXT NOT NULL,
+                    summary TEXT,
+                    top_stories TEXT NOT NULL,
+                    entities TEXT NOT NULL,
+                    keywords TEXT NOT NULL,
+                    article_count INTEGER NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    model TEXT,
+                    created_at REAL NOT NULL,
+                    sources_only INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (date, field)
+                )
+            """)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(digests)")}
+            if 'sources_only' not in columns:
+                # digest cũ không có summary là do tóm tắt lỗi -> vẫn được tạo lại
+                self._conn.execute("ALTER TABLE digests ADD COLUMN sources_only INTEGER NOT NULL DEFAULT 0")
+
+    @staticmethod
+    def _row(row) -> Dict:
+        return {
+            'date': row[0],
+            'field': row[1],
+            'field_name': FIELD_NAMES.get(row[1], row[1]),
+            'summary': row[2],
+            'top_stories': json.loads(row[3]),
+            'entities': json.loads(row[4]),
+            'keywords': json.loads(row[5]),
+            'article_count': row[6],
+            'fingerprint': row[7],
+            'model': row[8],
+            'created_at': row[9],
+            'sources_only': bool(row[10]),
+        }
+
+    def get(self, day: str, field: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {self._COLUMNS} FROM digests WHERE date = ? AND field = ?", (day, field)
+            ).fetchone()
+        return self._row(row) if row else None
+
+    def list(self, day: str, field: Optional[str] = None) -> List[Dict]:
+        query = f"SELECT {self._COLUMNS} FROM digests WHERE date = ?"
+        params: Tuple = (day,)
+        if field:
+            query += " AND field = ?"
+            params += (field,)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY field", params).fetchall()
+        return [self._row(row) for row in rows]
+
+    def put(self, digest: Dict) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO digests ({self._COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (digest['date'], digest['field'], digest['summary'],
+                 json.dumps(digest['top_stories'], ensure_ascii=False),
+                 json.dumps(digest['entities'], ensure_ascii=False),
+                 json.dumps(digest['keywords'], ensure_ascii=False),
+                 digest['article_count'], digest['fingerprint'], digest.get('model'), digest['created_at'],
+                 int(digest.get('sources_only', False)))
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class DigestBuilder:
+    """
+    Batch job tạo digest theo ngày / lĩnh vực sau mỗi lần crawl
+
+    Mỗi digest gồm: top stories, thực thể nổi bật (NewsAnalyzer), từ khóa và bản tóm tắt của LLM.
+    Digest chỉ được tạo lại khi tập bài của (ngày, lĩnh vực) thay đổi, hoặc khi chưa có summary
+    do LLM lỗi. Không có llm_client thì digest chỉ gồm nguồn (sources_only) và cũng được giữ nguyên.
+    """
+
+    def __init__(self, vector_db, analyzer, llm_client, store: DigestStore,
+                 top_stories: int = 5, max_articles_in_prompt: int = 12, body_chars: int = 400):
+        """
+        Args:
+            vector_db: ArticleVectorDB, nguồn bài theo ngày
+            analyzer: NewsAnalyzer (từ khóa, thực thể)
+            llm_client: client sinh bản tóm tắt (None -> digest không có summary)
+            top_stories: số bài nổi bật giữ trong digest
+            max_articles_in_prompt, body_chars: giới hạn kích thước prompt tóm tắt
+        """
+        self.vector_db = vector_db
+        self.analyzer = analyzer
+        self.llm_client = llm_client
+        self.store = store
+        self.top_stories = top_stories
+        self.max_articles_in_prompt = max_articles_in_prompt
+        self.body_chars = body_chars
+
+    @staticmethod
+    def _fingerprint(articles: List[Dict]) -> str:
+        ids = sorted(a.get('id') or a.get('url', '') for a in articles)
+        return hashlib.sha1("\n".join(ids).encode('utf-8')).hexdigest()
+
+    def _rank_stories(self, articles: List[Dict], keywords: List[Tuple[str, int]]) -> List[Dict]:
+        """Bài nổi bật = bài chứa nhiều từ khóa chung của cả ngày nhất (ưu tiên trong tiêu đề)"""
+        weights = dict(keywords)
+
+        def score(article):
+            title = article.get('title', '').lower()
+            body = article.get('body', '').lower()
+            return sum(w * (2 if word in title else 1) for word, w in weights.items()
+                       if word in title or word in body)
+
+        return sorted(articles, key=score, reverse=True)
+
+    def _summarize(self, field: str, day: str, stories: List[Dict]) -> Optional[str]:
+        if self.llm_client is None:
+            return None
+        parts = [f"- {a.get('title', '')}: {a.get('body', '')[:self.body_chars]}"
+                 for a in stories[:self.max_articles_in_prompt]]
+        prompt = f"Lĩnh vực: {FIELD_NAMES.get(field, field)}, ngày {day}\n\n" + "\n".join(parts)
+        summary = self.llm_client.generate_answer([
+            {'role': 'system', 'content': DIGEST_PROMPT},
+            {'role': 'user', 'content': prompt},
+        ])
+        if is_error_answer(summary) or not summary.strip():
+            logger.warning(f"Digest summary failed for {day}/{field}: {summary[:200]!r}")
+            return None
+        return summary.strip()
+
+    def build(self, day: str, field: str, force: bool = False) -> Optional[Dict]:
+        """Tạo (hoặc giữ nguyên nếu không đổi) digest của một (ngày, lĩnh vực)"""
+        articles = [a for a in self.vector_db.get_articles_by_date(day, day) if a.get('field') == field]
+        if not articles:
+            return None
+
+        fingerprint = self._fingerprint(articles)
+        existing = self.store.get(day, field)
+        if (not force and existing and existing['fingerprint'] == fingerprint
+                and (existing['summary'] is not None or (existing['sources_only'] and self.llm_client is None))):
+            return existing
+
+        start = time.perf_counter()
+        keywords = self.analyzer.extract_keywords_from_articles(articles, top_n=10)
+        ranked = self._rank_stories(articles, keywords)
+
+        entities = []
+        if getattr(self.analyzer, 'use_phobert', False):
+            entities = self.analyzer.extract_entities_from_articles(ranked)['entities'][:10]
+
+        digest = {
+            'date': day,
+            'field': field,
+            'summary': self._summarize(field, day, ranked),
+            'top_stories': [
+                {'id': a.get('id'), 'title': a.get('title', ''), 'url': a.get('url', ''),
+                 'snippet': a.get('body', '')[:200]}
+                for a in ranked[:self.top_stories]
+            ],
+            'entities': entities,
+            'keywords': [{'word': word, 'count': count} for word, count in keywords],
+            'article_count': len(articles),
+            'fingerprint': fingerprint,
+            'model': getattr(self.llm_client, 'model', None),
+            'created_at': time.time(),
+            # summary NULL vì không có LLM (không phải vì LLM lỗi) -> không cần tạo lại
+            'sources_only': self.llm_client is None,
+        }
+        self.store.put(digest)
+        logger.info(f"Built digest {day}/{field}: {len(articles)} articles in {time.perf_counter() - start:.1f}s")
+        return self.store.get(day, field)
+
+    def build_for_articles(self, articles: List[Dict]) -> int:
+        """Tạo digest cho mọi (ngày, lĩnh vực) có trong danh sách bài vừa crawl"""
+        keys = sorted({(a.get('date'), a.get('field')) for a in articles if a.get('date') and a.get('field')})
+        built = 0
+        for day, field in keys:
+            try:
+                if self.build(day, field) is not None:
+                    built += 1
+            except Exception as e:
+                logger.error(f"Error building digest {day}/{field}: {e}")
+        return built
+
+
+def format_digest(digest: Dict) -> str:
+    """Digest dạng text: làm câu trả lời trực tiếp hoặc làm context cho LLM"""
+    lines = [f"Điểm tin {digest['field_name']} ngày {digest['date']} ({digest['article_count']} bài):"]
+    if digest.get('summary'):
+        lines.append(digest['summary'])
+    else:
+        lines.extend(f"- {story['title']}" for story in digest['top_stories'])
+    if digest.get('entities'):
+        lines.append("Nhân vật / tổ chức nổi bật: " + ", ".join(e['text'] for e in digest['entities'][:5]))
+    return "\n".join(lines)
+
+
+def digest_sources(digest: Dict) -> List[Dict]:
+    """Top stories của digest theo format sources của ContextBuilder"""
+    return [
+        {'index': i + 1, 'id': story.get('id'), 'title': story['title'], 'date': digest['date'],
+         'url': story.get('url', ''), 'score': None, 'truncated': False}
+        for i, story in enumerate(digest['top_stories'])
+    ]
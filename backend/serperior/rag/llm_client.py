@@ -1,63 +1,602 @@
 import os
 import logging
+import asyncio
+import hashlib
+import random
+import threading
+import time
 import requests
+import httpx
 import json
-from typing import List, Dict, Optional, Union
+from collections import OrderedDict
+from typing import AsyncIterator, Iterator, List, Dict, Optional, Tuple, Union
+
+from .context_builder import approx_tokens
 
 logger = logging.getLogger(__name__)
 
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+# server local có API tương thích OpenAI: llama.cpp (llama-server) hoặc Ollama (/v1)
+LOCAL_BASE_URL = "http://127.0.0.1:11434/v1"
+
+LLM_PROVIDERS = ("gemini", "local")
+DEFAULT_MODELS = {
+    "gemini": "gemini-flash-latest",
+    "local": "qwen2.5:3b-instruct",
+}
+
+# status code đáng để retry: rate limit và lỗi phía server
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# status code nghĩa là cached content / prefix không dùng được (không phải lỗi tạm thời)
+CACHE_INVALID_STATUS = {400, 403, 404}
+
+class LLMError(str):
+    """
+    Lỗi của provider: client trả về / yield ra như text (người gọi cũ vẫn hiển thị được)
+    nhưng nhận ra bằng kiểu chứ không bằng nội dung, nên câu trả lời hợp lệ mở đầu bằng
+    "Error:" (VD: trích một thông báo lỗi) không bị coi là lỗi
+    """
+
+
+def is_error_answer(text: str) -> bool:
+    """Text là lỗi của provider (LLMError); câu trả lời rỗng không phải lỗi, người gọi tự xử lý"""
+    return isinstance(text, LLMError)
+
 class LLMClient:
-    def __init__(self, provider: str = "gemini", api_key: str = None):
+    def __init__(self, provider: str = "gemini", api_key: str = None,
+                 model: str = None, base_url: str = None,
+                 timeout: float = 30.0, max_retries: int = 3, max_concurrency: int = 8,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 context_cache: bool = True, cache_ttl_seconds: int = 3600,
+                 min_cache_tokens: int = 1024, cache_after_uses: int = 2, cache_retry_seconds: float = 300.0):
         """
         Initialize LLM Client.
-        provider: 'gemini' or 'ollama' (future)
+        provider: 'gemini' hoặc 'local' (llama.cpp / Ollama qua API tương thích OpenAI)
+        model: tên model của provider (mặc định theo DEFAULT_MODELS)
+        base_url: endpoint của provider (đổi sang server mock khi test)
+        api_key: Gemini bắt buộc; local thì tùy server (gửi dạng Bearer nếu có)
+        timeout: deadline cho cả một lần gọi (tính cả các lần retry), giây
+        max_retries: số lần retry khi gặp 429/5xx hoặc lỗi kết nối
+        max_concurrency: số request đồng thời tối đa tới provider (async path)
+        backoff_base, backoff_max: exponential backoff có jitter giữa các lần retry
+        context_cache: dùng Gemini cachedContents cho phần đầu prompt đánh dấu 'cache': True
+                       (phần tĩnh: system prompt + hướng dẫn trả lời), request sau chỉ gửi phần còn lại
+        cache_ttl_seconds: TTL của cached content phía provider
+        min_cache_tokens: prefix ngắn hơn mức này không cache (ngưỡng tối thiểu của provider,
+                          prefix tĩnh phải tự đủ dài, xem rag_service.ANSWER_GUIDE)
+        cache_after_uses: chỉ tạo cache khi prefix xuất hiện từ lần thứ N (tránh tốn một
+                          round-trip tạo cache cho context chỉ dùng một lần)
+        cache_retry_seconds: tạo cache lỗi tạm thời (429/5xx/lỗi kết nối) -> thử lại sau chừng này giây
         """
         self.provider = provider
-        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
-        
+        self.model = model or DEFAULT_MODELS.get(provider)
+        if provider == "local":
+            self.model = model or os.getenv("SERPERIOR_LOCAL_LLM_MODEL") or DEFAULT_MODELS["local"]
+            self.api_key = api_key or os.getenv("SERPERIOR_LOCAL_LLM_KEY")
+            self.base_url = (base_url or os.getenv("SERPERIOR_LOCAL_LLM_URL") or LOCAL_BASE_URL).rstrip('/')
+            self.label = "Local LLM"
+        else:
+            self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+            self.base_url = (base_url or os.getenv("GEMINI_BASE_URL") or GEMINI_BASE_URL).rstrip('/')
+            self.label = "Gemini"
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.context_cache = context_cache and provider == "gemini"
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.min_cache_tokens = min_cache_tokens
+        self.cache_after_uses = cache_after_uses
+        self.cache_retry_seconds = cache_retry_seconds
+
+        # prefix key -> {'name', 'expires_at'}; đếm số lần gặp prefix;
+        # prefix tạo cache lỗi -> thời điểm được thử lại (inf: không thử lại)
+        self._cache_lock = threading.Lock()
+        self._cached_contents: "OrderedDict[str, Dict]" = OrderedDict()
+        self._prefix_uses: "OrderedDict[str, int]" = OrderedDict()
+        self._cache_failed: "OrderedDict[str, float]" = OrderedDict()
+        self._cache_stats = {"hits": 0, "created": 0, "failed": 0, "invalidated": 0}
+
         # We don't need SDK setup if using REST
+        # connection pool dùng lại TLS connection giữa các request
+        self.session = requests.Session()
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    # ---------------- connection / retry ----------------
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        # tạo lười trong event loop đang chạy
+        if self._async_client is None or self._async_client.is_closed:
+            self._async_client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency)
+            )
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._async_client
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        self.session.close()
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Full jitter: random(0, min(max, base * 2^attempt)); tôn trọng Retry-After nếu có"""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _gemini_url(self, method: str, **params) -> str:
+        query = "&".join(f"{k}={v}" for k, v in params.items())
+        if query:
+            query = f"&{query}"
+        return f"{self.base_url}/models/{self.model}:{method}?key={self.api_key}{query}"
+
+    @staticmethod
+    def _gemini_payload(messages: List[Dict[str, str]]) -> Dict:
+        """
+        Chuyển messages sang format nhiều lượt của Gemini:
+        system -> systemInstruction, user/assistant -> contents với role user/model
+        """
+        system_parts = []
+        contents = []
+        for msg in messages:
+            if msg['role'] == 'system':
+                system_parts.append({"text": msg['content']})
+                continue
+            role = "model" if msg['role'] in ("assistant", "model") else "user"
+            # Gemini yêu cầu hội thoại bắt đầu bằng user (bỏ lời chào của assistant)
+            if not contents and role == "model":
+                continue
+            # các lượt phải xen kẽ user/model -> gộp tin liên tiếp cùng role
+            if contents and contents[-1]['role'] == role:
+                contents[-1]['parts'].append({"text": msg['content']})
+            else:
+                contents.append({"role": role, "parts": [{"text": msg['content']}]})
+
+        payload = {"contents": contents}
+        if system_parts:
+            payload["systemInstruction"] = {"parts": system_parts}
+        return payload
+
+    @staticmethod
+    def _candidate_text(data: Dict) -> str:
+        """Lấy text từ một response (hoặc một chunk stream) của Gemini"""
+        parts = data['candidates'][0]['content'].get('parts', [])
+        return "".join(part.get('text', '') for part in parts)
+
+    # ---------------- provider dispatch ----------------
+
+    def _not_ready(self) -> Optional[str]:
+        """Thông báo lỗi nếu provider chưa dùng được, None nếu sẵn sàng"""
+        if self.provider == "gemini":
+            return None if self.api_key else LLMError("Gemini API Key missing.")
+        if self.provider == "local":
+            return None
+        return LLMError("LLM Provider not configured.")
+
+    def _headers(self, stream: bool = False) -> Dict[str, str]:
+        headers = {'Content-Type': 'application/json'}
+        if stream:
+            headers['Accept'] = 'text/event-stream'
+        if self.provider == "local" and self.api_key:
+            headers['Authorization'] = f"Bearer {self.api_key}"
+        return headers
+
+    def _request(self, messages: List[Dict[str, str]], stream: bool = False,
+                 cached_content: Optional[str] = None):
+        """(url, payload) cho một lần gọi; cached_content: chỉ gửi phần sau prefix đã cache"""
+        if self.provider == "gemini":
+            if cached_content:
+                _, rest = self._split_prefix(messages)
+                payload = self._gemini_payload(rest)
+                payload["cachedContent"] = cached_content
+            else:
+                payload = self._gemini_payload(messages)
+            if stream:
+                return self._gemini_url("streamGenerateContent", alt="sse"), payload
+            return self._gemini_url("generateContent"), payload
+        # OpenAI-compatible chat completions: role system/user/assistant dùng nguyên
+        payload = {
+            "model": self.model,
+            "messages": [{"role": msg['role'], "content": msg['content']} for msg in messages],
+            "stream": stream,
+        }
+        return f"{self.base_url}/chat/completions", payload
+
+    def _response_text(self, data: Dict) -> str:
+        if self.provider == "gemini":
+            return self._candidate_text(data)
+        return data['choices'][0]['message']['content'] or ""
+
+    def _chunk_text(self, data: Dict) -> str:
+        """Text của một event stream (SSE "data: {json}")"""
+        if self.provider == "gemini":
+            return self._candidate_text(data)
+        return data['choices'][0].get('delta', {}).get('content') or ""
+
+    def _format_error(self) -> str:
+        return LLMError(f"Không nhận được phản hồi từ {self.label} (Format Error).")
+
+    # ---------------- context caching (Gemini cachedContents) ----------------
+
+    @staticmethod
+    def _split_prefix(messages: List[Dict[str, str]]):
+        """Tách các message đầu có 'cache': True (phần tĩnh / lặp lại của prompt)"""
+        n = 0
+        while n < len(messages) and messages[n].get('cache'):
+            n += 1
+        return messages[:n], messages[n:]
+
+    def _cache_lookup(self, messages: List[Dict[str, str]]) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Returns:
+            (tên cached content dùng được, key của prefix cần tạo cache) - tối đa một giá trị khác None
+        """
+        prefix, rest = self._split_prefix(messages)
+        if not self.context_cache or not prefix or not rest:
+            return None, None
+        if approx_tokens("".join(msg['content'] for msg in prefix)) < self.min_cache_tokens:
+            return None, None
 
-    def generate_answer(self, messages: List[Dict[str, str]]) -> str:
+        key = hashlib.sha1(
+            json.dumps([self.model, prefix], ensure_ascii=False, sort_keys=True).encode('utf-8')
+        ).hexdigest()
+        with self._cache_lock:
+            entry = self._cached_contents.get(key)
+            # còn ít hơn 1 phút thì coi như hết hạn, tránh dùng cache sắp bị xoá
+            if entry is not None and entry['expires_at'] - time.time() > 60:
+                self._cached_contents.move_to_end(key)
+                self._cache_stats["hits"] += 1
+                return entry['name'], None
+            self._cached_contents.pop(key, None)
+            if self._cache_failed.get(key, 0) > time.time():
+                return None, None
+            self._cache_failed.pop(key, None)
+
+            uses = self._prefix_uses.pop(key, 0) + 1
+            self._prefix_uses[key] = uses
+            while len(self._prefix_uses) > 4096:
+                self._prefix_uses.popitem(last=False)
+        return (None, key) if uses >= self.cache_after_uses else (None, None)
+
+    def _cache_create_request(self, messages: List[Dict[str, str]]):
+        prefix, _ = self._split_prefix(messages)
+        payload = self._gemini_payload(prefix)
+        # prefix chỉ có system prompt -> cached content không có contents
+        if not payload["contents"]:
+            del payload["contents"]
+        payload.update({"model": f"models/{self.model}", "ttl": f"{self.cache_ttl_seconds}s"})
+        return f"{self.base_url}/cachedContents?key={self.api_key}", payload
+
+    def _cache_mark_failed(self, key: str, status_code: int) -> None:
+        """Gọi khi giữ _cache_lock. 400/403/404: prefix không cache được -> không thử lại; còn lại thử lại sau"""
+        if status_code in CACHE_INVALID_STATUS:
+            self._cache_failed[key] = float('inf')
+        else:
+            self._cache_failed[key] = time.time() + self.cache_retry_seconds
+        self._cache_failed.move_to_end(key)
+        while len(self._cache_failed) > 4096:
+            self._cache_failed.popitem(last=False)
+
+    def _cache_store(self, key: str, status_code: int, data: Optional[Dict]) -> Optional[str]:
+        with self._cache_lock:
+            if status_code != 200 or not data or 'name' not in data:
+                # vd. prefix dưới ngưỡng token tối thiểu của model (400) -> không thử lại prefix này;
+                # rate limit / lỗi server / lỗi kết nối (status 0) chỉ tạm hoãn
+                self._cache_stats["failed"] += 1
+                self._cache_mark_failed(key, status_code if status_code != 200 else 400)
+                return None
+            self._cache_stats["created"] += 1
+            self._cached_contents[key] = {'name': data['name'],
+                                          'expires_at': time.time() + self.cache_ttl_seconds}
+            while len(self._cached_contents) > 1024:
+                self._cached_contents.popitem(last=False)
+            return data['name']
+
+    def _cache_invalidate(self, name: Optional[str], status_code: int) -> bool:
+        """
+        Request dùng cached content trả về status_code != 200.
+
+        Returns:
+            True nếu cached content bị provider từ chối (400/403/404: hết hạn / bị xoá / không hợp lệ),
+            đã bỏ khỏi bảng và người gọi nên gửi lại đủ prompt. 429/5xx không liên quan tới cache:
+            giữ nguyên entry, không gửi lại (gửi lại đủ prompt chỉ làm rate limit nặng hơn).
+        """
+        if not name or status_code not in CACHE_INVALID_STATUS:
+            return False
+        with self._cache_lock:
+            for key, entry in list(self._cached_contents.items()):
+                if entry['name'] == name:
+                    del self._cached_contents[key]
+                    self._cache_mark_failed(key, status_code)
+            self._cache_stats["invalidated"] += 1
+        logger.warning(f"Cached content {name} rejected ({status_code}), falling back to full prompt")
+        return True
+
+    def _cached_content(self, messages: List[Dict[str, str]], timeout: Optional[float] = None) -> Optional[str]:
+        name, key = self._cache_lookup(messages)
+        if key is None:
+            return name
+        url, payload = self._cache_create_request(messages)
+        try:
+            response = self.session.post(url, headers=self._headers(), json=payload,
+                                         timeout=timeout or self.timeout)
+            data = response.json() if response.status_code == 200 else None
+            if data is None:
+                logger.warning(f"Context cache creation failed: {response.status_code} - {response.text[:200]}")
+            return self._cache_store(key, response.status_code, data)
+        except Exception as e:
+            logger.warning(f"Context cache creation failed: {e}")
+            return self._cache_store(key, 0, None)
+
+    async def _acached_content(self, messages: List[Dict[str, str]],
+                               timeout: Optional[float] = None) -> Optional[str]:
+        name, key = self._cache_lookup(messages)
+        if key is None:
+            return name
+        url, payload = self._cache_create_request(messages)
+        try:
+            client = self._get_async_client()
+            async with self._semaphore:
+                response = await client.post(url, json=payload, headers=self._headers(),
+                                             timeout=timeout or self.timeout)
+            data = response.json() if response.status_code == 200 else None
+            if data is None:
+                logger.warning(f"Context cache creation failed: {response.status_code} - {response.text[:200]}")
+            return self._cache_store(key, response.status_code, data)
+        except Exception as e:
+            logger.warning(f"Context cache creation failed: {e}")
+            return self._cache_store(key, 0, None)
+
+    def context_cache_stats(self) -> Dict:
+        with self._cache_lock:
+            return dict(self._cache_stats, active=len(self._cached_contents))
+
+    @staticmethod
+    def _remaining(deadline: float) -> float:
+        """Số giây còn lại tới deadline (time.monotonic), hết thì TimeoutError"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("LLM request deadline exceeded")
+        return remaining
+
+    def _post(self, url: str, payload: Dict, timeout: Optional[float] = None) -> requests.Response:
+        """POST có deadline tổng + retry jitter trên 429/5xx/lỗi kết nối"""
+        headers = self._headers()
+        deadline = time.monotonic() + (timeout or self.timeout)
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("LLM request deadline exceeded")
+            try:
+                response = self.session.post(url, headers=headers, json=payload, timeout=remaining)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"{self.label} request failed ({e}), retrying...")
+                time.sleep(min(self._backoff(attempt), max(deadline - time.monotonic(), 0)))
+                continue
+            if response.status_code in RETRY_STATUS and attempt < self.max_retries:
+                logger.warning(f"{self.label} returned {response.status_code}, retrying...")
+                time.sleep(min(self._backoff(attempt, response.headers.get('Retry-After')),
+                               max(deadline - time.monotonic(), 0)))
+                continue
+            return response
+
+    def generate_answer(self, messages: List[Dict[str, str]], timeout: Optional[float] = None) -> str:
         """
         Generate answer from messages.
         messages format: [{'role': 'system', 'content': ...}, {'role': 'user', 'content': ...}]
+        timeout: deadline của lần gọi này (mặc định self.timeout)
+        Lỗi được trả về dạng LLMError (xem is_error_answer).
         """
-        if self.provider == "gemini":
-            if not self.api_key:
-                return "Gemini API Key missing."
+        not_ready = self._not_ready()
+        if not_ready:
+            return not_ready
+
+        # một deadline cho cả lần gọi: tạo cache, request và lần gửi lại đủ prompt
+        deadline = time.monotonic() + (timeout or self.timeout)
+        try:
+            cached = self._cached_content(messages, timeout=self._remaining(deadline))
+            response = self._post(*self._request(messages, cached_content=cached),
+                                  timeout=self._remaining(deadline))
+            if response.status_code != 200 and self._cache_invalidate(cached, response.status_code):
+                response = self._post(*self._request(messages), timeout=self._remaining(deadline))
+
+            if response.status_code == 200:
+                data = response.json()
+                try:
+                    return self._response_text(data)
+                except (KeyError, IndexError):
+                    return self._format_error()
+            else:
+                logger.error(f"{self.label} API Error: {response.text}")
+                return LLMError(f"{self.label} API Error: {response.status_code} - {response.text}")
 
+        except TimeoutError:
+            return LLMError("Error: LLM request timed out.")
+        except Exception as e:
+            logger.error(f"{self.label} generation error: {e}")
+            return LLMError(f"Error: {str(e)}")
+
+    def stream_answer(self, messages: List[Dict[str, str]], timeout: Optional[float] = None) -> Iterator[str]:
+        """
+        Stream câu trả lời theo từng đoạn text ngay khi provider trả về
+        (Gemini streamGenerateContent với alt=sse, local: chat/completions stream=true).
+
+        Lỗi được yield ra như một đoạn LLMError (đoạn cuối), giống generate_answer.
+        """
+        not_ready = self._not_ready()
+        if not_ready:
+            yield not_ready
+            return
+
+        deadline = time.monotonic() + (timeout or self.timeout)
+        try:
+            cached = self._cached_content(messages, timeout=self._remaining(deadline))
+            while True:
+                url, payload = self._request(messages, stream=True, cached_content=cached)
+                with self.session.post(url, headers=self._headers(stream=True), json=payload,
+                                       stream=True, timeout=self._remaining(deadline)) as response:
+                    if response.status_code != 200 and self._cache_invalidate(cached, response.status_code):
+                        cached = None
+                        continue
+                    if response.status_code != 200:
+                        logger.error(f"{self.label} API Error: {response.text}")
+                        yield LLMError(f"{self.label} API Error: {response.status_code} - {response.text}")
+                        return
+
+                    # text/event-stream không khai báo charset -> requests mặc định latin-1
+                    response.encoding = 'utf-8'
+                    # chunk_size=None: nhận chunk ngay khi tới, không chờ đầy buffer
+                    # mỗi event SSE: "data: {json}\n\n"
+                    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                        if not line or not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if not data or data == "[DONE]":
+                            continue
+                        try:
+                            text = self._chunk_text(json.loads(data))
+                        except (KeyError, IndexError, ValueError):
+                            continue
+                        if text:
+                            yield text
+                    return
+
+        except TimeoutError:
+            yield LLMError("Error: LLM request timed out.")
+        except Exception as e:
+            logger.error(f"{self.label} streaming error: {e}")
+            yield LLMError(f"Error: {str(e)}")
+
+    # ---------------- async path (dùng trong FastAPI, không block event loop) ----------------
+
+    async def _apost(self, url: str, payload: Dict, timeout: Optional[float] = None) -> httpx.Response:
+        """POST có deadline tổng + retry jitter trên 429/5xx/lỗi kết nối"""
+        client = self._get_async_client()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or self.timeout)
+
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError("LLM request deadline exceeded")
             try:
-                # Construct flow
-                # Combine system and user for simplicity as Gemini chat structure is specific
-                prompt_text = ""
-                for msg in messages:
-                   prompt_text += f"{msg['role'].title()}: {msg['content']}\n\n"
-
-                # Use verified available model alias
-                url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-flash-latest:generateContent?key={self.api_key}"
-                
-                payload = {
-                    "contents": [{
-                        "parts": [{"text": prompt_text}]
-                    }]
-                }
-                
-                headers = {'Content-Type': 'application/json'}
-                
-                response = requests.post(url, headers=headers, json=payload)
-                
-                if response.status_code == 200:
-                    data = response.json()
+                async with self._semaphore:
+                    response = await client.post(url, json=payload, headers=self._headers(), timeout=remaining)
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"{self.label} request failed ({e}), retrying...")
+                await asyncio.sleep(min(self._backoff(attempt), max(deadline - loop.time(), 0)))
+                continue
+
+            if response.status_code in RETRY_STATUS and attempt < self.max_retries:
+                logger.warning(f"{self.label} returned {response.status_code}, retrying...")
+                await asyncio.sleep(min(self._backoff(attempt, response.headers.get('Retry-After')),
+                                        max(deadline - loop.time(), 0)))
+                continue
+            return response
+
+    async def agenerate_answer(self, messages: List[Dict[str, str]], timeout: Optional[float] = None) -> str:
+        """Bản async của generate_answer: connection pool chung, deadline, retry, giới hạn đồng thời"""
+        not_ready = self._not_ready()
+        if not_ready:
+            return not_ready
+
+        deadline = time.monotonic() + (timeout or self.timeout)
+        try:
+            cached = await self._acached_content(messages, timeout=self._remaining(deadline))
+            url, payload = self._request(messages, cached_content=cached)
+            response = await self._apost(url, payload, timeout=self._remaining(deadline))
+            if response.status_code != 200 and self._cache_invalidate(cached, response.status_code):
+                url, payload = self._request(messages)
+                response = await self._apost(url, payload, timeout=self._remaining(deadline))
+            if response.status_code == 200:
+                try:
+                    return self._response_text(response.json())
+                except (KeyError, IndexError, ValueError):
+                    return self._format_error()
+            logger.error(f"{self.label} API Error: {response.text}")
+            return LLMError(f"{self.label} API Error: {response.status_code} - {response.text}")
+        except (asyncio.TimeoutError, TimeoutError):
+            return LLMError("Error: LLM request timed out.")
+        except Exception as e:
+            logger.error(f"{self.label} generation error: {e}")
+            return LLMError(f"Error: {str(e)}")
+
+    async def astream_answer(self, messages: List[Dict[str, str]],
+                             timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Bản async của stream_answer (lỗi: đoạn LLMError cuối cùng).
+        Chỉ retry trước khi nhận được byte đầu tiên; đã stream rồi thì không phát lại.
+        """
+        not_ready = self._not_ready()
+        if not_ready:
+            yield not_ready
+            return
+
+        client = self._get_async_client()
+        headers = self._headers(stream=True)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or self.timeout)
+
+        try:
+            # tạo cache (nếu cần) trước khi giữ semaphore cho stream
+            cached = await self._acached_content(messages, timeout=max(deadline - loop.time(), 0.001))
+            url, payload = self._request(messages, stream=True, cached_content=cached)
+            async with self._semaphore:
+                for attempt in range(self.max_retries + 1):
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        yield LLMError("Error: LLM request timed out.")
+                        return
                     try:
-                        return data['candidates'][0]['content']['parts'][0]['text']
-                    except (KeyError, IndexError):
-                        return "Không nhận được phản hồi từ Gemini (Format Error)."
-                else:
-                    logger.error(f"Gemini API Error: {response.text}")
-                    return f"Gemini API Error: {response.status_code} - {response.text}"
-                
-            except Exception as e:
-                logger.error(f"Gemini generation error: {e}")
-                return f"Error: {str(e)}"
-        
-        return "LLM Provider not configured."
+                        async with client.stream("POST", url, json=payload, headers=headers,
+                                                 timeout=remaining) as response:
+                            if response.status_code in RETRY_STATUS and attempt < self.max_retries:
+                                delay = self._backoff(attempt, response.headers.get('Retry-After'))
+                                logger.warning(f"{self.label} returned {response.status_code}, retrying...")
+                            elif (response.status_code != 200 and attempt < self.max_retries
+                                  and self._cache_invalidate(cached, response.status_code)):
+                                # cached content hết hạn phía provider -> gửi lại đủ prompt
+                                cached = None
+                                url, payload = self._request(messages, stream=True)
+                                delay = 0
+                            elif response.status_code != 200:
+                                body = (await response.aread()).decode('utf-8', errors='ignore')
+                                logger.error(f"{self.label} API Error: {body}")
+                                yield LLMError(f"{self.label} API Error: {response.status_code} - {body}")
+                                return
+                            else:
+                                async for line in response.aiter_lines():
+                                    if not line.startswith("data:"):
+                                        continue
+                                    data = line[len("data:"):].strip()
+                                    if not data or data == "[DONE]":
+                                        continue
+                                    try:
+                                        text = self._chunk_text(json.loads(data))
+                                    except (KeyError, IndexError, ValueError):
+                                        continue
+                                    if text:
+                                        yield text
+                                return
+                    except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                        if attempt == self.max_retries:
+                            raise
+                        delay = self._backoff(attempt)
+                        logger.warning(f"{self.label} request failed ({e}), retrying...")
+                    await asyncio.sleep(min(delay, max(deadline - loop.time(), 0)))
+        except Exception as e:
+            logger.error(f"{self.label} streaming error: {e}")
+            yield LLMError(f"Error: {str(e)}")
@@ -0,0 +1,223 @@
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+import asyncio
+import logging
+import os
+import re
+import time
+
+from .llm_client import LLMClient, is_error_answer
+
+logger = logging.getLogger(__name__)
+
+# câu hỏi cần tổng hợp / suy luận -> model lớn; hỏi đáp ngắn -> model local
+COMPLEX_PATTERNS = re.compile(
+    r"so sánh|phân tích|tại sao|vì sao|đánh giá|dự báo|dự đoán|xu hướng|ảnh hưởng|tác động|tổng hợp|giải thích",
+    re.IGNORECASE
+)
+
+
+class MockLLMClient:
+    """
+    Provider giả, không cần mạng: trả lời xác định từ prompt.
+    Dùng cho test toàn bộ pipeline chat offline; cùng interface với LLMClient.
+    """
+
+    provider = "mock"
+    model = "mock"
+
+    def __init__(self, answer: Optional[str] = None, delay: float = 0.0, chunk_size: int = 16):
+        """
+        Args:
+            answer: câu trả lời cố định (LLMError để giả lập provider lỗi);
+                    None -> nhắc lại câu hỏi và số nguồn trong context
+            delay: độ trễ giả lập mỗi chunk (giây)
+            chunk_size: số ký tự mỗi chunk khi stream
+        """
+        self.answer = answer
+        self.delay = delay
+        self.chunk_size = chunk_size
+        self.calls: List[List[Dict[str, str]]] = []
+        self.timeouts: List[Optional[float]] = []
+
+    def _answer(self, messages: List[Dict[str, str]]) -> str:
+        self.calls.append(messages)
+        if self.answer is not None:
+            return self.answer
+        last = messages[-1]['content'] if messages else ""
+        match = re.search(r"Câu hỏi:\s*(.+)", last)
+        question = match.group(1).strip() if match else last.strip()
+        prompt = "\n".join(msg['content'] for msg in messages)
+        n_sources = len(re.findall(r"^\s*Source \d+", prompt, re.MULTILINE))
+        return f"[mock] {question} ({n_sources} nguồn)"
+
+    def _chunks(self, text: str) -> List[str]:
+        if is_error_answer(text):
+            # lỗi là một đoạn LLMError duy nhất, như LLMClient
+            return [text]
+        return [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+
+    def generate_answer(self, messages: List[Dict[str, str]], timeout: Optional[float] = None) -> str:
+        return self._answer(messages)
+
+    def stream_answer(self, messages: List[Dict[str, str]], timeout: Optional[float] = None) -> Iterator[str]:
+        yield from self._chunks(self._answer(messages))
+
+    async def agenerate_answer(self, messages: List[Dict[str, str]], timeout: Optional[float] = None) -> str:
+        self.timeouts.append(timeout)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self._answer(messages)
+
+    async def astream_answer(self, messages: List[Dict[str, str]],
+                             timeout: Optional[float] = None) -> AsyncIterator[str]:
+        self.timeouts.append(timeout)
+        for chunk in self._chunks(self._answer(messages)):
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            yield chunk
+
+    async def aclose(self) -> None:
+        pass
+
+
+class LLMRouter:
+    """
+    Chọn provider theo độ phức tạp của câu hỏi
+
+    - câu hỏi ngắn, tra cứu sự kiện -> local (không tốn round-trip mạng)
+    - so sánh / phân tích / câu dài -> remote
+    - tác vụ phụ (viết lại câu hỏi, tóm tắt hội thoại) -> local
+    Provider được chọn lỗi (LLMError, không tính câu trả lời rỗng) thì thử provider còn lại
+    trong phần thời gian còn lại của cùng deadline.
+    """
+
+    provider = "router"
+
+    def __init__(self, remote, local, max_simple_words: int = 20):
+        """
+        Args:
+            remote, local: LLMClient (hoặc cùng interface)
+            max_simple_words: câu hỏi dài hơn số từ này coi là phức tạp
+        """
+        self.remote = remote
+        self.local = local
+        self.max_simple_words = max_simple_words
+
+    def is_complex(self, query: str) -> bool:
+        return (len(query.split()) > self.max_simple_words
+                or query.count("?") > 1
+                or COMPLEX_PATTERNS.search(query) is not None)
+
+    def select(self, query: Optional[str] = None):
+        """Client cho một câu hỏi; query=None là tác vụ phụ"""
+        if query is not None and self.is_complex(query):
+            return self.remote
+        return self.local
+
+    def _fallback(self, client):
+        return self.local if client is self.remote else self.remote
+
+    @staticmethod
+    def _remaining(client, timeout: Optional[float], started: float) -> Optional[float]:
+        """Phần còn lại của deadline cho provider dự phòng (không cấp thêm một timeout đầy đủ)"""
+        budget = timeout if timeout is not None else getattr(client, 'timeout', None)
+        if budget is None:
+            return None
+        return budget - (time.monotonic() - started)
+
+    def _fallback_timeout(self, client, error: str, timeout: Optional[float], started: float):
+        """(có fallback không, timeout cho fallback)"""
+        remaining = self._remaining(client, timeout, started)
+        if remaining is not None and remaining <= 0:
+            logger.warning(f"{client.provider} failed ({error[:100]}), no time left to fall back")
+            return False, None
+        logger.warning(f"{client.provider} failed ({error[:100]}), falling back")
+        return True, remaining
+
+    def generate_answer(self, messages: List[Dict[str, str]], timeout: Optional[float] = None,
+                        query: Optional[str] = None) -> str:
+        client = self.select(query)
+        started = time.monotonic()
+        answer = client.generate_answer(messages, timeout=timeout)
+        if is_error_answer(answer):
+            retry, remaining = self._fallback_timeout(client, answer, timeout, started)
+            if retry:
+                answer = self._fallback(client).generate_answer(messages, timeout=remaining)
+        return answer
+
+    async def agenerate_answer(self, messages: List[Dict[str, str]], timeout: Optional[float] = None,
+                               query: Optional[str] = None) -> str:
+        client = self.select(query)
+        started = time.monotonic()
+        answer = await client.agenerate_answer(messages, timeout=timeout)
+        if is_error_answer(answer):
+            retry, remaining = self._fallback_timeout(client, answer, timeout, started)
+            if retry:
+                answer = await self._fallback(client).agenerate_answer(messages, timeout=remaining)
+        return answer
+
+    def stream_answer(self, messages: List[Dict[str, str]], timeout: Optional[float] = None,
+                      query: Optional[str] = None) -> Iterator[str]:
+        client = self.select(query)
+        started = time.monotonic()
+        stream = client.stream_answer(messages, timeout=timeout)
+        first = next(stream, None)
+        if first is None:
+            return
+        # chỉ đổi provider khi lỗi ngay từ đầu, đã stream rồi thì không phát lại
+        if is_error_answer(first):
+            retry, remaining = self._fallback_timeout(client, first, timeout, started)
+            if retry:
+                yield from self._fallback(client).stream_answer(messages, timeout=remaining)
+            else:
+                yield first
+            return
+        yield first
+        yield from stream
+
+    async def astream_answer(self, messages: List[Dict[str, str]], timeout: Optional[float] = None,
+                             query: Optional[str] = None) -> AsyncIterator[str]:
+        client = self.select(query)
+        started = time.monotonic()
+        stream = client.astream_answer(messages, timeout=timeout)
+        first = None
+        async for first in stream:
+            break
+        if first is None:
+            return
+        if is_error_answer(first):
+            await stream.aclose()
+            retry, remaining = self._fallback_timeout(client, first, timeout, started)
+            if retry:
+                async for text in self._fallback(client).astream_answer(messages, timeout=remaining):
+                    yield text
+            else:
+                yield first
+            return
+        yield first
+        async for text in stream:
+            yield text
+
+    async def aclose(self) -> None:
+        await self.remote.aclose()
+        await self.local.aclose()
+
+
+def create_llm_client(provider: Optional[str] = None, **kwargs):
+    """
+    provider (mặc định env SERPERIOR_LLM_PROVIDER, "gemini"):
+    - gemini / local: LLMClient
+    - mock: MockLLMClient (offline)
+    - auto: LLMRouter giữa gemini và local
+    """
+    provider = (provider or os.getenv("SERPERIOR_LLM_PROVIDER", "gemini")).lower()
+    if provider == "mock":
+        return MockLLMClient()
+    if provider in ("gemini", "local"):
+        return LLMClient(provider=provider, **kwargs)
+    if provider == "auto":
+        return LLMRouter(
+            remote=LLMClient(provider="gemini", **kwargs),
+            local=LLMClient(provider="local")
+        )
+    raise ValueError(f"Unknown LLM provider: {provider}")
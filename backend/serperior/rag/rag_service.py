@@ -1,60 +1,210 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import logging
+import numpy as np
 from ..api.vector_db import ArticleVectorDB
+from ..api.entity_index import EntityIndex
+from .context_builder import ContextBuilder
+from .reranker import CrossEncoderReranker
+from .deadline import Deadline
 
 logger = logging.getLogger(__name__)
 
+SYSTEM_PROMPT = """Bạn là một trợ lý AI thông minh, chuyên trả lời câu hỏi dựa trên tin tức được cung cấp.
+Hãy trả lời câu hỏi của người dùng một cách chính xác, khách quan, và chỉ sử dụng thông tin từ các bài báo được cung cấp.
+Nếu thông tin không có trong bài báo, hãy nói rằng bạn không biết."""
+
+# Hướng dẫn trả lời cố định, gộp với SYSTEM_PROMPT thành prefix tĩnh của mọi prompt.
+# Gemini chỉ tạo cachedContents cho prefix từ ~1024 token trở lên (xem LLMClient.min_cache_tokens),
+# system prompt một mình (~100 token) không bao giờ đủ -> giữ phần này đủ dài để prefix được cache.
+ANSWER_GUIDE = """HƯỚNG DẪN TRẢ LỜI
+
+1. Nguồn thông tin
+- Context gồm các đoạn "Source N [ngày]: tiêu đề" theo sau là nội dung bài báo. Chỉ dùng thông tin trong các đoạn này, không dùng kiến thức bên ngoài để bổ sung số liệu, tên người, tên tổ chức hay sự kiện.
+- Khi nêu một thông tin cụ thể (số liệu, phát biểu, quyết định, sự kiện), ghi nguồn ở cuối câu theo dạng [Source N]. Một câu dùng nhiều nguồn thì ghi [Source 1, Source 3].
+- Không bịa ra số thứ tự nguồn không có trong context. Không trích dẫn đường link hay tên báo nếu context không ghi.
+- Nếu context chỉ trả lời được một phần câu hỏi, trả lời phần đó và nói rõ phần nào không có thông tin.
+- Nếu không có đoạn nào liên quan, trả lời: "Tôi không tìm thấy thông tin về vấn đề này trong các bài báo hiện có." và không đoán.
+
+2. Thời gian
+- Mỗi nguồn có ngày đăng trong ngoặc vuông. Khi câu hỏi nói "hôm nay", "gần đây", "mới nhất", ưu tiên nguồn có ngày đăng muộn nhất và nêu rõ ngày của thông tin.
+- Các nguồn khác ngày có thể mâu thuẫn do tình hình thay đổi (giá cả, tỷ giá, lãi suất, số người bị ảnh hưởng...). Khi đó nêu cả hai mốc thời gian thay vì chọn một con số, ví dụ: "ngày 15/12 là X, đến ngày 16/12 là Y".
+- Không tự suy ra ngày tháng không có trong bài. Không đổi "hôm qua", "tuần trước" trong bài thành ngày cụ thể nếu không chắc chắn.
+
+3. Số liệu
+- Giữ nguyên số liệu và đơn vị như trong bài (triệu đồng/lượng, %, tỷ USD, nghìn tấn...). Không làm tròn, không quy đổi đơn vị nếu người dùng không yêu cầu.
+- Chỉ tính toán (chênh lệch, tỷ lệ tăng giảm) khi đủ dữ liệu trong context, và ghi rõ đó là phép tính từ số liệu của nguồn nào.
+- Phân biệt số liệu thực tế với dự báo, kế hoạch, mục tiêu hay ý kiến của chuyên gia.
+
+4. Khách quan
+- Trình bày trung lập, không thêm nhận định cá nhân, không khuyến nghị đầu tư, mua bán hay lựa chọn chính trị.
+- Với ý kiến, phát biểu: ghi rõ ai nói ("theo ông A, ...", "đại diện Bộ B cho biết ..."), không biến ý kiến thành sự thật.
+- Khi các nguồn đưa ra quan điểm khác nhau, nêu đủ các quan điểm cùng nguồn của từng quan điểm.
+
+5. Hình thức
+- Trả lời bằng tiếng Việt, trừ khi người dùng hỏi bằng ngôn ngữ khác thì trả lời bằng ngôn ngữ đó.
+- Câu đầu tiên trả lời thẳng vào câu hỏi; chi tiết và bối cảnh đi sau.
+- Câu hỏi đơn giản: 2-4 câu. Câu hỏi tổng hợp (diễn biến, so sánh, tóm tắt nhiều sự kiện): dùng gạch đầu dòng, mỗi ý một dòng, sắp theo thời gian hoặc theo mức độ quan trọng.
+- Không lặp lại câu hỏi, không mở đầu bằng "Dựa trên các bài báo được cung cấp", không kết thúc bằng lời mời hỏi thêm.
+- Không dùng bảng, tiêu đề markdown hay khối code; chỉ dùng đoạn văn và gạch đầu dòng.
+
+6. Hội thoại
+- Nếu có tóm tắt cuộc hội thoại trước đó hoặc các lượt hỏi đáp trước, dùng chúng để hiểu các từ như "nó", "vụ đó", "công ty này", "còn ... thì sao".
+- Thông tin để trả lời vẫn phải lấy từ context của lượt hiện tại; không nhắc lại số liệu của lượt trước nếu context hiện tại không còn nguồn cho số liệu đó.
+- Nếu người dùng chỉ ra câu trả lời trước sai, kiểm tra lại context và sửa lại, ghi rõ nguồn.
+
+7. Ví dụ
+Context: "Source 1 [2024-12-15]: Giá vàng SJC lập đỉnh mới ... giá bán ra 86,5 triệu đồng/lượng ..." và "Source 2 [2024-12-16]: Giá vàng quay đầu giảm ... giá bán ra còn 85,9 triệu đồng/lượng ..."
+Câu hỏi: "Giá vàng hôm nay thế nào?"
+Trả lời tốt: "Ngày 16/12, giá vàng SJC giảm, bán ra ở mức 85,9 triệu đồng/lượng [Source 2]. Trước đó, ngày 15/12, giá bán ra đạt đỉnh 86,5 triệu đồng/lượng [Source 1]."
+Trả lời không tốt: "Giá vàng hôm nay khoảng 86 triệu đồng/lượng và có thể sẽ tiếp tục tăng." (làm tròn số liệu, gộp hai ngày, thêm dự đoán không có trong bài, không ghi nguồn)
+
+Context không có bài nào về lãi suất. Câu hỏi: "Lãi suất tiết kiệm tháng này bao nhiêu?"
+Trả lời tốt: "Tôi không tìm thấy thông tin về lãi suất tiết kiệm trong các bài báo hiện có."
+
+Context: "Source 1 [2024-12-10]: ... Bộ Tài chính cho biết thu ngân sách 11 tháng đạt 1,8 triệu tỷ đồng ..." và "Source 2 [2024-12-12]: ... chuyên gia C nhận định thu ngân sách cả năm có thể vượt dự toán ..."
+Câu hỏi: "Thu ngân sách năm nay có vượt dự toán không?"
+Trả lời tốt: "Các bài báo chưa có số liệu cả năm. Theo Bộ Tài chính, thu ngân sách 11 tháng đạt 1,8 triệu tỷ đồng [Source 1]; chuyên gia C nhận định thu cả năm có thể vượt dự toán [Source 2]."
+"""
+
 class RAGService:
-    def __init__(self, vector_db: ArticleVectorDB):
+    def __init__(self, vector_db: ArticleVectorDB, context_builder: Optional[ContextBuilder] = None,
+                 reranker: Optional[CrossEncoderReranker] = None, candidate_k: int = 20,
+                 generation_reserve: float = 3.0, min_rerank_ms: float = 50.0,
+                 entity_index: Optional[EntityIndex] = None, entity_boost: float = 0.3):
+        """
+        Args:
+            reranker: nếu có, lấy candidate_k ứng viên từ hybrid search rồi chấm lại bằng cross-encoder
+            candidate_k: số ứng viên đưa vào rerank (và vào bước boost thực thể)
+            generation_reserve: số giây của deadline luôn để dành cho bước sinh câu trả lời
+            min_rerank_ms: budget còn lại dưới mức này thì bỏ qua rerank
+            entity_index: nếu có, bài nhắc tới thực thể có trong câu hỏi được đẩy lên trước khi rerank
+            entity_boost: hệ số nhân thêm vào điểm hybrid, theo tỉ lệ thực thể của câu hỏi mà bài nhắc tới
+        """
         self.vector_db = vector_db
+        self.context_builder = context_builder or ContextBuilder()
+        self.reranker = reranker
+        self.candidate_k = candidate_k
+        self.generation_reserve = generation_reserve
+        self.min_rerank_ms = min_rerank_ms
+        self.entity_index = entity_index
+        self.entity_boost = entity_boost
 
-    def retrieve_context(self, query: str, top_k: int = 5) -> str:
+    def retrieve(self, query: str, top_k: int = 5,
+                 deadline: Optional[Deadline] = None) -> Tuple[List[Dict], Optional[np.ndarray]]:
         """
-        Retrieve context from vector database and format it for the LLM.
+        Retrieve các bài liên quan
+
+        Args:
+            deadline: time budget của request. Khi sắp hết: giảm top_k (context ngắn hơn,
+                sinh nhanh hơn), rút ngắn hoặc bỏ qua rerank; thời gian từng stage ghi vào deadline
+        Returns:
+            (results, query_embedding) - embedding dùng lại làm key cho answer cache
         """
         logger.info(f"Retrieving context for query: {query}")
+        deadline = deadline or Deadline()
         try:
-            results = self.vector_db.search(query, top_k=top_k)
-            
-            if not results:
-                return ""
-            context_parts = []
-            for i, doc in enumerate(results):
-                # doc = {'content': ..., 'metadata': ..., 'distance': ...}
-                metadata = doc.get('metadata', {})
-                title = metadata.get('title', 'Unknown Title')
-                date = metadata.get('date_str', 'Unknown Date') # Using date_str we added
-                body = doc.get('content', '') # Content is title + body
-                
-                # Format: [Date] Title
-                # Content...
-                context_parts.append(f"Source {i+1} [{date}]: {title}\n{body}")
-            
-            return "\n\n".join(context_parts)
-            
+            with deadline.stage("embed"):
+                query_embedding = self.vector_db.encode_query(query)
+
+            # còn ít hơn 2 lần phần để dành cho LLM -> bớt một nửa số bài đưa vào context
+            if not deadline.allows(2 * self.generation_reserve) and top_k > 2:
+                top_k = max(top_k // 2, 2)
+                deadline.degraded = True
+
+            use_rerank = self.reranker is not None
+            if use_rerank and not deadline.allows(self.generation_reserve + self.min_rerank_ms / 1000):
+                deadline.skip("rerank", "deadline")
+                use_rerank = False
+
+            query_entities = []
+            if self.entity_index is not None and self.entity_boost > 0:
+                with deadline.stage("entities"):
+                    query_entities = self.entity_index.match_query(query)
+
+            # boost thực thể cần một tập ứng viên rộng hơn top_k để có gì mà đẩy lên
+            with deadline.stage("search", top_k=top_k):
+                candidates = self.vector_db.hybrid_search(
+                    query, top_k=max(self.candidate_k, top_k) if use_rerank or query_entities else top_k,
+                    query_embedding=query_embedding
+                )
+            if query_entities:
+                candidates = self._boost_entities(candidates, query_entities)
+            if not use_rerank:
+                return candidates[:top_k], query_embedding
+
+            # rerank chỉ dùng phần budget còn lại sau khi trừ phần để dành cho LLM
+            rerank_budget = deadline.timeout(reserve=self.generation_reserve)
+            rerank_budget_ms = None if rerank_budget is None else rerank_budget * 1000
+            try:
+                with deadline.stage("rerank", candidates=len(candidates)):
+                    results = self.reranker.rerank(query, candidates, top_k=top_k,
+                                                   time_budget_ms=rerank_budget_ms)
+            except Exception as e:
+                logger.error(f"Rerank failed, using first-stage order: {e}")
+                results = candidates[:top_k]
+            return results, query_embedding
         except Exception as e:
             logger.error(f"Error retrieving context: {e}")
-            return ""
+            return [], None
 
-    def format_prompt(self, query: str, context: str) -> str:
+    def _boost_entities(self, candidates: List[Dict], entity_ids: List[int]) -> List[Dict]:
         """
-        Combine user query and context into a prompt.
+        Xếp lại ứng viên: điểm hybrid (RRF) nhân (1 + entity_boost * tỉ lệ thực thể của câu hỏi mà bài nhắc tới)
+
+        Ứng viên không có rrf_score dùng điểm theo thứ hạng hiện tại; mỗi ứng viên được gắn 'entity_matches'
+        """
+        try:
+            matches = self.entity_index.mentions(entity_ids, [doc['id'] for doc in candidates])
+        except Exception as e:
+            logger.error(f"Entity boost failed, keeping hybrid order: {e}")
+            return candidates
+        if not matches:
+            return candidates
+
+        scored = []
+        for rank, doc in enumerate(candidates):
+            base = doc.get('rrf_score') or 1.0 / (60 + rank + 1)
+            n = matches.get(doc['id'], 0)
+            scored.append((base * (1 + self.entity_boost * n / len(entity_ids)), dict(doc, entity_matches=n)))
+        # sort ổn định: cùng điểm giữ thứ tự hybrid
+        return [doc for _, doc in sorted(scored, key=lambda item: item[0], reverse=True)]
+
+    def build_context(self, results: List[Dict]) -> Tuple[str, List[Dict]]:
         """
-        system_prompt = """Bạn là một trợ lý AI thông minh, chuyên trả lời câu hỏi dựa trên tin tức được cung cấp.
-        Hãy trả lời câu hỏi của người dùng một cách chính xác, khách quan, và chỉ sử dụng thông tin từ các bài báo dưới đây.
-        Nếu thông tin không có trong bài báo, hãy nói rằng bạn không biết.
+        Đóng gói kết quả retrieve thành context cho LLM (trong token budget)
+
+        Returns:
+            (context, sources) - sources có cấu trúc, xem ContextBuilder.build
         """
-        
-        user_prompt = f"""
-        Thông tin bài báo (Context):
-        {context}
-        
-        Câu hỏi: {query}
-        
-        Trả lời:
+        return self.context_builder.build(results)
+
+    def retrieve_context(self, query: str, top_k: int = 5) -> str:
+        """
+        Retrieve context from vector database and format it for the LLM.
         """
+        results, _ = self.retrieve(query, top_k=top_k)
+        context, _ = self.build_context(results)
+        return context
 
-        return [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
+    @staticmethod
+    def format_prompt(query: str, context: str, history: Optional[List[Dict[str, str]]] = None,
+                      summary: Optional[str] = None) -> List[Dict[str, str]]:
+        """
+        Combine user query and context into a prompt.
+
+        Args:
+            history: các lượt gần nhất [{'role': 'user'|'assistant', 'content'}], giữ nguyên dạng nhiều lượt
+            summary: tóm tắt phần hội thoại cũ hơn (xem ConversationMemory)
+        """
+        # chỉ phần tĩnh (system prompt + hướng dẫn trả lời) được đánh dấu 'cache': giống hệt nhau
+        # giữa mọi câu hỏi nên provider có context caching (Gemini cachedContents) dùng lại được;
+        # context bài báo đổi theo từng câu hỏi nên nằm sau prefix
+        messages = [
+            {"role": "system", "content": f"{SYSTEM_PROMPT}\n\n{ANSWER_GUIDE}", "cache": True},
+            {"role": "user", "content": f"Thông tin bài báo (Context):\n{context}"},
         ]
+        if summary:
+            messages.append({"role": "user", "content": f"Tóm tắt cuộc hội thoại trước đó:\n{summary}"})
+        messages.extend(history or [])
+        messages.append({"role": "user", "content": f"Câu hỏi: {query}\n\nTrả lời:"})
+        return messages
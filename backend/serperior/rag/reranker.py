@@ -0,0 +1,145 @@
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+import logging
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RERANK_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+
+class CrossEncoderReranker:
+    """
+    Chấm lại ứng viên retrieve bằng cross-encoder (query, passage) trên CPU
+
+    - chấm theo batch, theo thứ tự của stage 1 (ứng viên tốt nhất được chấm trước)
+    - time budget: ước lượng thời gian chấm một cặp từ các batch trước, batch tiếp theo được thu nhỏ
+      (hoặc bỏ) để không vượt budget; ứng viên chưa chấm giữ thứ tự stage 1, xếp sau
+    - cache LRU điểm (query, doc id) cho các câu hỏi lặp lại
+    """
+
+    def __init__(self, model_name: str = DEFAULT_RERANK_MODEL, batch_size: int = 16,
+                 max_length: int = 256, max_chars: int = 1500, time_budget_ms: float = 300,
+                 cache_size: int = 4096, device: str = "cpu", model=None):
+        """
+        Args:
+            model_name: cross-encoder đa ngôn ngữ (HuggingFace)
+            batch_size: số cặp (query, passage) mỗi lần predict
+            max_length: số token tối đa mỗi cặp
+            max_chars: chỉ lấy phần đầu bài (title + sapo) để chấm
+            time_budget_ms: thời gian tối đa cho một lần rerank
+            cache_size: số điểm (query, doc id) giữ trong cache
+            model: model đã load sẵn, có predict(pairs, ...) (mặc định load CrossEncoder(model_name))
+        """
+        if model is None:
+            from sentence_transformers import CrossEncoder
+            model = CrossEncoder(model_name, max_length=max_length, device=device)
+
+        self.model_name = model_name
+        self.model = model
+        self.batch_size = batch_size
+        self.max_chars = max_chars
+        self.time_budget_ms = time_budget_ms
+        self.cache_size = cache_size
+
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._latencies = deque(maxlen=1000)
+        # ms / cặp của các batch gần đây, dùng để ước lượng batch tiếp theo có kịp budget không
+        self._pair_ms = deque(maxlen=50)
+        self._stats = {"calls": 0, "cache_hits": 0, "scored": 0, "over_budget": 0}
+
+    @staticmethod
+    def _query_key(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def _estimated_pair_ms(self) -> Optional[float]:
+        with self._lock:
+            return float(np.median(self._pair_ms)) if self._pair_ms else None
+
+    def rerank(self, query: str, candidates: List[Dict], top_k: int = 5,
+               time_budget_ms: Optional[float] = None) -> List[Dict]:
+        """
+        Args:
+            candidates: kết quả stage 1 (đã sắp xếp), mỗi dict có 'id' và 'content'
+            time_budget_ms: budget cho lần gọi này (mặc định self.time_budget_ms)
+        Returns:
+            top_k dicts, kèm 'rerank_score' (None nếu không kịp chấm)
+        """
+        if not candidates:
+            return []
+
+        start = time.perf_counter()
+        budget_ms = self.time_budget_ms if time_budget_ms is None else min(time_budget_ms, self.time_budget_ms)
+        deadline = start + budget_ms / 1000
+        key = self._query_key(query)
+
+        scores: List[Optional[float]] = [None] * len(candidates)
+        pending = []
+        with self._lock:
+            for i, doc in enumerate(candidates):
+                cached = self._cache.get((key, doc['id']))
+                if cached is not None:
+                    self._cache.move_to_end((key, doc['id']))
+                    scores[i] = cached
+                else:
+                    pending.append(i)
+            self._stats["cache_hits"] += len(candidates) - len(pending)
+
+        over_budget = False
+        pair_ms = self._estimated_pair_ms()
+        b = 0
+        while b < len(pending):
+            remaining_ms = (deadline - time.perf_counter()) * 1000
+            if pair_ms is None:
+                # chưa có số đo (lần gọi đầu): batch thăm dò nhỏ
+                size = max(self.batch_size // 4, 1)
+            else:
+                size = int(remaining_ms / pair_ms) if pair_ms > 0 else self.batch_size
+            size = min(size, self.batch_size, len(pending) - b)
+            if remaining_ms <= 0 or size < 1:
+                over_budget = True
+                break
+            batch = pending[b:b + size]
+            b += size
+            pairs = [(query, candidates[i].get('content', '')[:self.max_chars]) for i in batch]
+            batch_start = time.perf_counter()
+            batch_scores = np.asarray(self.model.predict(pairs, batch_size=len(pairs),
+                                                         show_progress_bar=False), dtype=np.float32)
+            pair_ms = (time.perf_counter() - batch_start) * 1000 / len(batch)
+            with self._lock:
+                self._pair_ms.append(pair_ms)
+                for i, score in zip(batch, batch_scores.tolist()):
+                    scores[i] = score
+                    self._cache[(key, candidates[i]['id'])] = score
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+                self._stats["scored"] += len(batch)
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["over_budget"] += int(over_budget)
+            self._latencies.append(elapsed_ms)
+        if over_budget:
+            logger.warning(f"Rerank over budget ({elapsed_ms:.0f}ms), "
+                           f"{sum(s is None for s in scores)} candidates left in first-stage order")
+
+        # đã chấm: theo điểm cross-encoder; chưa chấm: giữ thứ tự stage 1, xếp sau
+        order = sorted(range(len(candidates)),
+                       key=lambda i: (scores[i] is None, -(scores[i] or 0.0), i))
+        return [dict(candidates[i], rerank_score=scores[i]) for i in order[:top_k]]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            latencies = np.asarray(self._latencies) if self._latencies else np.zeros(1)
+            return dict(
+                self._stats,
+                model=self.model_name,
+                cache_size=len(self._cache),
+                time_budget_ms=self.time_budget_ms,
+                p50_ms=float(np.percentile(latencies, 50)),
+                p95_ms=float(np.percentile(latencies, 95)),
+            )
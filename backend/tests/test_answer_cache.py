@@ -0,0 +1,42 @@
+from serperior.rag.answer_cache import SemanticAnswerCache
+import numpy as np
+import time
+
+
+def test_semantic_answer_cache():
+    rng = np.random.default_rng(0)
+    query = rng.normal(size=64).astype(np.float32)
+    # câu hỏi gần giống: cosine rất cao
+    paraphrase = query + 0.05 * rng.normal(size=64).astype(np.float32)
+    unrelated = rng.normal(size=64).astype(np.float32)
+    ids = ["a1", "a2", "a3"]
+
+    cache = SemanticAnswerCache(threshold=0.92, ttl_seconds=0.5, max_entries=2)
+    assert cache.lookup(query, ids) is None
+    cache.put(query, ids, "Giá vàng tăng.", ["Source 1"])
+
+    hit = cache.lookup(paraphrase, list(reversed(ids)))
+    assert hit is not None and hit['answer'] == "Giá vàng tăng."
+    assert cache.lookup(unrelated, ids) is None
+    # context đổi -> không dùng lại câu trả lời cũ
+    assert cache.lookup(query, ["a1", "a2", "a4"]) is None
+
+    # LRU: entry vừa hit được giữ lại
+    cache.put(unrelated, ["b1"], "x", [])
+    cache.lookup(query, ids)
+    cache.put(rng.normal(size=64), ["c1"], "y", [])
+    assert cache.lookup(query, ids) is not None
+    assert cache.lookup(unrelated, ["b1"]) is None
+
+    # TTL
+    time.sleep(0.6)
+    assert cache.lookup(query, ids) is None
+
+    stats = cache.stats()
+    print(stats)
+    assert stats["evictions"] == 1 and stats["expirations"] >= 1
+    assert stats["hits"] == 3
+
+
+if __name__ == "__main__":
+    test_semantic_answer_cache()
@@ -0,0 +1,63 @@
+from serperior.api.bm25_index import BM25Index
+import os
+import tempfile
+
+
+def test_bm25_index():
+    docs = {
+        "a": "Vingroup công bố lợi nhuận quý 3 tăng mạnh",
+        "b": "Giá vàng SJC hôm nay giảm 500.000 đồng",
+        "c": "Cổ phiếu VNM của Vinamilk tăng trần",
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bm25_index.npz")
+        index = BM25Index(path, tokenizer=lambda text: text.lower().split())
+        added = index.add_documents(docs.keys(), docs.values())
+        print(f"Added {added} documents")
+        assert added == 3
+
+        # id trùng thì bỏ qua
+        assert index.add_documents(["a"], [docs["a"]]) == 0
+
+        hits = index.search("VNM", top_k=2)
+        print(f"VNM -> {hits}")
+        assert hits[0][0] == "c"
+
+        # lưu rồi load lại phải cho kết quả giống hệt
+        index.save()
+        reloaded = BM25Index(path, tokenizer=lambda text: text.lower().split())
+        assert len(reloaded) == 3
+        assert reloaded.search("giá vàng sjc", top_k=1) == index.search("giá vàng sjc", top_k=1)
+
+
+def test_bm25_segments():
+    split = lambda text: text.lower().split()
+    docs = [(f"d{i}", f"tin số {i} về {'vàng' if i % 2 else 'xăng'} và chứng khoán") for i in range(12)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bm25_index.npz")
+        index = BM25Index(path, tokenizer=split, max_segments=2)
+        for start in range(0, 12, 3):
+            index.add_documents(*zip(*docs[start:start + 3]))
+            # mỗi lần ingest chỉ ghi các bài mới
+            index.flush()
+            reloaded = BM25Index(path, tokenizer=split, max_segments=2)
+            assert len(reloaded) == start + 3
+            assert reloaded.search("vàng chứng khoán", top_k=20) == index.search("vàng chứng khoán", top_k=20)
+
+        # lần đầu ghi file gốc, hai lần sau là segment, lần thứ tư compact lại
+        segments = sorted(f for f in os.listdir(tmp) if ".seg" in f)
+        assert segments == [], segments
+        index.add_documents(["x"], ["vàng vàng"])
+        index.flush()
+        assert sorted(f for f in os.listdir(tmp) if ".seg" in f) == ["bm25_index.seg000001.npz"]
+        assert BM25Index(path, tokenizer=split).search("vàng", top_k=1)[0][0] == "x"
+
+        index.clear()
+        assert os.listdir(tmp) == []
+
+
+if __name__ == "__main__":
+    test_bm25_index()
+    test_bm25_segments()
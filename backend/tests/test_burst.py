@@ -0,0 +1,106 @@
+from serperior.api.burst import BurstDetector
+from serperior.api.trend_store import TrendStore
+from collections import Counter
+import os
+import tempfile
+import threading
+
+
+def add_day(store, day, n_articles, counts, entities=()):
+    articles = [{'url': f"{day}-{i}", 'date': day, 'field': "kinh-doanh"} for i in range(n_articles)]
+    word_counts = [Counter(counts) if i == 0 else Counter() for i in range(n_articles)]
+    ents = [[{'text': text, 'type': etype} for text, etype in entities] if i == 0 else []
+            for i in range(n_articles)]
+    store.add_articles(articles, word_counts, ents)
+
+
+def test_burst_detector():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TrendStore(os.path.join(tmp, "trends.db"))
+        detector = BurstDetector(store, min_count=3)
+
+        for d in range(1, 8):
+            add_day(store, f"2024-12-{d:02d}", 10, {"giá": 20, "vàng": 1})
+        # ngày mới nhất: "vàng" tăng vọt, "giá" như thường, thực thể mới "SJC"
+        add_day(store, "2024-12-08", 10, {"giá": 20, "vàng": 15},
+                [("SJC", "ORG")] * 3)
+
+        # trending chỉ đọc; trạng thái được advance lúc ingest
+        assert detector.trending()['baseline_days'] == 0
+        assert detector.advance() == 7
+        result = detector.trending(top_n=5)
+        assert result['date'] == "2024-12-08" and result['warm']
+        assert result['baseline_days'] == 7
+        words = [(item['kind'], item['text']) for item in result['items']]
+        assert ("term", "vàng") in words and ("term", "giá") not in words
+        assert ("entity", "SJC") in words
+
+        # ngày mới tới: chỉ xử lý thêm đúng một ngày, không quét lại lịch sử
+        add_day(store, "2024-12-09", 10, {"giá": 20})
+        assert detector.advance() == 1
+        assert detector.advance() == 0
+        assert detector.trending(kind="term")['date'] == "2024-12-09"
+        detector.close()
+        store.close()
+
+
+def test_lazy_decay_matches_daily_update():
+    """Decay lười (chỉ ghi item có mặt) cho cùng kết quả với cập nhật mọi item mỗi ngày"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TrendStore(os.path.join(tmp, "trends.db"))
+        detector = BurstDetector(store, alpha=0.3, prune_rate=1e-3)
+        days = [{"giá": 5, "vàng": 2}, {"giá": 4}, {"giá": 6}, {"giá": 5, "vàng": 3}, {"giá": 5}, {"giá": 1}]
+        for d, counts in enumerate(days, 1):
+            add_day(store, f"2024-12-{d:02d}", 10, counts)
+            detector.advance()
+
+        expected = {}
+        for counts in days[:-1]:
+            for term in set(expected) | set(counts):
+                x = counts.get(term, 0) / 10
+                mean, var = expected.get(term, (0.0, 0.0))
+                diff = x - mean
+                mean += 0.3 * diff
+                expected[term] = (mean, 0.7 * (var + diff * 0.3 * diff))
+
+        state = detector._load_state("*", [("term", "giá"), ("term", "vàng")], 5)
+        for term, (mean, var) in expected.items():
+            entry = state[("term", term)]
+            detector._decay(entry, 5)
+            assert abs(entry[0] - mean) < 1e-9 and abs(entry[1] - var) < 1e-9, (term, entry, mean, var)
+        # ngày 5 chỉ có "giá": dòng của "vàng" vẫn dừng ở ngày 4, không bị ghi lại
+        assert dict(detector._conn.execute("SELECT key, day FROM burst_state")) == {"giá": 5, "vàng": 4}
+        detector.close()
+        store.close()
+
+
+def test_concurrent_ingest_and_advance():
+    """Ghi trend store và advance burst từ hai thread cùng lúc (chung một connection, không bị locked)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TrendStore(os.path.join(tmp, "trends.db"))
+        detector = BurstDetector(store)
+        errors = []
+
+        def ingest():
+            try:
+                for d in range(1, 21):
+                    add_day(store, f"2024-11-{d:02d}", 5, {"giá": 3, f"từ{d}": 2})
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=ingest)
+        thread.start()
+        while thread.is_alive():
+            detector.advance()
+            detector.trending()
+        thread.join()
+        detector.advance()
+        assert not errors, errors
+        assert detector.trending()['baseline_days'] == 19
+        store.close()
+
+
+if __name__ == "__main__":
+    test_burst_detector()
+    test_lazy_decay_matches_daily_update()
+    test_concurrent_ingest_and_advance()
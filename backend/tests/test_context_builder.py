@@ -0,0 +1,40 @@
+from serperior.rag.context_builder import ContextBuilder, approx_tokens
+
+
+def _doc(doc_id, score, title, body, date="2024-01-01"):
+    return {'id': doc_id, 'content': f"{title}. {body}", 'rrf_score': score,
+            'metadata': {'title': title, 'date_str': date, 'url': f"https://dantri.com.vn/{doc_id}.htm"}}
+
+
+def test_context_builder():
+    story = " ".join(f"Câu thứ {i} về giá vàng SJC tăng mạnh trong phiên sáng nay." for i in range(40))
+    results = [
+        _doc("b", 0.02, "Lãi suất huy động giảm", "Các ngân hàng tiếp tục giảm lãi suất. " * 5),
+        _doc("a", 0.03, "Giá vàng tăng", story),
+        # cùng một tin đăng lại ngày khác
+        _doc("a2", 0.025, "Giá vàng tăng", story + " Cập nhật.", date="2024-01-02"),
+    ]
+
+    builder = ContextBuilder(max_tokens=400, min_passage_tokens=20)
+    context, sources = builder.build(results)
+    print(context)
+    print(sources)
+
+    assert approx_tokens(context) <= 400
+    # sắp theo score, bỏ bản trùng
+    assert [s['id'] for s in sources] == ['a']
+    assert "a2" not in {s['id'] for s in sources}
+    assert sources[0]['index'] == 1 and context.startswith("Source 1 [2024-01-01]: Giá vàng tăng")
+    # bài dài bị cắt ở cuối câu
+    assert sources[0]['truncated']
+    first = context.split("\n\n")[0]
+    assert first.endswith(".")
+
+    # budget đủ lớn: không cắt, giữ đủ bài khác nhau
+    context, sources = ContextBuilder(max_tokens=10000).build(results)
+    assert [s['id'] for s in sources] == ["a", "b"]
+    assert not any(s['truncated'] for s in sources)
+
+
+if __name__ == "__main__":
+    test_context_builder()
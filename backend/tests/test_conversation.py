@@ -0,0 +1,64 @@
+from serperior.rag.conversation import ConversationMemory
+from serperior.rag.llm_client import LLMClient
+import asyncio
+
+
+class RecordingLLM:
+    """Trả lời cố định và ghi lại prompt để kiểm tra"""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def agenerate_answer(self, messages, timeout=None):
+        self.prompts.append(messages[-1]['content'])
+        if "Câu hỏi cuối" in messages[-1]['content']:
+            return "Giá bạc hôm nay thế nào?"
+        return f"Tóm tắt #{len(self.prompts)}"
+
+
+def test_rolling_summary():
+    llm = RecordingLLM()
+    memory = ConversationMemory(llm, max_history_tokens=200, keep_recent_messages=4)
+    history = []
+    for i in range(10):
+        history.append({'role': 'user', 'content': f"Câu hỏi số {i} về giá vàng " + "x" * 100})
+        history.append({'role': 'assistant', 'content': f"Trả lời số {i} " + "y" * 100})
+
+    async def run():
+        summary, recent = await memory.compress(history[:16])
+        assert summary == "Tóm tắt #1"
+        assert len(recent) <= 4
+        # lượt sau: chỉ tóm tắt phần mới, bắt đầu từ summary cũ
+        summary2, recent2 = await memory.compress(history)
+        assert summary2 == "Tóm tắt #2"
+        assert llm.prompts[-1].startswith("Tóm tắt trước đó:\nTóm tắt #1")
+        assert "Câu hỏi số 0" not in llm.prompts[-1]
+        # prompt không phình theo số lượt
+        assert sum(len(m['content']) for m in recent2) <= sum(len(m['content']) for m in history[-4:])
+        # cùng lịch sử -> dùng cache, không gọi LLM
+        calls = len(llm.prompts)
+        assert (await memory.compress(history))[0] == summary2
+        assert len(llm.prompts) == calls
+
+        rewritten = await memory.rewrite_query("Còn bạc thì sao?", recent2, summary2)
+        assert rewritten == "Giá bạc hôm nay thế nào?"
+        assert await memory.rewrite_query("Giá vàng?", []) == "Giá vàng?"
+
+    asyncio.run(run())
+
+
+def test_gemini_multi_turn_payload():
+    payload = LLMClient._gemini_payload([
+        {'role': 'system', 'content': "sys"},
+        {'role': 'assistant', 'content': "Xin chào!"},
+        {'role': 'user', 'content': "hỏi 1"},
+        {'role': 'assistant', 'content': "đáp 1"},
+        {'role': 'user', 'content': "hỏi 2"},
+    ])
+    assert payload['systemInstruction'] == {'parts': [{'text': "sys"}]}
+    assert [c['role'] for c in payload['contents']] == ["user", "model", "user"]
+
+
+if __name__ == "__main__":
+    test_rolling_summary()
+    test_gemini_multi_turn_payload()
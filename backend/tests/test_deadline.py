@@ -0,0 +1,62 @@
+from serperior.rag.deadline import Deadline
+from serperior.rag.rag_service import RAGService
+import time
+
+DOCS = [{'id': str(i), 'content': f"bài {i}", 'metadata': {'title': f"Bài {i}"}} for i in range(10)]
+
+
+class FakeDB:
+    def encode_query(self, query):
+        return None
+
+    def hybrid_search(self, query, top_k=5, query_embedding=None):
+        return DOCS[:top_k]
+
+
+class FakeReranker:
+    def __init__(self):
+        self.budgets = []
+
+    def rerank(self, query, candidates, top_k=5, time_budget_ms=None):
+        self.budgets.append(time_budget_ms)
+        return [dict(doc, rerank_score=1.0) for doc in reversed(candidates)][:top_k]
+
+
+def test_deadline():
+    deadline = Deadline(0.05)
+    with deadline.stage("retrieve"):
+        time.sleep(0.01)
+    deadline.skip("rerank", "deadline")
+    report = deadline.report()
+    assert [s['name'] for s in report['stages']] == ["retrieve", "rerank"]
+    assert report['stages'][0]['ms'] >= 10 and report['degraded']
+    assert deadline.timeout(reserve=1.0) == 0.0
+
+    time.sleep(0.05)
+    assert deadline.expired() and not deadline.allows(0.01)
+    # không giới hạn
+    assert Deadline().timeout(cap=2.0) == 2.0 and Deadline().remaining() == float('inf')
+
+
+def test_retrieve_degrades():
+    reranker = FakeReranker()
+    service = RAGService(FakeDB(), reranker=reranker, candidate_k=8, generation_reserve=3.0)
+
+    # đủ budget: rerank chạy với phần budget sau khi trừ phần để dành cho LLM
+    deadline = Deadline(10.0)
+    results, _ = service.retrieve("giá vàng", top_k=5, deadline=deadline)
+    assert [doc['id'] for doc in results] == ["7", "6", "5", "4", "3"]
+    assert reranker.budgets[-1] <= 7000 and not deadline.degraded
+    assert [s['name'] for s in deadline.report()['stages']] == ["embed", "search", "rerank"]
+
+    # sắp hết budget: bỏ rerank, giảm top_k
+    deadline = Deadline(2.0)
+    results, _ = service.retrieve("giá vàng", top_k=5, deadline=deadline)
+    assert [doc['id'] for doc in results] == ["0", "1"]
+    assert len(reranker.budgets) == 1 and deadline.degraded
+    assert {'name': "rerank", 'status': "skipped", 'reason': "deadline", 'ms': 0.0} in deadline.report()['stages']
+
+
+if __name__ == "__main__":
+    test_deadline()
+    test_retrieve_degrades()
@@ -0,0 +1,99 @@
+from serperior.rag.digest import DigestBuilder, DigestStore, format_digest, parse_date_scope
+from serperior.rag.llm_client import LLMError
+from serperior.rag.llm_router import MockLLMClient
+from datetime import date
+import os
+import tempfile
+
+ARTICLES = [
+    {'id': "1", 'date': "2024-12-15", 'field': "kinh-doanh", 'url': "u1",
+     'title': "Giá vàng SJC lập đỉnh", 'body': "Giá vàng SJC tăng mạnh phiên sáng."},
+    {'id': "2", 'date': "2024-12-15", 'field': "kinh-doanh", 'url': "u2",
+     'title': "Lãi suất tiết kiệm giảm", 'body': "Nhiều ngân hàng giảm lãi suất, giá vàng vẫn tăng."},
+    {'id': "3", 'date': "2024-12-15", 'field': "thoi-su", 'url': "u3",
+     'title': "Thời tiết Hà Nội", 'body': "Hà Nội rét đậm."},
+]
+
+
+class FakeDB:
+    def get_articles_by_date(self, start_date, end_date):
+        return [a for a in ARTICLES if start_date <= a['date'] <= end_date]
+
+
+class FakeAnalyzer:
+    use_phobert = False
+
+    def __init__(self):
+        self.calls = 0
+
+    def extract_keywords_from_articles(self, articles, top_n=10):
+        self.calls += 1
+        return [("giá vàng", 3), ("lãi suất", 1)]
+
+
+def test_parse_date_scope():
+    today = date(2024, 12, 16)
+    assert parse_date_scope("Hôm qua kinh doanh có gì?", today) == \
+        {'date': "2024-12-15", 'field': "kinh-doanh", 'summary': True}
+    assert parse_date_scope("Giá vàng ngày 15/12 bao nhiêu?", today) == \
+        {'date': "2024-12-15", 'field': None, 'summary': False}
+    assert parse_date_scope("Giá vàng bao nhiêu?", today) is None
+
+
+def test_digest_builder():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DigestStore(os.path.join(tmp, "digests.db"))
+        llm = MockLLMClient(answer="- Giá vàng lập đỉnh\n- Lãi suất giảm")
+        builder = DigestBuilder(FakeDB(), FakeAnalyzer(), llm, store)
+
+        assert builder.build_for_articles(ARTICLES) == 2
+        digest = store.get("2024-12-15", "kinh-doanh")
+        assert digest['article_count'] == 2
+        assert digest['summary'].startswith("- Giá vàng")
+        assert digest['top_stories'][0]['title'] == "Giá vàng SJC lập đỉnh"
+        assert "Điểm tin Kinh doanh ngày 2024-12-15" in format_digest(digest)
+
+        # dữ liệu không đổi -> không gọi lại LLM
+        calls = len(llm.calls)
+        builder.build("2024-12-15", "kinh-doanh")
+        assert len(llm.calls) == calls
+        assert len(store.list("2024-12-15")) == 2
+        store.close()
+
+
+def test_sources_only_digest():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "digests.db")
+        store = DigestStore(path)
+        analyzer = FakeAnalyzer()
+        builder = DigestBuilder(FakeDB(), analyzer, None, store)
+
+        digest = builder.build("2024-12-15", "kinh-doanh")
+        assert digest['summary'] is None and digest['sources_only']
+        assert "- Giá vàng SJC lập đỉnh" in format_digest(digest)
+
+        # không có LLM: digest chỉ có nguồn được dùng lại, không tạo lại mỗi request
+        assert builder.build("2024-12-15", "kinh-doanh")['created_at'] == digest['created_at']
+        assert analyzer.calls == 1
+        store.close()
+
+        # có LLM sau khi khởi động lại -> tạo summary cho digest đó
+        store = DigestStore(path)
+        llm = MockLLMClient(answer="- Giá vàng lập đỉnh")
+        digest = DigestBuilder(FakeDB(), analyzer, llm, store).build("2024-12-15", "kinh-doanh")
+        assert digest['summary'] == "- Giá vàng lập đỉnh" and not digest['sources_only']
+        assert analyzer.calls == 2
+
+        # LLM lỗi: summary NULL nhưng không phải sources_only -> lần sau thử lại
+        failing = DigestBuilder(FakeDB(), analyzer, MockLLMClient(answer=LLMError("Error: timed out")), store)
+        digest = failing.build("2024-12-15", "kinh-doanh", force=True)
+        assert digest['summary'] is None and not digest['sources_only']
+        failing.build("2024-12-15", "kinh-doanh")
+        assert analyzer.calls == 4
+        store.close()
+
+
+if __name__ == "__main__":
+    test_parse_date_scope()
+    test_digest_builder()
+    test_sources_only_digest()
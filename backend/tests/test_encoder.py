@@ -0,0 +1,50 @@
+from serperior.api.encoder import TextEncoder
+import numpy as np
+
+
+class StubSentenceTransformer:
+    """Vector = (độ dài văn bản, số thứ tự trong batch); ghi lại các batch nhận được"""
+
+    max_seq_length = 128
+
+    def __init__(self):
+        self.batches = []
+
+    @property
+    def tokenizer(self):
+        raise AssertionError("encode_documents must not tokenize before encode")
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False, convert_to_numpy=True):
+        if isinstance(texts, str):
+            return np.array([len(texts), 0], dtype=np.float32)
+        self.batches.append(list(texts))
+        return np.array([[len(text), i] for i, text in enumerate(texts)], dtype=np.float32)
+
+    def get_sentence_embedding_dimension(self):
+        return 2
+
+
+def test_encode_documents_batching():
+    model = StubSentenceTransformer()
+    encoder = TextEncoder("stub", model=model, max_tokens_per_batch=256)
+    # độ dài ước lượng: 3 ký tự / token, tối đa max_seq_length
+    texts = ["a" * n for n in (30, 600, 90, 3, 300, 60, 1000, 9)]
+
+    embeddings = encoder.encode_documents(texts)
+    # đúng thứ tự đầu vào dù được encode theo thứ tự độ dài
+    assert embeddings.shape == (len(texts), 2)
+    assert embeddings[:, 0].tolist() == [len(text) for text in texts]
+
+    # dài trước, mỗi batch (dài nhất * số câu) không vượt ngân sách
+    lengths = [[min(len(text) // 3 + 2, model.max_seq_length) for text in batch] for batch in model.batches]
+    flat = [n for batch in lengths for n in batch]
+    assert flat == sorted(flat, reverse=True)
+    assert all(batch[0] * len(batch) <= 256 for batch in lengths)
+    assert len(model.batches) == 3 and sum(map(len, model.batches)) == len(texts)
+
+    assert encoder.encode_documents([]).shape == (0, 2)
+    assert encoder.encode_query("abc").tolist() == [3, 0]
+
+
+if __name__ == "__main__":
+    test_encode_documents_batching()
@@ -0,0 +1,47 @@
+from serperior.api.entity_aggregate import EntityAggregate, normalize_entity, normalize_surface
+
+
+def test_normalize():
+    assert normalize_surface("  Hà_Nội, ") == "Hà Nội"
+    assert normalize_entity("HÀ  NỘI") == normalize_entity("hà nội")
+    assert normalize_surface("...") == ""
+
+
+def test_entity_aggregate():
+    articles = [
+        ("2024-12-15", [{'text': "Hà Nội", 'type': "LOC"}, {'text': "hà nội", 'type': "LOC"},
+                        {'text': "Vingroup", 'type': "ORG"}]),
+        ("2024-12-16", [{'text': "Hà_Nội", 'type': "LOC"}, {'text': "A|B Corp", 'type': "ORG"},
+                        {'text': ",", 'type': "MISC"}]),
+        ("2024-12-16", []),
+    ]
+    whole = EntityAggregate()
+    for date, entities in articles:
+        whole.add_article(entities, date)
+
+    assert (whole.articles, whole.mentions, len(whole)) == (3, 5, 3)
+    (top, count), = whole.most_common(1)
+    assert (whole.text(top), whole.entity_type(top), count) == ("Hà Nội", "LOC", 3)
+    assert whole.article_counts[top] == 2
+    # tên chứa '|' không bị cắt
+    assert [whole.text(i) for i, _ in whole.most_common()] == ["Hà Nội", "Vingroup", "A|B Corp"]
+    assert [whole.text(i) for i, _ in whole.most_common(entity_type="ORG")] == ["Vingroup", "A|B Corp"]
+    assert whole.types() == {"LOC": 1, "ORG": 2}
+    assert whole.timeline([top]) == {"2024-12-15": {"Hà Nội": 2}, "2024-12-16": {"Hà Nội": 1}}
+    assert whole.timeline([top], freq="month") == {"2024-12": {"Hà Nội": 3}}
+
+    # tổng hợp từng phần (VD: mỗi worker một phần) rồi merge = tổng hợp một lần
+    first, second = EntityAggregate(), EntityAggregate()
+    first.add_article(articles[0][1], articles[0][0])
+    for date, entities in articles[1:]:
+        second.add_article(entities, date)
+    merged = EntityAggregate().merge(second).merge(first)
+    assert (merged.articles, merged.mentions, len(merged)) == (3, 5, 3)
+    assert {merged.text(i): c for i, c in merged.most_common()} == {whole.text(i): c for i, c in whole.most_common()}
+    top = merged.most_common(1)[0][0]
+    assert merged.timeline([top]) == whole.timeline([whole.most_common(1)[0][0]])
+
+
+if __name__ == "__main__":
+    test_normalize()
+    test_entity_aggregate()
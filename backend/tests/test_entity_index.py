@@ -0,0 +1,76 @@
+from serperior.api.entity_index import EntityIndex
+import os
+import tempfile
+
+
+def article(doc_id, date, field="kinh-doanh"):
+    return {'id': doc_id, 'date': date, 'field': field}
+
+
+ARTICLES = [article("a", "2024-11-30"), article("b", "2024-12-15"), article("c", "2024-12-16", "thoi-su"),
+            article("d", "2024-12-16")]
+ENTITIES = [
+    [{'text': "Hà Nội", 'type': "LOC"}, {'text': "Vingroup", 'type': "ORG"}],
+    [{'text': "Hà_Nội", 'type': "LOC"}, {'text': "hà nội", 'type': "LOC"}, {'text': "Vingroup", 'type': "ORG"},
+     {'text': "A|B 100% Corp", 'type': "ORG"}],
+    [{'text': "Hà Nội", 'type': "LOC"}, {'text': "Phạm Nhật Vượng", 'type': "PER"}],
+    [],
+]
+
+
+def test_ingest():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "entities.db")
+        index = EntityIndex(path)
+        assert index.add_articles(ARTICLES, ENTITIES) == 4
+        assert index.add_articles(ARTICLES[:1], ENTITIES[:1]) == 0
+        # bài không có thực thể vẫn được đánh dấu đã index
+        assert index.missing(["a", "d", "e", "e"]) == ["e"]
+        assert index.stats() == {"articles": 4, "entities": 4, "postings": 7}
+        index.close()
+
+        # dùng như cache NER, đọc lại sau khi mở lại file
+        index = EntityIndex(path)
+        cached = index.article_entities(["b", "d", "e"])
+        assert set(cached) == {"b", "d"} and cached["d"] == []
+        assert sorted(e['text'] for e in cached["b"]) == ["A|B 100% Corp", "Hà Nội", "Hà Nội", "Vingroup"]
+        index.close()
+
+
+def test_queries():
+    index = EntityIndex()
+    index.add_articles(ARTICLES, ENTITIES)
+
+    assert index.find("HÀ NỘI") == [{'name': "Hà Nội", 'type': "LOC", 'articles': 3, 'mentions': 4}]
+    # '%', '|' trong tên không phải ký tự đặc biệt; '_' của PhoBERT là khoảng trắng
+    assert [e['name'] for e in index.find("100%")] == ["A|B 100% Corp"]
+    assert [e['name'] for e in index.find("a|b")] == ["A|B 100% Corp"]
+    assert index.find("ha_noi") == [] and index.find("...") == []
+    assert index.find("Hà_Nội", entity_type="ORG") == []
+
+    assert [a['id'] for a in index.articles("hà nội")] == ["c", "b", "a"]
+    assert index.articles("Hà Nội", start_date="2024-12-31", end_date="2024-12-01", field="kinh-doanh") == [
+        {'id': "b", 'date': "2024-12-15", 'field': "kinh-doanh", 'mentions': 2}
+    ]
+    assert index.articles("không có") == []
+
+    assert index.cooccurrence("Hà Nội") == [
+        {'name': "Vingroup", 'type': "ORG", 'articles': 2},
+        {'name': "A|B 100% Corp", 'type': "ORG", 'articles': 1},
+        {'name': "Phạm Nhật Vượng", 'type': "PER", 'articles': 1},
+    ]
+    assert index.timeline("Hà Nội", freq="month") == {
+        "2024-11": {'articles': 1, 'mentions': 1}, "2024-12": {'articles': 2, 'mentions': 3}
+    }
+
+    # thực thể trong câu hỏi -> số thực thể đó mà từng bài nhắc tới (dùng để boost khi RAG)
+    query_ids = index.match_query("Vingroup đầu tư gì ở Hà Nội?")
+    assert len(query_ids) == 2
+    assert index.mentions(query_ids, ["a", "b", "c", "d"]) == {"a": 2, "b": 2, "c": 1}
+    assert index.match_query("ở đâu?") == []
+    index.close()
+
+
+if __name__ == "__main__":
+    test_ingest()
+    test_queries()
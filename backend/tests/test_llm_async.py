@@ -0,0 +1,74 @@
+from serperior.rag.llm_client import LLMClient
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import asyncio
+import json
+import threading
+import time
+
+
+class FlakyGeminiHandler(BaseHTTPRequestHandler):
+    """Trả 503 cho 2 request đầu, sau đó trả lời bình thường (chậm 0.2s)"""
+
+    protocol_version = "HTTP/1.1"
+    calls = 0
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        cls = type(self)
+        with cls.lock:
+            cls.calls += 1
+            call = cls.calls
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+
+        try:
+            if call <= 2:
+                body = b'{"error": "overloaded"}'
+                self.send_response(503)
+            else:
+                time.sleep(0.2)
+                body = json.dumps({"candidates": [{"content": {"parts": [{"text": "OK"}]}}]}).encode()
+                self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+def test_async_retry_and_concurrency():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyGeminiHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    async def run():
+        client = LLMClient(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}",
+                           max_concurrency=2, backoff_base=0.01)
+        messages = [{"role": "user", "content": "Xin chào"}]
+        try:
+            answers = await asyncio.gather(*[client.agenerate_answer(messages) for _ in range(6)])
+        finally:
+            await client.aclose()
+        return answers
+
+    try:
+        answers = asyncio.run(run())
+        print(f"answers: {answers}, calls: {FlakyGeminiHandler.calls}, "
+              f"max in flight: {FlakyGeminiHandler.max_in_flight}")
+        # 503 được retry nên mọi request đều thành công
+        assert answers == ["OK"] * 6
+        # semaphore giới hạn số request đồng thời tới upstream
+        assert FlakyGeminiHandler.max_in_flight <= 2
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_async_retry_and_concurrency()
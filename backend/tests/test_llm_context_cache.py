@@ -0,0 +1,174 @@
+from serperior.rag.llm_client import LLMClient, is_error_answer
+from serperior.rag.rag_service import RAGService, SYSTEM_PROMPT
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+
+
+class MockCachingGeminiHandler(BaseHTTPRequestHandler):
+    """Giả lập Gemini cachedContents + generateContent, ghi lại payload nhận được"""
+
+    protocol_version = "HTTP/1.1"
+    caches = {}
+    requests = []
+    # status trả về cho request tạo cache / request dùng cached content (None = bình thường)
+    create_status = None
+    cached_status = None
+
+    def _reply(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        cls = type(self)
+        if self.path.startswith("/cachedContents"):
+            if cls.create_status:
+                self._reply(cls.create_status, {"error": {"code": cls.create_status}})
+                return
+            name = f"cachedContents/{len(cls.caches)}"
+            cls.caches[name] = payload
+            self._reply(200, {"name": name, "model": payload['model']})
+            return
+
+        cls.requests.append(payload)
+        name = payload.get('cachedContent')
+        if name is not None and cls.cached_status:
+            self._reply(cls.cached_status, {"error": {"code": cls.cached_status}})
+            return
+        if name is not None and name not in cls.caches:
+            self._reply(404, {"error": {"code": 404, "message": "CachedContent not found"}})
+            return
+        # model thấy: systemInstruction + contents của cache, rồi tới contents của request
+        cached = cls.caches.get(name, {})
+        system = (cached.get('systemInstruction') or payload.get('systemInstruction'))['parts'][0]['text']
+        n_turns = len(cached.get('contents', [])) + len(payload['contents'])
+        self._reply(200, {"candidates": [{"content": {"parts": [{"text": f"{system}|{n_turns}"}]}}]})
+
+    def log_message(self, *args):
+        pass
+
+
+def test_context_cache():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockCachingGeminiHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        client = LLMClient(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}",
+                           min_cache_tokens=10, cache_after_uses=2)
+        context = "Source 1 [2024-12-15]: Giá vàng SJC lập đỉnh\n" * 20
+
+        def messages(question):
+            return [
+                {"role": "system", "content": "SYS", "cache": True},
+                {"role": "user", "content": context, "cache": True},
+                {"role": "user", "content": question},
+            ]
+
+        # lần 1: prefix mới gặp -> gửi đủ prompt
+        assert client.generate_answer(messages("q1")) == "SYS|1"
+        assert 'cachedContent' not in MockCachingGeminiHandler.requests[-1]
+
+        # lần 2: tạo cache, request chỉ còn câu hỏi
+        assert client.generate_answer(messages("q2")) == "SYS|2"
+        last = MockCachingGeminiHandler.requests[-1]
+        assert last['cachedContent'] == "cachedContents/0"
+        assert 'systemInstruction' not in last
+        assert last['contents'] == [{"role": "user", "parts": [{"text": "q2"}]}]
+
+        # lần 3: dùng lại cache, không tạo thêm
+        client.generate_answer(messages("q3"))
+        assert len(MockCachingGeminiHandler.caches) == 1
+        assert client.context_cache_stats()['hits'] == 1
+
+        # cache bị xoá phía server -> fallback gửi đủ prompt
+        MockCachingGeminiHandler.caches.clear()
+        assert client.generate_answer(messages("q4")) == "SYS|1"
+        assert client.context_cache_stats()['invalidated'] == 1
+        assert 'cachedContent' not in MockCachingGeminiHandler.requests[-1]
+    finally:
+        server.shutdown()
+
+
+def test_static_prefix_cached_across_questions():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockCachingGeminiHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    MockCachingGeminiHandler.caches.clear()
+    MockCachingGeminiHandler.requests.clear()
+
+    try:
+        # ngưỡng mặc định của provider: prefix tĩnh của RAGService phải tự đủ dài
+        client = LLMClient(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}",
+                           cache_after_uses=1)
+        first = RAGService.format_prompt("Giá vàng hôm nay?", "Source 1 [2024-12-16]: Giá vàng giảm")
+        second = RAGService.format_prompt("Lãi suất tháng này?", "Source 1 [2024-12-10]: Lãi suất giữ nguyên",
+                                          history=[{"role": "user", "content": "Giá vàng hôm nay?"},
+                                                   {"role": "assistant", "content": "Giá vàng giảm"}])
+
+        assert client.generate_answer(first).startswith(SYSTEM_PROMPT)
+        assert client.generate_answer(second).startswith(SYSTEM_PROMPT)
+        stats = client.context_cache_stats()
+        assert (stats['created'], stats['hits'], stats['failed']) == (1, 1, 0)
+
+        # cache chỉ giữ system prompt; context của từng câu hỏi gửi kèm request
+        cached, = MockCachingGeminiHandler.caches.values()
+        assert 'contents' not in cached
+        for payload, context in zip(MockCachingGeminiHandler.requests, ["Giá vàng giảm", "Lãi suất giữ nguyên"]):
+            assert payload['cachedContent'] == "cachedContents/0" and 'systemInstruction' not in payload
+            assert context in payload['contents'][0]['parts'][0]['text']
+    finally:
+        server.shutdown()
+
+
+def test_transient_errors_keep_cache():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockCachingGeminiHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    handler = MockCachingGeminiHandler
+    handler.caches.clear()
+    handler.requests.clear()
+
+    try:
+        client = LLMClient(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}",
+                           max_retries=0, cache_after_uses=1, cache_retry_seconds=60)
+        first = RAGService.format_prompt("Giá vàng hôm nay?", "Source 1 [2024-12-16]: Giá vàng giảm")
+
+        # tạo cache gặp 503: không tạo được lần này, nhưng chỉ tạm hoãn chứ không tắt cache
+        handler.create_status = 503
+        assert client.generate_answer(first).startswith(SYSTEM_PROMPT)
+        assert 'cachedContent' not in handler.requests[-1]
+        handler.create_status = None
+        client.generate_answer(first)
+        assert 'cachedContent' not in handler.requests[-1] and not handler.caches
+        key, = client._cache_failed
+        client._cache_failed[key] = 0  # hết thời gian hoãn
+        client.generate_answer(first)
+        assert handler.requests[-1]['cachedContent'] == "cachedContents/0"
+
+        # 429 trên request dùng cache: trả lỗi, không gửi lại đủ prompt, cache vẫn dùng tiếp
+        handler.cached_status = 429
+        sent = len(handler.requests)
+        assert is_error_answer(client.generate_answer(first))
+        assert len(handler.requests) == sent + 1
+        handler.cached_status = None
+        client.generate_answer(first)
+        assert handler.requests[-1]['cachedContent'] == "cachedContents/0"
+        assert client.context_cache_stats()['invalidated'] == 0
+
+        # 404: cached content không còn -> gửi lại đủ prompt trong phần thời gian còn lại
+        handler.cached_status = 404
+        assert client.generate_answer(first, timeout=5).startswith(SYSTEM_PROMPT)
+        assert 'cachedContent' not in handler.requests[-1]
+        assert client.context_cache_stats()['invalidated'] == 1
+    finally:
+        handler.create_status = handler.cached_status = None
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_context_cache()
+    test_static_prefix_cached_across_questions()
+    test_transient_errors_keep_cache()
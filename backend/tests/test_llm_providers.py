@@ -0,0 +1,109 @@
+from serperior.rag.llm_client import LLMClient, LLMError
+from serperior.rag.llm_router import LLMRouter, MockLLMClient
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import asyncio
+import json
+import threading
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    """Giả lập /v1/chat/completions của llama.cpp server / Ollama"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        question = body['messages'][-1]['content']
+        if not body.get('stream'):
+            data = json.dumps({"choices": [{"message": {"role": "assistant", "content": f"local: {question}"}}]})
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data.encode())))
+            self.end_headers()
+            self.wfile.write(data.encode())
+            return
+
+        events = [{"choices": [{"delta": {"content": text}}]} for text in ("local", ": ", question)]
+        payload = "".join(f"data: {json.dumps(e, ensure_ascii=False)}\n\n" for e in events) + "data: [DONE]\n\n"
+        payload = payload.encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_local_provider():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    messages = [{"role": "system", "content": "sys"}, {"role": "user", "content": "Giá vàng?"}]
+
+    async def run(client):
+        try:
+            answer = await client.agenerate_answer(messages)
+            chunks = [text async for text in client.astream_answer(messages)]
+        finally:
+            await client.aclose()
+        return answer, chunks
+
+    try:
+        client = LLMClient(provider="local", base_url=f"http://127.0.0.1:{server.server_port}/v1")
+        assert client.generate_answer(messages) == "local: Giá vàng?"
+        assert list(client.stream_answer(messages)) == ["local", ": ", "Giá vàng?"]
+
+        client = LLMClient(provider="local", base_url=f"http://127.0.0.1:{server.server_port}/v1")
+        answer, chunks = asyncio.run(run(client))
+        assert answer == "local: Giá vàng?"
+        assert "".join(chunks) == "local: Giá vàng?"
+    finally:
+        server.shutdown()
+
+
+def test_router():
+    remote = MockLLMClient(answer="remote")
+    local = MockLLMClient(answer="local")
+    router = LLMRouter(remote=remote, local=local)
+    messages = [{"role": "user", "content": "Câu hỏi: x"}]
+
+    assert router.generate_answer(messages, query="Giá vàng hôm nay?") == "local"
+    assert router.generate_answer(messages, query="So sánh giá vàng và giá bạc tuần này") == "remote"
+    # tác vụ phụ (không có query) -> local
+    assert router.generate_answer(messages) == "local"
+
+    # local lỗi -> chuyển sang remote
+    router = LLMRouter(remote=remote, local=MockLLMClient(answer=LLMError("Error: connection refused")))
+
+    async def run(router, timeout=None):
+        answer = await router.agenerate_answer(messages, timeout=timeout, query="Giá vàng?")
+        chunks = [text async for text in router.astream_answer(messages, timeout=timeout, query="Giá vàng?")]
+        return answer, chunks
+
+    answer, chunks = asyncio.run(run(router))
+    assert answer == "remote" and "".join(chunks) == "remote"
+
+    # câu trả lời hợp lệ mở đầu bằng "Error:" hoặc rỗng không phải lỗi -> không fallback
+    for text in ("Error: 404 nghĩa là không tìm thấy trang.", ""):
+        remote = MockLLMClient(answer="remote")
+        router = LLMRouter(remote=remote, local=MockLLMClient(answer=text, chunk_size=4))
+        answer, chunks = asyncio.run(run(router))
+        assert answer == text and "".join(chunks) == text
+        assert remote.calls == []
+
+    # fallback chỉ được phần còn lại của deadline, không phải thêm một timeout đầy đủ
+    remote = MockLLMClient(answer="remote")
+    router = LLMRouter(remote=remote, local=MockLLMClient(answer=LLMError("Error: timed out"), delay=0.2))
+    answer, chunks = asyncio.run(run(router, timeout=1.0))
+    assert answer == "remote" and "".join(chunks) == "remote"
+    assert len(remote.timeouts) == 2 and all(0 < t <= 0.85 for t in remote.timeouts), remote.timeouts
+
+
+if __name__ == "__main__":
+    test_local_provider()
+    test_router()
@@ -0,0 +1,65 @@
+from serperior.rag.llm_client import LLMClient
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+CHUNKS = ["Giá vàng ", "hôm nay ", "tăng mạnh."]
+CHUNK_DELAY = 0.3
+
+
+class MockGeminiHandler(BaseHTTPRequestHandler):
+    """Giả lập Gemini streamGenerateContent?alt=sse, gửi từng chunk có độ trễ"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if ":streamGenerateContent" not in self.path:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        for text in CHUNKS:
+            event = {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]}
+            body = f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode('utf-8')
+            self.wfile.write(f"{len(body):x}\r\n".encode() + body + b"\r\n")
+            self.wfile.flush()
+            time.sleep(CHUNK_DELAY)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+
+def test_stream_answer():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockGeminiHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        client = LLMClient(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}")
+        messages = [{"role": "user", "content": "Giá vàng hôm nay?"}]
+
+        start = time.perf_counter()
+        received = []
+        first_token = None
+        for text in client.stream_answer(messages):
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            received.append(text)
+        total = time.perf_counter() - start
+
+        print(f"time to first token: {first_token:.3f}s, total: {total:.3f}s")
+        assert received == CHUNKS
+        # token đầu phải tới trước khi server gửi xong cả câu trả lời
+        assert first_token < CHUNK_DELAY * (len(CHUNKS) - 1)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_stream_answer()
@@ -0,0 +1,60 @@
+from serperior.api.near_duplicates import DuplicateChecker, NearDuplicateIndex, jaccard, shingles
+import os
+import tempfile
+
+BODY = ("Giá vàng miếng SJC sáng nay tăng mạnh lên mức kỷ lục mới sau khi Ngân hàng Nhà nước "
+        "tiếp tục đấu thầu vàng miếng. Các doanh nghiệp kinh doanh vàng cho biết nhu cầu mua vào "
+        "của người dân tăng cao trong bối cảnh giá vàng thế giới biến động mạnh và đồng USD suy yếu. "
+        "Theo các chuyên gia, giá vàng trong nước có thể tiếp tục chịu áp lực tăng trong thời gian tới.")
+
+
+def test_shingles_and_signature():
+    assert shingles("Giá vàng, tăng!", size=3) == {"giá vàng tăng"}
+    assert shingles("", size=3) == set()
+
+    index = NearDuplicateIndex()
+    updated = BODY + " Cập nhật lúc 10h."
+    assert jaccard(index.signature(BODY), index.signature(BODY)) == 1.0
+    assert jaccard(index.signature(BODY), index.signature(updated)) >= 0.7
+    assert jaccard(index.signature(BODY), index.signature("Bão số 9 đổ bộ vào miền Trung gây mưa lớn")) < 0.3
+
+
+def test_near_duplicate_index():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "duplicates.db")
+        index = NearDuplicateIndex(path)
+        stored = {"a"}
+        checker = DuplicateChecker(index, exists=lambda ids: stored & set(ids),
+                                   id_of=lambda article: article['url'])
+
+        # bài đầu tiên là bài gốc, bản đăng lại (URL khác, thêm một câu) trong cùng lô là bản sao
+        assert checker.check("a", BODY) is None
+        canonical, similarity = checker.check("b", "Tin nóng. " + BODY)
+        assert canonical == "a" and similarity >= 0.7
+        # crawl lại đúng URL không tính là trùng với chính nó
+        assert checker.check("a", BODY) is None
+        assert checker.check_article({'url': "c", 'title': "Bão số 9", 'body': "Mưa lớn ở miền Trung"}) is None
+
+        index.add(["a"], [checker.signatures["a"]])
+        index.link([({'id': "b", 'url': "https://dantri.com.vn/b.htm", 'date': "2024-12-16"}, canonical, similarity)])
+        index.close()
+
+        # lô sau (mở lại file) so với bài gốc đã lưu
+        index = NearDuplicateIndex(path)
+        assert len(index) == 1
+        assert index.canonical("b") == "a" and index.canonical("a") == "a"
+        assert [d['id'] for d in index.duplicates_of("a")] == ["b"]
+        assert DuplicateChecker(index).check("d", BODY + " Giá USD giảm.")[0] == "a"
+        # bài gốc không còn trong generation đích (VD: generation staging rỗng) -> không tính
+        assert DuplicateChecker(index, exists=lambda ids: set()).check("d", BODY) is None
+
+        # bản sao được lưu làm bài gốc thì bỏ liên kết cũ
+        index.add(["b"], [index.signature(BODY)])
+        assert index.canonical("b") == "b"
+        assert index.stats() == {"indexed": 2, "duplicates": 0}
+        index.close()
+
+
+if __name__ == "__main__":
+    test_shingles_and_signature()
+    test_near_duplicate_index()
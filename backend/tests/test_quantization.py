@@ -0,0 +1,36 @@
+from serperior.api.vector_store import NumpyVectorStore
+import numpy as np
+import tempfile
+
+
+def test_compressed_recall():
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(20, 64)).astype(np.float32)
+    vectors = centers[rng.integers(0, 20, 1000)] + 0.5 * rng.normal(size=(1000, 64)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [str(i) for i in range(len(vectors))]
+    queries = vectors[:50]
+    truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :5]
+
+    for compression in ("int8", "pca", "binary"):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = NumpyVectorStore(tmp, compression=compression, pca_components=16)
+            store.add(ids, vectors, [""] * len(ids), [{'date': 0} for _ in ids])
+            assert store.index_nbytes < vectors.nbytes
+
+            hits = 0
+            for q, expected in zip(queries, truth):
+                found = {int(r['id']) for r in store.query(q, top_k=5)}
+                hits += len(found & set(expected.tolist()))
+            recall = hits / truth.size
+            print(f"{compression}: index {store.index_nbytes} bytes, recall@5 = {recall:.3f}")
+            assert recall >= 0.9
+
+            # code nén và quantizer phải được nạp lại từ đĩa
+            reopened = NumpyVectorStore(tmp)
+            assert reopened.compression == compression
+            assert reopened.index_nbytes == store.index_nbytes
+
+
+if __name__ == "__main__":
+    test_compressed_recall()
@@ -0,0 +1,69 @@
+from serperior.rag.reranker import CrossEncoderReranker
+import time
+
+
+class StubCrossEncoder:
+    """Điểm = số từ của query có trong passage; mỗi cặp tốn pair_ms"""
+
+    def __init__(self, pair_ms=0.0):
+        self.pair_ms = pair_ms
+        self.calls = []
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.calls.append(len(pairs))
+        time.sleep(self.pair_ms * len(pairs) / 1000)
+        return [float(sum(word in passage for word in query.split())) for query, passage in pairs]
+
+
+def candidates(n):
+    contents = ["tin thể thao", "giá vàng tăng", "giá vàng hôm nay tăng mạnh", "thời tiết"]
+    return [{'id': str(i), 'content': contents[i % len(contents)]} for i in range(n)]
+
+
+def test_rerank_order_and_cache():
+    model = StubCrossEncoder()
+    reranker = CrossEncoderReranker(batch_size=4, time_budget_ms=1000, model=model)
+
+    results = reranker.rerank("giá vàng hôm nay", candidates(8), top_k=8)
+    assert [doc['id'] for doc in results] == ["2", "6", "1", "5", "0", "3", "4", "7"]
+    assert results[0]['rerank_score'] == 4.0
+    assert sum(model.calls) == 8
+
+    # câu hỏi lặp lại (khác hoa thường / khoảng trắng): toàn bộ lấy từ cache
+    again = reranker.rerank("Giá  vàng hôm nay", candidates(8), top_k=3)
+    assert [doc['id'] for doc in again] == ["2", "6", "1"]
+    assert sum(model.calls) == 8
+    stats = reranker.stats()
+    assert (stats['calls'], stats['cache_hits'], stats['scored'], stats['over_budget']) == (2, 8, 8, 0)
+
+
+def test_rerank_budget():
+    model = StubCrossEncoder(pair_ms=10)
+    reranker = CrossEncoderReranker(batch_size=16, time_budget_ms=1000, model=model)
+
+    # budget theo lần gọi: batch được thu nhỏ theo thời gian chấm đã đo, không vượt quá budget
+    start = time.perf_counter()
+    results = reranker.rerank("giá vàng hôm nay", candidates(40), top_k=40, time_budget_ms=100)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    assert elapsed_ms < 100 + 2 * model.pair_ms * 4, elapsed_ms
+    assert max(model.calls) < 16
+
+    scored = [doc for doc in results if doc['rerank_score'] is not None]
+    unscored = [doc for doc in results if doc['rerank_score'] is None]
+    assert scored and unscored
+    # đã chấm đứng trước, chưa chấm giữ thứ tự stage 1
+    assert results[:len(scored)] == scored
+    assert [int(doc['id']) for doc in unscored] == sorted(int(doc['id']) for doc in unscored)
+    assert reranker.stats()['over_budget'] == 1
+
+    # budget của request không được vượt time_budget_ms của reranker
+    reranker.time_budget_ms = 20
+    model.calls.clear()
+    reranker.rerank("thời tiết", candidates(40), time_budget_ms=1000)
+    assert sum(model.calls) <= 3
+    assert reranker.stats()['over_budget'] == 2
+
+
+if __name__ == "__main__":
+    test_rerank_order_and_cache()
+    test_rerank_budget()
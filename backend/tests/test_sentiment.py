@@ -0,0 +1,58 @@
+from serperior.api.sentiment import LexiconSentimentScorer, aggregate_sentiment
+from serperior.api.sentiment_store import SentimentStore
+import os
+import tempfile
+
+POSITIVE = {'tăng', 'tăng trưởng', 'khả quan', 'kỷ lục'}
+NEGATIVE = {'giảm', 'khó khăn', 'thua lỗ'}
+
+
+def article(url, date, field="kinh-doanh"):
+    return {'url': url, 'date': date, 'field': field, 'title': url, 'body': ""}
+
+
+def test_lexicon_scorer():
+    scorer = LexiconSentimentScorer(POSITIVE, NEGATIVE)
+
+    result = scorer.score_tokens(["xuất khẩu", "tăng trưởng", "kỷ lục"])
+    assert (result['positive'], result['negative'], result['label']) == (2, 0, 'positive')
+    # cụm bị tách thành hai token vẫn được nhận ra (và không đếm "tăng" riêng)
+    assert scorer.score_tokens(["tăng", "trưởng"])['positive'] == 1
+    # phủ định đảo chiều
+    assert scorer.score_tokens(["doanh nghiệp", "không", "thua lỗ"])['label'] == 'positive'
+    assert scorer.score_tokens(["giá", "tăng", "rồi", "giảm"])['label'] == 'neutral'
+    assert scorer.score_tokens([]) == {'score': 0.0, 'label': 'neutral', 'positive': 0, 'negative': 0}
+
+
+def test_sentiment_store():
+    scorer = LexiconSentimentScorer(POSITIVE, NEGATIVE)
+    articles = [article("a", "2024-12-15"), article("b", "2024-12-16"), article("c", "2024-12-16", "thoi-su")]
+    scores = scorer.score_many([["tăng trưởng", "khả quan"], ["khó khăn"], ["bão"]])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SentimentStore(os.path.join(tmp, "sentiment.db"))
+        assert store.add_scores(articles, scores, "lexicon") == 3
+        # chấm lại không cộng hai lần, method khác lưu riêng
+        assert store.add_scores(articles, scores, "lexicon") == 0
+        assert store.missing(articles + [article("d", "2024-12-16")], "lexicon") == [article("d", "2024-12-16")]
+        assert store.missing(articles[:1], "transformer") == articles[:1]
+        assert store.article_scores([articles[1], article("d", "2024-12-16")], "lexicon") == [
+            {'score': -0.5, 'label': 'negative'}, None
+        ]
+
+        # tổng hợp tính sẵn trùng với gộp trực tiếp từ điểm từng bài
+        expected = aggregate_sentiment(articles, scores, "lexicon")
+        assert store.sentiment("2024-12-16", "2024-12-15", method="lexicon") == expected
+        assert expected['timeline']["2024-12-16"] == {
+            'articles': 2, 'positive': 0, 'negative': 1, 'neutral': 1, 'average_score': -0.25
+        }
+
+        by_month = store.sentiment("2024-12-01", "2024-12-31", field="kinh-doanh", freq="month")
+        assert by_month['articles'] == 2 and list(by_month['timeline']) == ["2024-12"]
+        assert by_month['average_score'] == round((0.6667 - 0.5) / 2, 4)
+        store.close()
+
+
+if __name__ == "__main__":
+    test_lexicon_scorer()
+    test_sentiment_store()
@@ -0,0 +1,28 @@
+from serperior.api.term_matrix import TermMatrix, bucket_of
+from collections import Counter
+
+
+def test_term_matrix():
+    counts = [
+        Counter({"tăng": 2, "vàng": 1}),
+        Counter({"vàng": 3}),
+        Counter({"tăng": 1, "lãi": 4}),
+        Counter({"vàng": 1}),
+    ]
+    dates = ["2024-12-15", "2024-12-15", "2024-12-16", None]
+    matrix = TermMatrix(counts, dates)
+
+    assert matrix.shape == (4, 3)
+    assert matrix.top_terms(2) == [("vàng", 5), ("lãi", 4)]
+
+    # bài không có ngày không vào timeline, từ không có trong ma trận -> 0
+    assert matrix.timeline(["tăng", "vàng", "bạc"]) == {
+        "2024-12-15": {"tăng": 2, "vàng": 4, "bạc": 0},
+        "2024-12-16": {"tăng": 1, "vàng": 0, "bạc": 0},
+    }
+    assert matrix.timeline(["tăng"], freq="month") == {"2024-12": {"tăng": 3}}
+    assert bucket_of("2024-12-16", "week") == "2024-W51"
+
+
+if __name__ == "__main__":
+    test_term_matrix()
@@ -0,0 +1,50 @@
+from serperior.api.token_cache import TokenCache
+from serperior.api.tokenizer import tokenize_batch
+import os
+import tempfile
+
+
+def test_token_cache():
+    calls = []
+
+    def tokenizer(text):
+        calls.append(text)
+        return text.lower().split()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tokens.db")
+        cache = TokenCache(path, tokenizer=tokenizer)
+        full = "Giá vàng SJC. Giá vàng SJC tăng mạnh phiên sáng nay"
+
+        # ingest: tách một lần
+        assert cache.tokenize_many([("a", full), ("b", "Lãi suất giảm")]) == \
+            [full.lower().split(), ["lãi", "suất", "giảm"]]
+        assert cache.tokenize("Lãi suất giảm") == ["lãi", "suất", "giảm"]
+        assert len(calls) == 2
+
+        # mở lại từ đĩa: không tách lại; body rút gọn từ DB -> dùng tokens toàn văn theo id
+        cache.close()
+        cache = TokenCache(path, tokenizer=tokenizer)
+        assert cache.tokenize_many([("a", "Giá vàng SJC. Giá vàng")], ingest=False) == [full.lower().split()]
+        assert cache.tokenize_many([(None, full)], ingest=False) == [full.lower().split()]
+        assert len(calls) == 2
+        assert cache.stats()['disk_hits'] == 1 and cache.stats()['memory_hits'] == 1
+
+        # bài bị sửa -> hash khác -> tách lại
+        assert cache.tokenize("Lãi suất tăng", article_id="b") == ["lãi", "suất", "tăng"]
+        assert len(calls) == 3
+        cache.close()
+
+
+def test_tokenize_batch():
+    texts = [f"Bài số {i} về giá vàng" for i in range(50)]
+    expected = [text.split() for text in texts]
+    # chia chunk trên process pool vẫn giữ đúng thứ tự
+    assert tokenize_batch(texts, workers=2, min_parallel=10, tokenizer=str.split) == expected
+    # tokenizer không pickle được -> chạy trong process hiện tại
+    assert tokenize_batch(texts, workers=2, min_parallel=10, tokenizer=lambda t: t.split()) == expected
+
+
+if __name__ == "__main__":
+    test_token_cache()
+    test_tokenize_batch()
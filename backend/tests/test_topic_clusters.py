@@ -0,0 +1,83 @@
+from serperior.api.topic_clusters import TopicClusterer
+from collections import Counter
+import numpy as np
+import os
+import tempfile
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def article(doc_id, date, field="kinh-doanh"):
+    return {'id': doc_id, 'date': date, 'field': field, 'title': doc_id, 'url': f"https://dantri.com.vn/{doc_id}"}
+
+
+def test_topic_clusters():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "topics.db")
+        clusterer = TopicClusterer(path, threshold=0.8, window_days=3)
+
+        articles = [article("a1", "2024-12-01"), article("a2", "2024-12-01"), article("b1", "2024-12-02")]
+        vectors = np.vstack([unit(1, 0.1, 0), unit(1, 0, 0.1), unit(0, 1, 0)])
+        counts = [Counter({"vàng": 2, "giá": 1}), Counter({"vàng": 1}), Counter({"bão": 3})]
+        assert clusterer.add_articles(articles, vectors, counts, "model-a") == 3
+        # ingest lại không gán hai lần
+        assert clusterer.add_articles(articles, vectors, counts, "model-a") == 0
+        assert clusterer.missing(["a1", "c1"]) == ["c1"]
+
+        # gán tăng dần vào cluster có sẵn (kể cả sau khi mở lại file)
+        clusterer.close()
+        clusterer = TopicClusterer(path, threshold=0.8, window_days=3)
+        assert clusterer.add_articles([article("a3", "2024-12-03")], unit(1, 0.05, 0.05)[None, :],
+                                      [Counter({"vàng": 1, "sjc": 1})], "model-a") == 1
+
+        topics = clusterer.clusters("2024-12-05", "2024-12-01", min_size=1)
+        assert [t['size'] for t in topics] == [3, 1]
+        gold = topics[0]
+        assert gold['label'].startswith("vàng")
+        assert gold['keywords'][0] == {'word': "vàng", 'count': 4}
+        assert (gold['first_date'], gold['last_date']) == ("2024-12-01", "2024-12-03")
+        assert {a['id'] for a in gold['articles']} == {"a1", "a2", "a3"}
+        assert clusterer.clusters("2024-12-01", "2024-12-05") == [gold]
+        assert clusterer.clusters("2024-12-01", "2024-12-05", field="thoi-su") == []
+
+        # cluster đã quá window_days không nhận thêm bài -> câu chuyện mới
+        clusterer.add_articles([article("a4", "2024-12-20")], unit(1, 0, 0)[None, :], [Counter()], "model-a")
+        # embeddings của model khác không so với centroid cũ
+        clusterer.add_articles([article("a5", "2024-12-03")], unit(1, 0, 0)[None, :], [Counter()], "model-b")
+        ids = {a['id']: t['id'] for t in clusterer.clusters("2024-12-01", "2024-12-31", min_size=1)
+               for a in t['articles']}
+        assert len({ids["a1"], ids["a4"], ids["a5"]}) == 3
+        clusterer.close()
+
+
+def test_centroid_survives_restart():
+    """Tổng vector được lưu nguyên: gán qua nhiều lần mở lại file cho cùng centroid như gán một lần"""
+    vectors = np.vstack([unit(1, 0.3, 0), unit(1, -0.2, 0.1), unit(1, 0, -0.3), unit(1, 0.1, 0.2)])
+    articles = [article(f"a{i}", "2024-12-01") for i in range(4)]
+    counts = [Counter()] * 4
+
+    with tempfile.TemporaryDirectory() as tmp:
+        once = TopicClusterer(os.path.join(tmp, "once.db"), threshold=0.5)
+        once.add_articles(articles, vectors, counts, "m")
+
+        path = os.path.join(tmp, "split.db")
+        for i in range(4):
+            split = TopicClusterer(path, threshold=0.5)
+            split.add_articles(articles[i:i + 1], vectors[i:i + 1], counts[:1], "m")
+            split.close()
+        split = TopicClusterer(path, threshold=0.5)
+
+        stored = [np.frombuffer(c.execute("SELECT vector_sum FROM clusters").fetchone()[0], dtype=np.float32)
+                  for c in (once._conn, split._conn)]
+        assert np.allclose(stored[0], vectors.sum(axis=0), atol=1e-6)
+        assert np.allclose(stored[1], stored[0], atol=1e-6)
+        once.close()
+        split.close()
+
+
+if __name__ == "__main__":
+    test_topic_clusters()
+    test_centroid_survives_restart()
@@ -0,0 +1,43 @@
+from serperior.api.trend_store import TrendStore
+from collections import Counter
+import os
+import tempfile
+
+
+def article(url, date, field="kinh-doanh"):
+    return {'url': url, 'date': date, 'field': field, 'title': url, 'body': ""}
+
+
+def test_trend_store():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TrendStore(os.path.join(tmp, "trends.db"))
+
+        # baseline: "giá" ngày nào cũng có
+        base = [article(f"b{i}", f"2024-12-{i:02d}") for i in range(1, 15)]
+        assert store.add_articles(base, [Counter({"giá": 3, "thị": 1}) for _ in base]) == 14
+
+        period = [article("p1", "2024-12-15"), article("p2", "2024-12-16"), article("p3", "2024-12-16", "thoi-su")]
+        counts = [Counter({"giá": 3, "vàng": 2}), Counter({"vàng": 4}), Counter({"bão": 1})]
+        entities = [[{'text': "SJC", 'type': "ORG"}], [{'text': "SJC", 'type': "ORG"}], []]
+        assert store.add_articles(period, counts, entities) == 3
+        # ingest lại không cộng hai lần
+        assert store.add_articles(period, counts, entities) == 0
+        assert store.missing(period + [article("p4", "2024-12-16")]) == [article("p4", "2024-12-16")]
+
+        trend = store.trend("2024-12-16", "2024-12-15", field="kinh-doanh", top_n=5)
+        assert trend['total_articles'] == 2
+        assert trend['keywords'][0] == {'word': "vàng", 'count': 6}
+        assert trend['timeline'] == {"2024-12-15": {"vàng": 2, "giá": 3}, "2024-12-16": {"vàng": 4, "giá": 0}}
+        assert trend['entities'] == [{'text': "SJC", 'type': "ORG", 'count': 2}]
+
+        # "vàng" mới xuất hiện nổi bật hơn "giá" vốn có sẵn trong baseline
+        trending = trend['trending']
+        assert trending[0]['word'] == "vàng" and trending[0]['lift'] > 1
+        assert next(t for t in trending if t['word'] == "giá")['baseline_count'] == 42
+
+        assert store.timeline("2024-12-01", "2024-12-16", ["giá"], freq="month") == {"2024-12": {"giá": 45}}
+        store.close()
+
+
+if __name__ == "__main__":
+    test_trend_store()
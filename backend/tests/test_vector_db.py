@@ -0,0 +1,192 @@
+from serperior.api.vector_db import ArticleVectorDB
+import json
+import os
+import tempfile
+import threading
+import numpy as np
+
+WORDS = ["vàng", "lãi suất", "chứng khoán", "xăng dầu", "gạo", "căn hộ", "tỷ giá", "thép", "cà phê", "hàng không",
+         "ngân hàng", "bảo hiểm", "điện", "ô tô", "du lịch", "thủy sản"]
+
+
+class FakeEncoder:
+    """Vector ngẫu nhiên cố định theo nội dung, không cần model"""
+
+    dimension = 8
+
+    def _vector(self, text):
+        rng = np.random.default_rng(sum(map(ord, text)))
+        return rng.normal(size=self.dimension).astype(np.float32)
+
+    def encode_documents(self, texts, show_progress_bar=False):
+        return np.stack([self._vector(text) for text in texts]) if texts else np.zeros((0, self.dimension))
+
+    def encode_query(self, text):
+        return self._vector(text)
+
+
+class FakeVectorDB(ArticleVectorDB):
+    def __init__(self, *args, **kwargs):
+        self.copy_hook = None
+        self.caught_up = []
+        super().__init__(*args, backend="numpy", **kwargs)
+        self.token_cache.tokenizer = str.split
+
+    def _load_encoder(self, model_name):
+        return FakeEncoder()
+
+    def _copy_records(self, source, target):
+        copied = super()._copy_records(source, target)
+        if self.copy_hook:
+            self.copy_hook()
+        return copied
+
+    def _copy_ids(self, source, target, ids):
+        self.caught_up.append(list(ids))
+        return super()._copy_ids(source, target, ids)
+
+
+def articles(start, n):
+    return [{'title': f"Tin {WORDS[i % len(WORDS)]} số {i}",
+             'body': " ".join(f"{WORDS[(i + k) % len(WORDS)]}-{i}-{k}" for k in range(12)),
+             'date': "2024-12-16", 'url': f"https://dantri.com.vn/{i}.htm", 'field': "kinh-doanh"}
+            for i in range(start, start + n)]
+
+
+def read_alias(tmp):
+    with open(os.path.join(tmp, "alias_numpy.json"), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_promote_and_restart():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = FakeVectorDB(tmp, gc_grace_seconds=3600)
+        assert db.add_articles(articles(0, 3)) == 3
+        old = db.generation
+
+        staging = db.create_generation()
+        # generation rỗng không bao giờ được promote
+        try:
+            db.promote(staging)
+            assert False, "promoting an empty generation must fail"
+        except ValueError:
+            pass
+        assert db.add_articles(articles(10, 2), generation=staging) == 2
+        # staging chưa promote thì chưa ai đọc được
+        assert (db.generation, db.count()) == (old, 3)
+
+        db.promote(staging)
+        assert (db.generation, db.count()) == (staging.name, 2)
+        alias = read_alias(tmp)
+        assert alias['current'] == staging.name and [r['name'] for r in alias['retired']] == [old]
+
+        # alias.json giữ nguyên sau khi khởi động lại
+        reopened = FakeVectorDB(tmp, gc_grace_seconds=3600)
+        assert (reopened.generation, reopened.count()) == (staging.name, 2)
+        assert read_alias(tmp)['retired'][0]['name'] == old
+
+
+def test_collect_garbage():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = FakeVectorDB(tmp, gc_grace_seconds=3600)
+        db.add_articles(articles(0, 2))
+        old = db.generation
+        old_dir = db.store.directory
+
+        staging = db.create_generation()
+        db.add_articles(articles(10, 2), generation=staging)
+        db.promote(staging)
+        # còn trong grace period: generation cũ vẫn còn (request đang chạy có thể vẫn đọc nó)
+        assert db.collect_garbage() == 0 and os.path.exists(old_dir)
+
+        assert db.collect_garbage(grace_seconds=0) == 1
+        assert not os.path.exists(old_dir)
+        alias = read_alias(tmp)
+        assert old not in alias['generations'] and alias['retired'] == []
+
+        # staging bỏ dở bị xoá, generation đang active thì không
+        abandoned = db.create_generation()
+        db.discard_generation(abandoned)
+        assert abandoned.name not in read_alias(tmp)['generations']
+        try:
+            db.discard_generation(staging)
+            assert False, "discarding the active generation must fail"
+        except ValueError:
+            pass
+
+
+def test_rebuild_with_concurrent_reads_and_writes():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = FakeVectorDB(tmp, gc_grace_seconds=3600)
+        db.add_articles(articles(0, 40))
+        old = db.generation
+
+        seen, stop = [], threading.Event()
+
+        def reader():
+            while not stop.is_set():
+                seen.append((db.count(), len(db.search("giá vàng", top_k=3))))
+
+        # bài được add vào generation cũ giữa lần copy đầu và lúc swap
+        db.copy_hook = lambda: db.add_articles(articles(100, 2))
+        thread = threading.Thread(target=reader)
+        thread.start()
+        try:
+            name = db.rebuild(background=False)
+        finally:
+            stop.set()
+            thread.join()
+
+        assert name == db.generation != old
+        assert db.count() == 42
+        # bước bắt kịp chỉ copy các bài mới, không quét lại cả generation
+        assert [len(ids) for ids in db.caught_up] == [2]
+        # người đọc không bao giờ thấy DB rỗng
+        assert seen and all(count >= 40 and hits == 3 for count, hits in seen)
+        assert db.get_stats()['rebuilding'] is False
+
+
+def test_rebuild_aborts_when_replaced():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = FakeVectorDB(tmp, gc_grace_seconds=3600)
+        db.add_articles(articles(0, 10))
+
+        # replace_articles promote generation mới giữa lúc rebuild đang copy
+        db.copy_hook = lambda: db.replace_articles(articles(100, 3))
+        try:
+            db.rebuild(background=False)
+            assert False, "rebuild must not promote a copy of a replaced generation"
+        except RuntimeError:
+            pass
+
+        replaced = db.generation
+        assert db.count() == 3
+        assert {row['id'] for row in db.store.get_by_ids([db.article_id(a) for a in articles(100, 3)])} == \
+            {db.article_id(a) for a in articles(100, 3)}
+        # bản copy bị bỏ, không còn trong alias
+        alias = read_alias(tmp)
+        assert alias['current'] == replaced and len(alias['generations']) == 2
+        assert db.get_stats()['rebuilding'] is False
+
+
+def test_replace_articles():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = FakeVectorDB(tmp, gc_grace_seconds=3600)
+        db.add_articles(articles(0, 3))
+        old = db.generation
+
+        # không lưu được bài nào -> giữ nguyên dữ liệu cũ
+        assert db.replace_articles([{'title': "ngắn", 'body': ""}]) == 0
+        assert (db.generation, db.count()) == (old, 3)
+        assert len(read_alias(tmp)['generations']) == 1
+
+        assert db.replace_articles(articles(50, 4)) == 4
+        assert db.generation != old and db.count() == 4
+
+
+if __name__ == "__main__":
+    test_promote_and_restart()
+    test_collect_garbage()
+    test_rebuild_with_concurrent_reads_and_writes()
+    test_rebuild_aborts_when_replaced()
+    test_replace_articles()
@@ -0,0 +1,35 @@
+from serperior.api.vector_store import NumpyVectorStore
+import numpy as np
+import tempfile
+
+
+def test_numpy_vector_store():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(50, 16)).astype(np.float32)
+    ids = [f"id{i}" for i in range(50)]
+    metadatas = [{'date': 20241215 + (i % 3), 'title': f"Bài {i}"} for i in range(50)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = NumpyVectorStore(tmp, hnsw_threshold=None)
+        store.add(ids, vectors, [f"doc {i}" for i in range(50)], metadatas)
+        print(f"Stored {store.count()} vectors")
+        assert store.count() == 50
+
+        # chính vector đó phải là kết quả gần nhất, distance ~ 0
+        results = store.query(vectors[7], top_k=3)
+        assert results[0]['id'] == "id7"
+        assert abs(results[0]['distance']) < 1e-5
+
+        assert len(store.get_by_date(20241216, 20241216)) == len([m for m in metadatas if m['date'] == 20241216])
+
+        # mở lại từ đĩa
+        reopened = NumpyVectorStore(tmp, hnsw_threshold=None)
+        assert reopened.count() == 50
+        assert reopened.query(vectors[7], top_k=1)[0]['id'] == "id7"
+
+        reopened.clear()
+        assert reopened.count() == 0
+
+
+if __name__ == "__main__":
+    test_numpy_vector_store()
@@ -16,27 +16,65 @@ const ChatInterface = ({ field, startDate, endDate, keywords = [] }) => {
         if (!msgToSend.trim()) return;
 
         const userMsg = { role: 'user', content: msgToSend };
+        // Lịch sử gửi kèm để server hiểu câu hỏi follow-up (server tự tóm tắt khi quá dài)
+        const history = messages.map(({ role, content }) => ({ role, content }));
         setMessages(prev => [...prev, userMsg]);
         setInput('');
         setIsLoading(true);
 
         try {
-            const response = await fetch('http://127.0.0.1:8000/api/v1/chat', {
+            const response = await fetch('http://127.0.0.1:8000/api/v1/chat/stream', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ message: msgToSend })
+                body: JSON.stringify({ message: msgToSend, history })
             });
 
-            const data = await response.json();
-
-            if (data.success) {
-                setMessages(prev => [...prev, {
-                    role: 'assistant',
-                    content: data.response,
-                    sources: data.sources
-                }]);
-            } else {
+            if (!response.ok || !response.body) {
+                const data = await response.json().catch(() => ({}));
                 setMessages(prev => [...prev, { role: 'assistant', content: 'Lỗi: ' + (data.error || 'Server error') }]);
+                return;
+            }
+
+            // Tin nhắn assistant rỗng, được điền dần khi token tới
+            setMessages(prev => [...prev, { role: 'assistant', content: '', sources: [] }]);
+            const updateLast = (update) => setMessages(prev => {
+                const next = [...prev];
+                next[next.length - 1] = update(next[next.length - 1]);
+                return next;
+            });
+
+            // Đọc Server-Sent Events: "event: <name>\ndata: <json>\n\n"
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder('utf-8');
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const rawEvent = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+
+                    let event = 'message';
+                    let data = '';
+                    for (const line of rawEvent.split('\n')) {
+                        if (line.startsWith('event:')) event = line.slice(6).trim();
+                        else if (line.startsWith('data:')) data += line.slice(5).trim();
+                    }
+                    if (!data) continue;
+                    const payload = JSON.parse(data);
+
+                    if (event === 'sources') {
+                        updateLast(msg => ({ ...msg, sources: payload }));
+                    } else if (event === 'token') {
+                        setIsLoading(false);
+                        updateLast(msg => ({ ...msg, content: msg.content + payload.text }));
+                    } else if (event === 'error') {
+                        updateLast(msg => ({ ...msg, content: msg.content + '\nLỗi: ' + payload.error }));
+                    }
+                }
             }
         } catch (error) {
             setMessages(prev => [...prev, { role: 'assistant', content: 'Lỗi kết nối: ' + error.message }]);
@@ -56,7 +94,12 @@ const ChatInterface = ({ field, startDate, endDate, keywords = [] }) => {
                                 <strong>Nguồn:</strong>
                                 <ul className="list-disc pl-4 mt-1">
                                     {msg.sources.map((src, i) => (
-                                        <li key={i}>{src}</li>
+                                        <li key={i}>
+                                            [{src.index}] {src.date}:{' '}
+                                            {src.url
+                                                ? <a href={src.url} target="_blank" rel="noreferrer" className="underline">{src.title}</a>
+                                                : src.title}
+                                        </li>
                                     ))}
                                 </ul>
                             </div>